@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+"""Benchmarks for the Roborock daemon.
+
+Usage:
+    python roborock_bench.py codec [--iterations 5000]
+    python roborock_bench.py transport [--requests 2000]
+    python roborock_bench.py load [--requests 5000] [--concurrency 64]
+    python roborock_bench.py e2e [--users 1 10 100 1000] [--output results.json] [--baseline old.json]
+    python roborock_bench.py impair [--profiles none wifi lossy ...]
+
+Benchmarks:
+    codec     - Per-command CPU cost of building an encoded RPC request,
+                comparing the uncached path (derive MQTT params, security data
+                and topics on every call) with the cached session context used
+                by the daemon.
+    transport - p50/p99 request latency against a spawned daemon over loopback
+                TCP and over a Unix domain socket.
+    load      - Throughput of /health and /command under concurrent load
+                against a daemon on stdlib asyncio + json and on uvloop +
+                orjson. With no broker session, /command exercises request
+                parsing, dispatch and response encoding only.
+    e2e       - /init and /command against a daemon on simulated devices
+                (roborock_sim.py) at each concurrent user count: throughput,
+                p50/p95/p99 latency, RSS per session and daemon CPU per
+                command (which includes the in-process simulated devices).
+                --output stores the result as JSON; --baseline compares
+                against a stored result and exits 1 on a regression.
+    impair    - The same command path under each roborock_sim impairment
+                profile (delay, jitter, loss, duplication, reordering):
+                p50/p95/p99/max latency, errors by type, and how many
+                pending_responses entries are left once every command has
+                returned.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any
+
+import aiohttp
+
+from roborock_daemon import PENDING_TICK, RoborockDaemon, UserContext
+
+try:
+    from roborock.protocol import create_mqtt_params, MessageParser
+    from roborock.roborock_message import RoborockMessageProtocol
+    from roborock.protocols.v1_protocol import RequestMessage, create_security_data
+except ImportError as e:
+    print(json.dumps({"error": f"python-roborock not installed: {e}"}))
+    sys.exit(1)
+
+# Synthetic credentials; nothing here ever reaches the network
+BENCH_RRIOT = {
+    "u": "bench-user",
+    "s": "bench-secret",
+    "h": "bench-hmac",
+    "k": "bench-key",
+    "r": {"a": "https://api.example.invalid", "m": "ssl://mqtt.example.invalid:8883"},
+}
+BENCH_DEVICE_ID = "bench-device"
+BENCH_LOCAL_KEY = "0123456789abcdef"
+
+
+def _time_per_call(fn, iterations: int) -> float:
+    """Return the mean wall time of fn() in microseconds."""
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bench_codec(iterations: int) -> dict[str, Any]:
+    """Compare uncached vs cached command encoding."""
+    rriot = RoborockDaemon()._create_rriot(BENCH_RRIOT)
+
+    def uncached():
+        mqtt_params = create_mqtt_params(rriot)
+        security_data = create_security_data(rriot)
+        request = RequestMessage(method="get_status", params=[])
+        message = request.encode_message(
+            protocol=RoborockMessageProtocol.RPC_REQUEST,
+            security_data=security_data,
+        )
+        MessageParser.build(message, BENCH_LOCAL_KEY, prefixed=False)
+        return f"rr/m/i/{rriot.u}/{mqtt_params.username}/{BENCH_DEVICE_ID}"
+
+    context = UserContext.create(rriot)
+
+    def cached():
+        device = context.device(BENCH_DEVICE_ID, BENCH_LOCAL_KEY)
+        request = RequestMessage(method="get_status", params=[])
+        message = request.encode_message(
+            protocol=RoborockMessageProtocol.RPC_REQUEST,
+            security_data=context.security_data,
+        )
+        device.encode(message)
+        return device.publish_topic
+
+    before = _time_per_call(uncached, iterations)
+    after = _time_per_call(cached, iterations)
+    return {
+        "benchmark": "codec",
+        "iterations": iterations,
+        "uncached_us_per_command": round(before, 2),
+        "cached_us_per_command": round(after, 2),
+        "speedup": round(before / after, 2) if after else None,
+    }
+
+
+DAEMON_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "roborock_daemon.py")
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _summarize(samples_ms: list[float]) -> dict[str, float]:
+    return {
+        "p50_ms": round(_percentile(samples_ms, 50), 3),
+        "p95_ms": round(_percentile(samples_ms, 95), 3),
+        "p99_ms": round(_percentile(samples_ms, 99), 3),
+        "mean_ms": round(statistics.fmean(samples_ms), 3),
+    }
+
+
+async def _wait_healthy(session: aiohttp.ClientSession, url: str, proc: subprocess.Popen):
+    for _ in range(100):
+        if proc.poll() is not None:
+            raise RuntimeError(f"Daemon exited with code {proc.returncode}")
+        try:
+            async with session.get(url) as resp:
+                if resp.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("Daemon did not become healthy")
+
+
+async def _measure_transport(args: list[str], connector: aiohttp.BaseConnector, base_url: str, requests: int):
+    """Spawn a daemon with args and time sequential /health requests."""
+    proc = subprocess.Popen(
+        [sys.executable, DAEMON_SCRIPT, *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            url = f"{base_url}/health"
+            await _wait_healthy(session, url, proc)
+            for _ in range(min(100, requests)):  # warm up
+                async with session.get(url) as resp:
+                    await resp.read()
+            samples = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                async with session.get(url) as resp:
+                    await resp.read()
+                samples.append((time.perf_counter() - start) * 1000)
+            return _summarize(samples)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def bench_transport(requests: int, port: int) -> dict[str, Any]:
+    """Compare loopback TCP and Unix socket request latency."""
+
+    async def run():
+        tcp = await _measure_transport(
+            ["--port", str(port)], aiohttp.TCPConnector(), f"http://127.0.0.1:{port}", requests
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "daemon.sock")
+            unix = await _measure_transport(
+                ["--unix-socket", path], aiohttp.UnixConnector(path=path), "http://localhost", requests
+            )
+        return tcp, unix
+
+    tcp, unix = asyncio.run(run())
+    return {"benchmark": "transport", "requests": requests, "tcp": tcp, "unix": unix}
+
+
+LOAD_COMMAND = {
+    "user_id": "bench-user",
+    "device_id": BENCH_DEVICE_ID,
+    "local_key": BENCH_LOCAL_KEY,
+    "command": "get_status",
+    "params": [],
+}
+
+
+async def _measure_load(
+    session: aiohttp.ClientSession, method: str, url: str, body: bytes | None, requests: int, concurrency: int
+) -> dict[str, Any]:
+    """Issue requests from `concurrency` workers and report throughput."""
+    samples: list[float] = []
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            async with session.request(method, url, data=body) as resp:
+                await resp.read()
+            samples.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"requests_per_s": round(len(samples) / elapsed, 1), **_summarize(samples)}
+
+
+async def _load_daemon(flags: list[str], port: int, requests: int, concurrency: int) -> dict[str, Any]:
+    """Spawn a daemon with flags and load /health and /command."""
+    proc = subprocess.Popen(
+        [sys.executable, DAEMON_SCRIPT, "--port", str(port), *flags],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    body = json.dumps(LOAD_COMMAND).encode()
+    headers = {"Content-Type": "application/json"}
+    try:
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
+            await _wait_healthy(session, f"{base_url}/health", proc)
+            await _measure_load(session, "GET", f"{base_url}/health", None, min(500, requests), concurrency)
+            return {
+                "health": await _measure_load(
+                    session, "GET", f"{base_url}/health", None, requests, concurrency
+                ),
+                "command": await _measure_load(
+                    session, "POST", f"{base_url}/command", body, requests, concurrency
+                ),
+            }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def bench_load(requests: int, concurrency: int, port: int) -> dict[str, Any]:
+    """Compare stdlib asyncio + json with uvloop + orjson under load."""
+
+    async def run():
+        baseline = await _load_daemon(["--no-uvloop", "--no-orjson"], port, requests, concurrency)
+        fast = await _load_daemon(["--uvloop", "--orjson"], port, requests, concurrency)
+        return baseline, fast
+
+    baseline, fast = asyncio.run(run())
+    return {
+        "benchmark": "load",
+        "requests": requests,
+        "concurrency": concurrency,
+        "asyncio_json": baseline,
+        "uvloop_orjson": fast,
+    }
+
+
+SIM_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "roborock_sim.py")
+E2E_USERS = [1, 10, 100, 1000]
+IMPAIR_PROFILES = ["none", "wifi", "lossy", "duplicating", "reordering", "degraded"]
+# Metrics compared against a baseline, and whether higher is better
+E2E_REGRESSION_KEYS = {"requests_per_s": True, "p99_ms": False, "cpu_ms_per_command": False}
+
+
+def _proc_rss_kb(pid: int) -> int | None:
+    """Resident set size of a process in KiB (Linux /proc only)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _proc_cpu_seconds(pid: int) -> float | None:
+    """User + system CPU time of a process in seconds (Linux /proc only)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rpartition(")")[2].split()
+    except OSError:
+        return None
+    # utime and stime are fields 14 and 15; [0] here is field 3
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _spawn_sim(args: argparse.Namespace, *sim_args: str) -> subprocess.Popen:
+    """Start a daemon on simulated devices listening on args.port."""
+    return subprocess.Popen(
+        [
+            sys.executable, SIM_SCRIPT, "daemon",
+            "--devices", str(args.devices),
+            "--latency", str(args.device_latency),
+            *sim_args,
+            "--", "--port", str(args.port), "--status-ttl", "0",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def _init_users(session: aiohttp.ClientSession, base_url: str, users: int):
+    """Initialize users u0 .. uN-1, each with its own credentials and session."""
+    from roborock_sim import SIM_RRIOT
+
+    async def init(i: int):
+        rriot = {**SIM_RRIOT, "u": f"bench-user-{i}"}
+        async with session.post(f"{base_url}/init", json={"user_id": f"u{i}", "rriot": rriot}) as resp:
+            body = await resp.json()
+        if not body.get("success"):
+            raise RuntimeError(f"Init failed for u{i}: {body}")
+
+    for start in range(0, users, 100):
+        await asyncio.gather(*(init(i) for i in range(start, min(users, start + 100))))
+
+
+async def _run_users(
+    session: aiohttp.ClientSession,
+    base_url: str,
+    users: int,
+    per_user: int,
+    devices: int,
+    extra: dict[str, Any] | None = None,
+) -> tuple[list[float], Counter]:
+    """Have every user send per_user get_status commands back to back.
+
+    Returns the latency samples in ms and a count of errors by message.
+    """
+    from roborock_sim import SIM_LOCAL_KEY
+
+    samples: list[float] = []
+    errors: Counter = Counter()
+
+    async def user(i: int):
+        command = {
+            "user_id": f"u{i}",
+            "device_id": f"sim-{i % devices}",
+            "local_key": SIM_LOCAL_KEY,
+            "command": "get_status",
+            **(extra or {}),
+        }
+        for _ in range(per_user):
+            start = time.perf_counter()
+            async with session.post(f"{base_url}/command", json=command) as resp:
+                body = await resp.json()
+            samples.append((time.perf_counter() - start) * 1000)
+            if not body.get("success"):
+                errors[body.get("error", f"HTTP {resp.status}")] += 1
+
+    await asyncio.gather(*(user(i) for i in range(users)))
+    return samples, errors
+
+
+async def _e2e_level(users: int, args: argparse.Namespace) -> dict[str, Any]:
+    """Run one user count against a fresh simulated daemon."""
+    proc = _spawn_sim(args)
+    base_url = f"http://127.0.0.1:{args.port}"
+    per_user = max(1, args.requests // users)
+    try:
+        connector = aiohttp.TCPConnector(limit=min(users, 256))
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await _wait_healthy(session, f"{base_url}/health", proc)
+            rss_before = _proc_rss_kb(proc.pid)
+            await _init_users(session, base_url, users)
+            rss_after = _proc_rss_kb(proc.pid)
+
+            cpu_before = _proc_cpu_seconds(proc.pid)
+            started = time.perf_counter()
+            samples, errors = await _run_users(session, base_url, users, per_user, args.devices)
+            elapsed = time.perf_counter() - started
+            cpu_after = _proc_cpu_seconds(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    result: dict[str, Any] = {
+        "users": users,
+        "requests": len(samples),
+        "errors": sum(errors.values()),
+        "requests_per_s": round(len(samples) / elapsed, 1),
+        **_summarize(samples),
+        "rss_per_session_kb": None,
+        "cpu_ms_per_command": None,
+    }
+    if rss_before is not None and rss_after is not None:
+        result["rss_per_session_kb"] = round((rss_after - rss_before) / users, 1)
+    if cpu_before is not None and cpu_after is not None:
+        result["cpu_ms_per_command"] = round((cpu_after - cpu_before) / len(samples) * 1000, 3)
+    return result
+
+
+def _compare(result: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """List the metrics that regressed by more than tolerance vs baseline."""
+    previous = {level["users"]: level for level in baseline.get("levels", [])}
+    regressions = []
+    for level in result["levels"]:
+        old = previous.get(level["users"])
+        if old is None:
+            continue
+        for key, higher_is_better in E2E_REGRESSION_KEYS.items():
+            new_value, old_value = level.get(key), old.get(key)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{level['users']} users: {key} {old_value} -> {new_value} ({change:+.0%})")
+    return regressions
+
+
+def bench_e2e(args: argparse.Namespace) -> dict[str, Any]:
+    """Drive /init and /command against simulated devices at each user count."""
+
+    async def run():
+        return [await _e2e_level(users, args) for users in args.users]
+
+    return {
+        "benchmark": "e2e",
+        "python": sys.version.split()[0],
+        "requests_per_level": args.requests,
+        "devices": args.devices,
+        "device_latency_s": args.device_latency,
+        "levels": asyncio.run(run()),
+    }
+
+
+async def _impair_profile(profile: str, args: argparse.Namespace) -> dict[str, Any]:
+    """Run the command mix under one impairment profile and check for leaks."""
+    proc = _spawn_sim(args, "--impairment", profile, "--seed", "1")
+    base_url = f"http://127.0.0.1:{args.port}"
+    per_user = max(1, args.requests // args.users)
+    try:
+        connector = aiohttp.TCPConnector(limit=min(args.users, 256))
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await _wait_healthy(session, f"{base_url}/health", proc)
+            await _init_users(session, base_url, args.users)
+            started = time.perf_counter()
+            samples, errors = await _run_users(
+                session, base_url, args.users, per_user, args.devices, {"deadline_ms": args.deadline_ms}
+            )
+            elapsed = time.perf_counter() - started
+            # Every caller has returned; a shared read may outlive its caller
+            # by up to one reaper tick, and anything pending after that leaked
+            await asyncio.sleep(2 * PENDING_TICK)
+            async with session.get(f"{base_url}/health") as resp:
+                leaked = (await resp.json()).get("pending_responses")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    return {
+        "profile": profile,
+        "requests": len(samples),
+        "requests_per_s": round(len(samples) / elapsed, 1),
+        **_summarize(samples),
+        "max_ms": round(max(samples), 3),
+        "errors": dict(errors),
+        "leaked_pending_responses": leaked,
+    }
+
+
+def bench_impair(args: argparse.Namespace) -> dict[str, Any]:
+    """Tail latency and pending-response leaks under each impairment profile."""
+
+    async def run():
+        return [await _impair_profile(profile, args) for profile in args.profiles]
+
+    return {
+        "benchmark": "impair",
+        "users": args.users,
+        "requests_per_profile": args.requests,
+        "deadline_ms": args.deadline_ms,
+        "profiles": asyncio.run(run()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roborock daemon benchmarks")
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+    codec = sub.add_parser("codec", help="Per-command encode cost")
+    codec.add_argument("--iterations", type=int, default=5000)
+    transport = sub.add_parser("transport", help="TCP vs Unix socket latency")
+    transport.add_argument("--requests", type=int, default=2000)
+    transport.add_argument("--port", type=int, default=9877, help="Free TCP port for the test daemon")
+    load = sub.add_parser("load", help="/health and /command throughput, asyncio+json vs uvloop+orjson")
+    load.add_argument("--requests", type=int, default=5000)
+    load.add_argument("--concurrency", type=int, default=64)
+    load.add_argument("--port", type=int, default=9877, help="Free TCP port for the test daemon")
+    e2e = sub.add_parser("e2e", help="Command path against simulated devices at several user counts")
+    e2e.add_argument("--users", type=int, nargs="+", default=E2E_USERS, help="Concurrent user counts to run")
+    e2e.add_argument("--requests", type=int, default=2000, help="Commands per level, split across users")
+    e2e.add_argument("--devices", type=int, default=10, help="Simulated devices, assigned to users round-robin")
+    e2e.add_argument("--device-latency", type=float, default=0.005, help="Simulated device response time in seconds")
+    e2e.add_argument("--port", type=int, default=9877, help="Free TCP port for the test daemon")
+    e2e.add_argument("--output", help="Write the result JSON to this file")
+    e2e.add_argument("--baseline", help="Result JSON from an earlier run to compare against")
+    e2e.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression vs --baseline")
+    impair = sub.add_parser("impair", help="Tail latency and leaks under network impairment profiles")
+    impair.add_argument(
+        "--profiles", nargs="+", default=IMPAIR_PROFILES,
+        help="Impairment profiles from roborock_sim.IMPAIRMENT_PROFILES",
+    )
+    impair.add_argument("--users", type=int, default=20)
+    impair.add_argument("--requests", type=int, default=1000, help="Commands per profile, split across users")
+    impair.add_argument("--devices", type=int, default=10)
+    impair.add_argument("--device-latency", type=float, default=0.005)
+    impair.add_argument("--deadline-ms", type=int, default=3000, help="Per-command deadline sent with each request")
+    impair.add_argument("--port", type=int, default=9877, help="Free TCP port for the test daemon")
+    args = parser.parse_args()
+
+    if args.benchmark == "codec":
+        result = bench_codec(args.iterations)
+    elif args.benchmark == "transport":
+        result = bench_transport(args.requests, args.port)
+    elif args.benchmark == "load":
+        result = bench_load(args.requests, args.concurrency, args.port)
+    elif args.benchmark == "impair":
+        result = bench_impair(args)
+    elif args.benchmark == "e2e":
+        result = bench_e2e(args)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(result, f, indent=2)
+        if args.baseline:
+            with open(args.baseline) as f:
+                result["regressions"] = _compare(result, json.load(f), args.tolerance)
+    print(json.dumps(result, indent=2))
+    if result.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,64 @@ This script provides a CLI interface for sending commands to Roborock devices.
 It reads credentials from stdin as JSON and outputs results as JSON.
 
 Usage:
-    echo '{...}' | python roborock_bridge.py command
+    echo '{...}' | python roborock_bridge.py command [--direct]
+    python roborock_bridge.py batch < requests.ndjson
+
+If a daemon answers /health (see roborock_client.py for how it is located),
+command and get_status requests are forwarded to it and reuse its warm MQTT
+session: the one for `user_id` if given, otherwise the session the backend
+opened with the same credentials. Without such a session or a reachable
+daemon, or with --direct, the bridge connects to MQTT itself.
+
+The batch action reads one JSON request per line. Each carries `rriot`,
+`device_id`, `local_key` and `command` (or `"action": "get_status"`), plus
+optional `params`, `deadline_ms` and an `id` echoed back in its result.
+Requests sharing credentials share one MQTT session and one subscription
+per device, and results are written as JSON lines in completion order.
 """
 
 import asyncio
+import hashlib
+import io
 import json
+import logging
 import sys
 from typing import Any
 
+from roborock_client import DaemonClient, DaemonUnavailable, forward, status_result
+
+
+def delegate_to_daemon(action: str):
+    """Answer the request through a running daemon and exit, if one is up.
+
+    Returns without consuming stdin when no daemon answers /health, and
+    puts stdin back when the daemon cannot take the request, so main() can
+    run it directly.
+    """
+    client = DaemonClient()
+    if not client.healthy():
+        return
+    raw = sys.stdin.read()
+    try:
+        input_data = json.loads(raw)
+        result = forward(client, action, input_data) if isinstance(input_data, dict) else None
+    except (ValueError, DaemonUnavailable):
+        result = None
+    if result is None:
+        sys.stdin = io.StringIO(raw)
+        return
+    print(json.dumps(result), file=sys.stdout)
+    sys.exit(0)
+
+
+# Delegate before paying for the python-roborock import below
+if __name__ == "__main__" and len(sys.argv) >= 2 and "--direct" not in sys.argv[2:]:
+    delegate_to_daemon(sys.argv[1])
+
 try:
+    from construct import ConstructError
     from roborock import RRiot, Reference, UserData
-    from roborock.protocol import create_mqtt_params
+    from roborock.protocol import create_mqtt_params, MessageParser
     from roborock.mqtt.roborock_session import RoborockMqttSession
     from roborock.devices.transport.mqtt_channel import MqttChannel
     from roborock.roborock_message import RoborockMessage, RoborockMessageProtocol
@@ -29,6 +76,8 @@ except ImportError as e:
     print(json.dumps({"error": f"python-roborock not installed: {e}"}), file=sys.stdout)
     sys.exit(1)
 
+log = logging.getLogger(__name__)
+
 
 def create_rriot(rriot_data: dict) -> RRiot:
     """Create RRiot object from dictionary."""
@@ -123,24 +172,248 @@ async def get_device_status(
     rriot: RRiot,
     device_id: str,
     local_key: str,
+    timeout: float = 15.0,
 ) -> dict[str, Any]:
     """Get the current status of a Roborock device."""
     result = await send_mqtt_request(
-        rriot, device_id, local_key, "get_status", timeout=15.0
+        rriot, device_id, local_key, "get_status", timeout=timeout
     )
 
-    if result.get("success") and result.get("result"):
-        # Parse status into a more friendly format
-        raw_status = result["result"]
-        if isinstance(raw_status, list) and len(raw_status) > 0:
-            raw_status = raw_status[0]
+    return status_result(result)
+
+
+# Requests a batch keeps in flight before it stops reading stdin
+BATCH_MAX_INFLIGHT = 32
+
+
+class BatchSession:
+    """One MQTT session shared by every batch request with the same credentials.
+
+    Each device is subscribed once; responses are matched to requests by
+    their RPC request id.
+    """
+
+    def __init__(self, rriot: RRiot):
+        self.rriot = rriot
+        self.mqtt_params = create_mqtt_params(rriot)
+        self.security_data = create_security_data(rriot)
+        self.session = RoborockMqttSession(self.mqtt_params)
+        self.local_keys: dict[str, str] = {}
+        self.pending: dict[tuple[str, int], asyncio.Future] = {}
+        self._started: asyncio.Task | None = None
+        self._subscriptions: dict[str, asyncio.Task] = {}
+
+    async def _subscribe(self, device_id: str):
+        await self.start()
+        topic = f"rr/m/o/{self.rriot.u}/{self.mqtt_params.username}/{device_id}"
+        return await self.session.subscribe(topic, lambda data: self._on_message(device_id, data))
+
+    def _on_message(self, device_id: str, data: bytes):
+        """Resolve the pending request a device response belongs to."""
+        try:
+            messages, _ = MessageParser.parse(data, self.local_keys[device_id])
+        except (ConstructError, RoborockException, ValueError) as e:
+            log.debug(f"Ignoring undecodable message from {device_id}: {e}")
+            return
+        for msg in messages:
+            if msg.protocol != RoborockMessageProtocol.RPC_RESPONSE:
+                continue
+            try:
+                response = decode_rpc_response(msg)
+            except (RoborockException, ValueError) as e:
+                log.debug(f"Ignoring undecodable response from {device_id}: {e}")
+                continue
+            # Responses to requests we did not send (or gave up on) are not ours
+            future = self.pending.pop((device_id, response.request_id), None)
+            if future is not None and not future.done():
+                future.set_result(response)
+
+    async def start(self):
+        """Connect once; concurrent callers share the same attempt.
+
+        A failed attempt is forgotten, so the next caller retries.
+        """
+        if self._started is None:
+            task = self._started = asyncio.ensure_future(self.session.start())
+
+            def forget(done: asyncio.Task):
+                if self._started is done and (done.cancelled() or done.exception() is not None):
+                    self._started = None
+
+            task.add_done_callback(forget)
+        await asyncio.shield(self._started)
+
+    async def request(
+        self,
+        device_id: str,
+        local_key: str,
+        command: str,
+        params: list | None = None,
+        timeout: float = 30.0,
+    ) -> dict[str, Any]:
+        """Send one command over the shared session and wait for its response."""
+        self.local_keys[device_id] = local_key
+        try:
+            subscription = self._subscriptions.get(device_id)
+            if subscription is None:
+                subscription = self._subscriptions[device_id] = asyncio.ensure_future(
+                    self._subscribe(device_id)
+                )
+
+                # A failed subscribe is retried by the device's next request
+                def forget(done: asyncio.Task):
+                    if self._subscriptions.get(device_id) is done and (
+                        done.cancelled() or done.exception() is not None
+                    ):
+                        del self._subscriptions[device_id]
+
+                subscription.add_done_callback(forget)
+            await asyncio.shield(subscription)
+
+            request = RequestMessage(method=command, params=params or [])
+            key = (device_id, request.request_id)
+            response_future: asyncio.Future = asyncio.get_event_loop().create_future()
+            self.pending[key] = response_future
+            message = request.encode_message(
+                protocol=RoborockMessageProtocol.RPC_REQUEST,
+                security_data=self.security_data,
+            )
+            encoded = MessageParser.build(message, local_key, prefixed=False)
+            publish_topic = f"rr/m/i/{self.rriot.u}/{self.mqtt_params.username}/{device_id}"
+            try:
+                await self.session.publish(publish_topic, encoded)
+                response = await asyncio.wait_for(response_future, timeout=timeout)
+            except asyncio.TimeoutError:
+                return {"success": False, "error": "Command timeout"}
+            finally:
+                self.pending.pop(key, None)
+
+            if response.api_error:
+                return {"success": False, "error": str(response.api_error)}
+            return {"success": True, "result": response.data}
+
+        except RoborockException as e:
+            return {"success": False, "error": str(e)}
+        except Exception as e:
+            return {"success": False, "error": f"Unexpected error: {str(e)}"}
+
+    async def close(self):
+        await self.session.close()
+
 
-        return {
-            "success": True,
-            "status": raw_status,
-        }
+def _credentials_key(rriot_data: dict) -> str:
+    canonical = json.dumps(rriot_data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
 
-    return result
+
+def _timeout_kwargs(input_data: dict) -> dict[str, float]:
+    """Map an optional `deadline_ms` budget to a timeout, capped at 30s.
+
+    Raises ValueError if deadline_ms is not a number.
+    """
+    if input_data.get("deadline_ms") is None:
+        return {}
+    try:
+        return {"timeout": min(float(input_data["deadline_ms"]) / 1000, 30.0)}
+    except (TypeError, ValueError):
+        raise ValueError("Invalid 'deadline_ms'") from None
+
+
+def _missing_field(action: str, input_data: dict) -> str | None:
+    """Return the error for the first required field input_data lacks."""
+    if "device_id" not in input_data:
+        return f"Missing 'device_id' for {action}"
+    if "local_key" not in input_data:
+        return f"Missing 'local_key' for {action}"
+    if action == "command" and "command" not in input_data:
+        return "Missing 'command' for command action"
+    return None
+
+
+async def run_batch():
+    """Serve newline-delimited JSON requests from stdin until EOF."""
+    loop = asyncio.get_running_loop()
+    sessions: dict[str, BatchSession] = {}
+    slots = asyncio.Semaphore(BATCH_MAX_INFLIGHT)
+    tasks: set[asyncio.Task] = set()
+
+    def emit(request_id: Any, result: dict[str, Any]):
+        sys.stdout.write(json.dumps({"id": request_id, **result}) + "\n")
+        sys.stdout.flush()
+
+    async def handle(request_id: Any, input_data: dict):
+        try:
+            action = input_data.get("action", "command")
+            if action not in ("command", "get_status"):
+                emit(request_id, {"success": False, "error": f"Unknown action: {action}"})
+                return
+            if "rriot" not in input_data:
+                emit(request_id, {"success": False, "error": "Missing 'rriot' in input"})
+                return
+            error = _missing_field(action, input_data)
+            if error:
+                emit(request_id, {"success": False, "error": error})
+                return
+            try:
+                timeout_kwargs = _timeout_kwargs(input_data)
+                key = _credentials_key(input_data["rriot"])
+                session = sessions.get(key)
+                if session is None:
+                    session = sessions[key] = BatchSession(create_rriot(input_data["rriot"]))
+            except KeyError as e:
+                emit(request_id, {"success": False, "error": f"Missing rriot field: {str(e)}"})
+                return
+            except Exception as e:
+                emit(request_id, {"success": False, "error": str(e)})
+                return
+
+            if action == "get_status":
+                timeout_kwargs.setdefault("timeout", 15.0)
+                result = status_result(await session.request(
+                    input_data["device_id"], input_data["local_key"], "get_status", **timeout_kwargs
+                ))
+            else:
+                result = await session.request(
+                    input_data["device_id"],
+                    input_data["local_key"],
+                    input_data["command"],
+                    input_data.get("params"),
+                    **timeout_kwargs,
+                )
+            emit(request_id, result)
+        finally:
+            slots.release()
+
+    line_number = 0
+    try:
+        while True:
+            await slots.acquire()
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                slots.release()
+                break
+            line_number += 1
+            if not line.strip():
+                slots.release()
+                continue
+            try:
+                input_data = json.loads(line)
+            except json.JSONDecodeError as e:
+                emit(line_number, {"success": False, "error": f"Invalid JSON input: {str(e)}"})
+                slots.release()
+                continue
+            if not isinstance(input_data, dict):
+                emit(line_number, {"success": False, "error": "Expected a JSON object"})
+                slots.release()
+                continue
+            task = asyncio.create_task(handle(input_data.get("id", line_number), input_data))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        for session in sessions.values():
+            await session.close()
 
 
 def main():
@@ -150,6 +423,10 @@ def main():
 
     action = sys.argv[1]
 
+    if action == "batch":
+        asyncio.run(run_batch())
+        return
+
     # Read input from stdin
     try:
         input_data = json.loads(sys.stdin.read())
@@ -171,38 +448,37 @@ def main():
         print(json.dumps({"error": f"Failed to create rriot: {str(e)}"}), file=sys.stdout)
         sys.exit(1)
 
-    if action == "command":
-        if "device_id" not in input_data:
-            print(json.dumps({"error": "Missing 'device_id' for command"}), file=sys.stdout)
-            sys.exit(1)
-        if "local_key" not in input_data:
-            print(json.dumps({"error": "Missing 'local_key' for command"}), file=sys.stdout)
-            sys.exit(1)
-        if "command" not in input_data:
-            print(json.dumps({"error": "Missing 'command' for command action"}), file=sys.stdout)
+    # Optional caller deadline, as the remaining budget in milliseconds
+    try:
+        timeout_kwargs = _timeout_kwargs(input_data)
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}), file=sys.stdout)
+        sys.exit(1)
+
+    if action in ("command", "get_status"):
+        error = _missing_field(action, input_data)
+        if error:
+            print(json.dumps({"error": error}), file=sys.stdout)
             sys.exit(1)
 
+    if action == "command":
+
         result = asyncio.run(send_mqtt_request(
             rriot,
             input_data["device_id"],
             input_data["local_key"],
             input_data["command"],
             input_data.get("params"),
+            **timeout_kwargs,
         ))
         print(json.dumps(result), file=sys.stdout)
 
     elif action == "get_status":
-        if "device_id" not in input_data:
-            print(json.dumps({"error": "Missing 'device_id' for get_status"}), file=sys.stdout)
-            sys.exit(1)
-        if "local_key" not in input_data:
-            print(json.dumps({"error": "Missing 'local_key' for get_status"}), file=sys.stdout)
-            sys.exit(1)
-
         result = asyncio.run(get_device_status(
             rriot,
             input_data["device_id"],
             input_data["local_key"],
+            **timeout_kwargs,
         ))
         print(json.dumps(result), file=sys.stdout)
 
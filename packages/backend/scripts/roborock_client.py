@@ -0,0 +1,159 @@
+"""Client for a running Roborock daemon, using only the standard library.
+
+The bridge uses this to hand requests to a warm daemon session instead of
+importing python-roborock and opening its own MQTT connection. Nothing here
+may import python-roborock, or the point of delegating is lost.
+
+The daemon is found on ROBOROCK_DAEMON_SOCKET (a Unix socket path) if set,
+otherwise on 127.0.0.1:ROBOROCK_DAEMON_PORT (default 9876).
+"""
+
+import http.client
+import json
+import os
+import socket
+from typing import Any
+
+DEFAULT_PORT = 9876
+HEALTH_TIMEOUT = 0.5  # seconds; a live daemon answers /health immediately
+# Headroom over the daemon's own 30s command timeout
+REQUEST_TIMEOUT = 35.0
+
+
+class DaemonUnavailable(Exception):
+    """No daemon answered, or it went away mid-request."""
+
+
+class DaemonRequestLost(DaemonUnavailable):
+    """The daemon went away after the request was sent.
+
+    The request may already have run, so it must not be retried elsewhere.
+    """
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket."""
+
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class DaemonClient:
+    """Blocking JSON-over-HTTP calls to the daemon."""
+
+    def __init__(self, port: int | None = None, unix_socket: str | None = None):
+        self.unix_socket = unix_socket if unix_socket is not None else os.environ.get("ROBOROCK_DAEMON_SOCKET")
+        self.port = port if port is not None else int(os.environ.get("ROBOROCK_DAEMON_PORT", DEFAULT_PORT))
+
+    def _connect(self, timeout: float) -> http.client.HTTPConnection:
+        if self.unix_socket:
+            return UnixHTTPConnection(self.unix_socket, timeout)
+        return http.client.HTTPConnection("127.0.0.1", self.port, timeout=timeout)
+
+    def call(self, method: str, path: str, body: Any = None, timeout: float = REQUEST_TIMEOUT) -> dict[str, Any]:
+        """Make one request and return the decoded JSON response.
+
+        Raises DaemonUnavailable if the daemon cannot be reached, or
+        DaemonRequestLost if it fails after the request was sent or does not
+        answer with JSON.
+        """
+        conn = self._connect(timeout)
+        try:
+            try:
+                conn.connect()
+            except OSError as e:
+                raise DaemonUnavailable(str(e)) from e
+            payload = json.dumps(body).encode() if body is not None else None
+            headers = {"Content-Type": "application/json"} if payload is not None else {}
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                resp = conn.getresponse()
+                return json.loads(resp.read())
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                raise DaemonRequestLost(str(e)) from e
+        finally:
+            conn.close()
+
+    def healthy(self) -> bool:
+        """Probe /health; False unless the daemon answers promptly."""
+        try:
+            return self.call("GET", "/health", timeout=HEALTH_TIMEOUT).get("status") == "ok"
+        except DaemonUnavailable:
+            return False
+
+
+def status_result(result: dict[str, Any]) -> dict[str, Any]:
+    """Turn a get_status command result into the status response shape."""
+    if result.get("success") and result.get("result"):
+        # Parse status into a more friendly format
+        raw_status = result["result"]
+        if isinstance(raw_status, list) and len(raw_status) > 0:
+            raw_status = raw_status[0]
+
+        return {
+            "success": True,
+            "status": raw_status,
+        }
+
+    return result
+
+
+def forward(client: DaemonClient, action: str, input_data: dict) -> dict[str, Any] | None:
+    """Run a bridge command or get_status request on the daemon.
+
+    The daemon session is keyed by `user_id`. Without one, the request joins
+    the session the backend already opened with the same credentials, and
+    is not delegated if there is none, so no second MQTT connection is left
+    behind. Returns None when the request is not one the daemon can take
+    as-is, so the caller validates and runs it directly. Raises
+    DaemonUnavailable if the daemon goes away before the command is sent;
+    once it may have been sent, the failure is returned as the result so the
+    command never runs twice.
+    """
+    rriot = input_data.get("rriot")
+    required = ("device_id", "local_key", "command") if action == "command" else ("device_id", "local_key")
+    if action not in ("command", "get_status") or not isinstance(rriot, dict):
+        return None
+    if not all(isinstance(input_data.get(key), str) and input_data[key] for key in required):
+        return None
+    user_id = input_data.get("user_id")
+
+    device_id = input_data["device_id"]
+    local_key = input_data["local_key"]
+    timeout = REQUEST_TIMEOUT
+    command = {
+        "device_id": device_id,
+        "local_key": local_key,
+        "command": input_data.get("command", "get_status"),
+        "params": input_data.get("params"),
+    }
+    if input_data.get("deadline_ms") is not None:
+        try:
+            deadline_ms = float(input_data["deadline_ms"])
+        except (TypeError, ValueError):
+            return None
+        command["deadline_ms"] = deadline_ms
+        timeout = min(timeout, deadline_ms / 1000 + 1.0)
+
+    # Same credentials reuse the existing session without reconnecting
+    init_body = {"rriot": rriot, "devices": {device_id: local_key}}
+    if user_id:
+        init_body["user_id"] = user_id
+    init = client.call("POST", "/init", init_body)
+    if not init.get("success"):
+        if not user_id:
+            return None
+        return {"success": False, "error": init.get("error", "Daemon init failed")}
+    command["user_id"] = init.get("user_id", user_id)
+
+    try:
+        result = client.call("POST", "/command", command, timeout=timeout)
+    except DaemonRequestLost as e:
+        return {"success": False, "error": f"Daemon failed mid-request: {e}"}
+    return status_result(result) if action == "get_status" else result
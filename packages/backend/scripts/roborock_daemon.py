@@ -6,24 +6,67 @@ eliminating the overhead of spawning a new Python process for each command.
 
 Usage:
     python roborock_daemon.py --port 9876
+    python roborock_daemon.py --unix-socket /run/smarthome/roborock.sock
+    python roborock_daemon.py --stdio
 
 HTTP API:
     POST /init - Initialize MQTT connection with rriot credentials
     POST /command - Send command to a device
+    POST /commands - Send many commands concurrently with per-item results
+    GET /events - Server-sent stream of unsolicited device state pushes
     GET /health - Health check
+    GET /metrics - Prometheus metrics (command latency by phase, timeouts, errors)
     POST /shutdown - Graceful shutdown
+
+With --stdio the same operations (init, command, commands, health, metrics,
+disconnect, shutdown) are served as length-prefixed msgpack frames on
+stdin/stdout instead, and device pushes are written as "event" frames.
+
+--record PATH writes every raw MQTT payload sent or received, with
+timestamps, to PATH; roborock_replay.py feeds a recording back through the
+parse/dispatch path offline.
+
+When installed, uvloop runs the event loop and orjson encodes/decodes HTTP
+bodies (`pip install uvloop orjson`). Both are auto-detected; force either
+way with --uvloop/--no-uvloop and --orjson/--no-orjson.
 """
 
 import argparse
 import asyncio
+import bisect
+import hashlib
 import json
 import logging
+import math
+import os
+import random
 import signal
+import struct
 import sys
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field, replace
+from enum import Enum
 from http import HTTPStatus
 from typing import Any
 from aiohttp import web
 
+try:
+    import msgpack
+except ImportError:  # only needed for --stdio
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # optional faster JSON codec
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:  # optional faster event loop
+    uvloop = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -34,11 +77,22 @@ log = logging.getLogger(__name__)
 
 try:
     from roborock import RRiot, Reference
-    from roborock.protocol import create_mqtt_params, MessageParser
+    from roborock.protocol import (
+        create_mqtt_params,
+        create_mqtt_decoder,
+        create_mqtt_encoder,
+        Decoder,
+        Encoder,
+    )
+    from roborock.mqtt.session import MqttParams, MqttSessionUnauthorized
+    from roborock.callbacks import CallbackMap
     from roborock.mqtt.roborock_session import RoborockMqttSession
     from roborock.roborock_message import RoborockMessageProtocol
+    from roborock.roborock_typing import RoborockCommand
     from roborock.protocols.v1_protocol import (
         RequestMessage,
+        SecurityData,
+        decode_data_protocol_message,
         decode_rpc_response,
         create_security_data,
     )
@@ -48,16 +102,870 @@ except ImportError as e:
     sys.exit(1)
 
 
+class TopicRouter(CallbackMap):
+    """CallbackMap that also routes messages matched by a `+` wildcard.
+
+    RoborockMqttSession dispatches on the exact topic string, so a wildcard
+    subscription would never see its messages. Prefix handlers registered
+    here receive the last topic level (the device id) plus the payload.
+    """
+
+    def __init__(self, logger: logging.Logger | None = None):
+        super().__init__(logger)
+        self.prefix_handlers: dict[str, Callable[[str, bytes], None]] = {}  # topic prefix -> handler
+
+    def __call__(self, key: str, value: bytes) -> None:
+        super().__call__(key, value)
+        prefix, _, suffix = key.rpartition("/")
+        handler = self.prefix_handlers.get(prefix)
+        if handler:
+            try:
+                handler(suffix, value)
+            except Exception as e:
+                log.error(f"Uncaught error routing message for {suffix}: {e}")
+
+
+class WildcardMqttSession(RoborockMqttSession):
+    """RoborockMqttSession with single-level wildcard subscriptions.
+
+    `on_connection_change(connected)` is called whenever the session's
+    connection to the broker comes up or goes down. The base class retries
+    dropped connections itself; `on_stopped()` is called if its reconnect
+    loop ends while the session is still in use.
+    """
+
+    def __init__(self, params, *args, **kwargs):
+        self.on_connection_change: Callable[[bool], None] | None = None
+        self.on_stopped: Callable[[], None] | None = None
+        super().__init__(params, *args, **kwargs)
+        self._listeners = TopicRouter(log)
+
+    @property
+    def _healthy(self) -> bool:
+        return self._connected
+
+    @_healthy.setter
+    def _healthy(self, value: bool):
+        # The base class flips _healthy around each broker connection
+        changed = value != getattr(self, "_connected", False)
+        self._connected = value
+        if changed and self.on_connection_change is not None:
+            self.on_connection_change(value)
+
+    async def start(self) -> None:
+        await super().start()
+        self._reconnect_task.add_done_callback(self._reconnect_loop_done)
+
+    def _reconnect_loop_done(self, _task: asyncio.Task):
+        if self.on_stopped is not None:
+            self.on_stopped()
+
+    async def subscribe_prefix(
+        self, prefix: str, handler: Callable[[str, bytes], None]
+    ) -> Callable[[], None]:
+        """Subscribe to `prefix/+` and call handler(last_level, payload) per message."""
+        self._listeners.prefix_handlers[prefix] = handler
+        try:
+            # The no-op listener keeps the topic registered for idle tracking and resubscribe
+            unsubscribe = await self.subscribe(f"{prefix}/+", lambda _payload: None)
+        except Exception:
+            self._listeners.prefix_handlers.pop(prefix, None)
+            raise
+
+        def unsubscribe_prefix():
+            self._listeners.prefix_handlers.pop(prefix, None)
+            unsubscribe()
+
+        return unsubscribe_prefix
+
+
+# Seconds to wait for a device response unless the caller asks otherwise
+COMMAND_TIMEOUT = 30.0  # upper bound for any single command
+
+# Errors reported when a command runs out of time
+TIMEOUT_ERRORS = frozenset({"Command timeout", "Deadline exceeded"})
+
+# Backoff between attempts to replace a session whose own reconnect loop
+# has stopped: full jitter over
+# RECONNECT_BASE_DELAY * 2**attempt, capped at RECONNECT_MAX_DELAY seconds
+RECONNECT_BASE_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+
+
+class SessionState(str, Enum):
+    """Connection state of a user's MQTT session."""
+
+    CONNECTING = "connecting"
+    READY = "ready"
+    BACKING_OFF = "backing_off"
+    UNAUTHORIZED = "unauthorized"  # broker rejected the credentials
+
+
+# Maximum number of items accepted by one /commands request
+MAX_BATCH_SIZE = 100
+
+# Commands reported under their own name in metrics and learned timeouts;
+# anything else a caller sends is grouped as "other" so label cardinality
+# and per-method state stay bounded
+KNOWN_COMMANDS = frozenset(command.value for command in RoborockCommand)
+
+
+def method_label(command: str) -> str:
+    return command if command in KNOWN_COMMANDS else "other"
+
+
+# Read-only commands whose identical concurrent requests share one RPC
+READ_COMMANDS = frozenset({
+    "get_status",
+    "get_consumable",
+    "get_room_mapping",
+    "get_clean_summary",
+    "get_network_info",
+})
+
+
+@dataclass
+class DeviceContext:
+    """Per-device codec state, rebuilt only when the local key changes."""
+
+    local_key: str
+    publish_topic: str
+    encode: Encoder
+    decode: Decoder
+
+
+@dataclass
+class UserContext:
+    """Per-user values derived once from the rriot credentials."""
+
+    rriot: RRiot
+    fingerprint: str  # sha256 of the raw rriot payload
+    mqtt_params: MqttParams
+    security_data: SecurityData
+    publish_prefix: str  # rr/m/i/{u}/{username}
+    subscribe_prefix: str  # rr/m/o/{u}/{username}
+    devices: dict[str, DeviceContext] = field(default_factory=dict)  # device_id -> context
+
+    @classmethod
+    def create(cls, rriot: RRiot, fingerprint: str = "") -> "UserContext":
+        mqtt_params = create_mqtt_params(rriot)
+        return cls(
+            rriot=rriot,
+            fingerprint=fingerprint,
+            mqtt_params=mqtt_params,
+            security_data=create_security_data(rriot),
+            publish_prefix=f"rr/m/i/{rriot.u}/{mqtt_params.username}",
+            subscribe_prefix=f"rr/m/o/{rriot.u}/{mqtt_params.username}",
+        )
+
+    @property
+    def connection_key(self) -> tuple:
+        """Values that require a new broker connection when they change."""
+        p = self.mqtt_params
+        return (p.host, p.port, p.tls, p.username, p.password, self.publish_prefix)
+
+    def device(self, device_id: str, local_key: str) -> DeviceContext:
+        """Return the device context, rebuilding it if the local key changed."""
+        ctx = self.devices.get(device_id)
+        if ctx is None or ctx.local_key != local_key:
+            ctx = DeviceContext(
+                local_key=local_key,
+                publish_topic=f"{self.publish_prefix}/{device_id}",
+                encode=create_mqtt_encoder(local_key),
+                decode=create_mqtt_decoder(local_key),
+            )
+            self.devices[device_id] = ctx
+        return ctx
+
+
+@dataclass
+class CachedStatus:
+    """A successful get_status result and when it was fetched."""
+
+    result: dict[str, Any]
+    fetched_at: float
+
+
+class StatusCache:
+    """Per-device get_status cache with stale-while-revalidate.
+
+    Entries younger than `ttl` are served from memory. Entries up to
+    `ttl + stale` old are served immediately while a single background
+    refresh runs. Older or missing entries wait for a fresh fetch, which
+    concurrent readers share.
+    """
+
+    def __init__(self, ttl: float, stale: float):
+        self.ttl = ttl
+        self.stale = stale
+        self.entries: dict[str, CachedStatus] = {}  # user_id:device_id -> status
+        self.refreshing: dict[str, asyncio.Task] = {}  # user_id:device_id -> fetch task
+        self.generations: dict[str, int] = {}  # user_id:device_id -> invalidation count
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0}
+
+    async def get(self, key: str, fetch: Callable[[], Any]) -> dict[str, Any]:
+        """Return the cached status for key, calling fetch() to refresh it."""
+        entry = self.entries.get(key)
+        if entry is not None and self.ttl > 0:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.ttl:
+                self.stats["hits"] += 1
+                return {**entry.result, "cached": True, "age": round(age, 3)}
+            if age < self.ttl + self.stale:
+                self.stats["stale_hits"] += 1
+                self._refresh(key, fetch)
+                return {**entry.result, "cached": True, "stale": True, "age": round(age, 3)}
+
+        self.stats["misses"] += 1
+        return await asyncio.shield(self._refresh(key, fetch))
+
+    def _refresh(self, key: str, fetch: Callable[[], Any]) -> asyncio.Task:
+        """Start a fetch for key unless one is already running."""
+        task = self.refreshing.get(key)
+        if task is None:
+            self.stats["refreshes"] += 1
+            generation = self.generations.get(key, 0)
+            task = asyncio.ensure_future(self._fetch(key, fetch, generation))
+            self.refreshing[key] = task
+        return task
+
+    async def _fetch(self, key: str, fetch: Callable[[], Any], generation: int) -> dict[str, Any]:
+        try:
+            result = await fetch()
+            # A fetch that was in flight when the key was invalidated may
+            # carry the state from before the command, so it is not cached
+            if result.get("success") and self.generations.get(key, 0) == generation:
+                self.entries[key] = CachedStatus(result=result, fetched_at=time.monotonic())
+            return result
+        finally:
+            if self.refreshing.get(key) is asyncio.current_task():
+                del self.refreshing[key]
+
+    def invalidate(self, key: str):
+        """Drop a device's entry, e.g. after a command that changes its state.
+
+        A refresh already in flight still answers its waiting readers, but
+        its result is not cached and the next reader starts a new fetch.
+        """
+        self.generations[key] = self.generations.get(key, 0) + 1
+        self.entries.pop(key, None)
+        self.refreshing.pop(key, None)
+
+    def invalidate_user(self, user_id: str):
+        """Drop every entry belonging to a user."""
+        prefix = f"{user_id}:"
+        for key in [k for k in {**self.entries, **self.refreshing} if k.startswith(prefix)]:
+            self.invalidate(key)
+
+
+@dataclass
+class DeviceHealth:
+    """Presence and failure tracking for one device."""
+
+    last_seen: float | None = None  # monotonic time of the last MQTT message
+    failures: int = 0  # consecutive command timeouts
+    opened_at: float | None = None  # set while the circuit is open
+    probe: asyncio.Task | None = None
+
+
+class CircuitBreaker:
+    """Per-device circuit breaker fed by MQTT traffic and command timeouts.
+
+    After `threshold` consecutive timeouts a device's circuit opens and
+    commands are rejected immediately. While open, `probe()` is retried
+    every `probe_interval` seconds in the background; a successful probe or
+    any message from the device closes the circuit again.
+    """
+
+    def __init__(self, threshold: int = 3, probe_interval: float = 15.0):
+        self.threshold = threshold
+        self.probe_interval = probe_interval
+        self.devices: dict[str, DeviceHealth] = {}  # user_id:device_id -> health
+
+    def allow(self, key: str) -> bool:
+        health = self.devices.get(key)
+        return health is None or health.opened_at is None
+
+    def seen(self, key: str):
+        """Record traffic from the device, which proves it is online."""
+        health = self.devices.get(key)
+        if health is None:
+            health = self.devices[key] = DeviceHealth()
+        health.last_seen = time.monotonic()
+        health.failures = 0
+        if health.opened_at is not None:
+            self._close(key, health)
+
+    def record_timeout(self, key: str, probe: Callable[[], Any]):
+        """Count a timeout, opening the circuit once the threshold is hit."""
+        health = self.devices.get(key)
+        if health is None:
+            health = self.devices[key] = DeviceHealth()
+        health.failures += 1
+        if health.failures >= self.threshold and health.opened_at is None:
+            health.opened_at = time.monotonic()
+            health.probe = asyncio.ensure_future(self._probe(key, health, probe))
+            log.warning(f"Device {key} marked offline after {health.failures} timeouts")
+
+    async def _probe(self, key: str, health: DeviceHealth, probe: Callable[[], Any]):
+        while health.opened_at is not None:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                if await probe():
+                    self.seen(key)
+            except Exception as e:
+                log.debug(f"Probe of {key} failed: {e}")
+
+    def _close(self, key: str, health: DeviceHealth):
+        health.opened_at = None
+        if health.probe is not None and health.probe is not asyncio.current_task():
+            health.probe.cancel()
+        health.probe = None
+        log.info(f"Device {key} is back online")
+
+    def open_keys(self) -> list[str]:
+        return [key for key, health in self.devices.items() if health.opened_at is not None]
+
+    def forget_user(self, user_id: str):
+        """Drop tracking for a user's devices and stop their probes."""
+        prefix = f"{user_id}:"
+        for key in [k for k in self.devices if k.startswith(prefix)]:
+            health = self.devices.pop(key)
+            if health.probe is not None:
+                health.probe.cancel()
+
+
+class EventHub:
+    """Fan-out of device push events to /events stream subscribers.
+
+    Each subscriber gets a bounded queue; a slow consumer loses its oldest
+    events rather than stalling MQTT dispatch. After close() every queue
+    yields None, which tells its stream to end.
+    """
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self.subscribers: dict[asyncio.Queue, str | None] = {}  # queue -> user_id filter
+        self.closed = False
+
+    def subscribe(self, user_id: str | None = None) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.closed:
+            queue.put_nowait(None)
+        self.subscribers[queue] = user_id
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.pop(queue, None)
+
+    def publish(self, event: dict[str, Any]):
+        for queue, user_filter in self.subscribers.items():
+            if user_filter is not None and user_filter != event.get("user_id"):
+                continue
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def close(self):
+        """End every subscriber's stream, e.g. on shutdown."""
+        self.closed = True
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+
+class AdaptiveTimeouts:
+    """Per-method command timeouts learned from observed RPC latency.
+
+    A method's timeout is its recent p99 latency times `multiplier`, clamped
+    to [min_timeout, max_timeout]. Methods with too few samples of their own
+    fall back to the p99 across all methods, but never below `multiplier`
+    times their slowest sample; methods never seen before get max_timeout.
+    A timed-out attempt raises the method's timeout to `timeout_bump` times
+    the time it waited, so a method slower than its current timeout gets a
+    longer one instead of timing out indefinitely; the raise halves with each
+    later success. Timeouts are recomputed every `recompute_every`
+    observations rather than per command.
+    """
+
+    def __init__(
+        self,
+        multiplier: float = 3.0,
+        min_timeout: float = 2.0,
+        max_timeout: float = COMMAND_TIMEOUT,
+        window: int = 200,
+        min_samples: int = 20,
+        recompute_every: int = 10,
+        timeout_bump: float = 2.0,
+    ):
+        self.multiplier = multiplier
+        self.timeout_bump = timeout_bump
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_samples = min_samples
+        self.recompute_every = recompute_every
+        self.samples: dict[str, deque[float]] = {}  # method -> recent latencies
+        self.overall: deque[float] = deque(maxlen=window)
+        self.timeouts: dict[str, float] = {}  # method -> learned timeout
+        self.bumps: dict[str, float] = {}  # method -> raise after a timeout
+        self.default = max_timeout
+        self._window = window
+        self._since_recompute = 0
+
+    def observe(self, method: str, latency: float):
+        """Record the latency of a successful RPC."""
+        samples = self.samples.get(method)
+        if samples is None:
+            samples = self.samples[method] = deque(maxlen=self._window)
+        samples.append(latency)
+        self.overall.append(latency)
+        bump = self.bumps.get(method)
+        if bump is not None:
+            if bump / 2 <= self.min_timeout:
+                del self.bumps[method]
+            else:
+                self.bumps[method] = bump / 2
+        self._since_recompute += 1
+        if self._since_recompute >= self.recompute_every:
+            self._since_recompute = 0
+            self._recompute()
+
+    def observe_timeout(self, method: str, waited: float):
+        """Record an RPC that got no response within `waited` seconds.
+
+        The true latency is only known to be at least `waited`, so it is not
+        kept as a sample, where the p99 multiplier would compound it on every
+        timeout. It raises the method's timeout instead, capped at max_timeout.
+        """
+        bump = min(self.max_timeout, waited * self.timeout_bump)
+        self.bumps[method] = max(self.bumps.get(method, 0.0), bump)
+
+    def timeout_for(self, method: str) -> float:
+        learned = self.timeouts.get(method)
+        if learned is None:
+            samples = self.samples.get(method)
+            if not samples:
+                return self.max_timeout
+            learned = min(self.max_timeout, max(self.default, max(samples) * self.multiplier))
+        return max(learned, self.bumps.get(method, 0.0))
+
+    def _learned(self, samples: deque[float]) -> float:
+        ordered = sorted(samples)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.multiplier))
+
+    def _recompute(self):
+        if len(self.overall) >= self.min_samples:
+            self.default = self._learned(self.overall)
+        self.timeouts = {
+            method: self._learned(samples)
+            for method, samples in self.samples.items()
+            if len(samples) >= self.min_samples
+        }
+
+
+# Hard cap on device RPCs awaiting a response across all users
+MAX_PENDING_RESPONSES = 10000
+
+# Pending-response timer wheel: deadlines are rounded up to PENDING_TICK
+# seconds, and PENDING_WHEEL_SLOTS ticks cover COMMAND_TIMEOUT in one turn
+PENDING_TICK = 0.05
+PENDING_WHEEL_SLOTS = 1024
+
+
+class PendingResponses:
+    """Device RPCs awaiting a response, keyed user_id:device_id:rpc_id.
+
+    Each entry is a future plus the wheel tick at which its deadline passes.
+    A single reaper task walks the timer wheel every PENDING_TICK and fails
+    expired futures with asyncio.TimeoutError, so waiting callers need no
+    timer of their own, and it exits whenever the table is empty. The table
+    refuses new entries beyond `capacity`.
+    """
+
+    def __init__(
+        self,
+        capacity: int = MAX_PENDING_RESPONSES,
+        tick: float = PENDING_TICK,
+        slots: int = PENDING_WHEEL_SLOTS,
+    ):
+        self.capacity = capacity
+        self.tick = tick
+        self.entries: dict[str, tuple[asyncio.Future, int]] = {}  # key -> (future, expiry tick)
+        self.wheel: list[set[str]] = [set() for _ in range(slots)]
+        self.stats = {"expired": 0, "rejected": 0}
+        self._reaper: asyncio.Task | None = None
+        self._reaped_tick = 0  # last tick the reaper has processed
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def full(self) -> bool:
+        return len(self.entries) >= self.capacity
+
+    def add(self, key: str, timeout: float) -> asyncio.Future:
+        """Register a future for `key` that fails after `timeout` seconds."""
+        loop = asyncio.get_running_loop()
+        now = int(loop.time() / self.tick)
+        expiry = max(now + 1, math.ceil((loop.time() + timeout) / self.tick))
+        future = loop.create_future()
+        self.entries[key] = (future, expiry)
+        self.wheel[expiry % len(self.wheel)].add(key)
+        if self._reaper is None or self._reaper.done():
+            self._reaped_tick = now
+            self._reaper = loop.create_task(self._reap())
+        return future
+
+    def extend(self, key: str, timeout: float):
+        """Push back the deadline of `key` to `timeout` seconds from now, if later."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        future, expiry = entry
+        new_expiry = math.ceil((asyncio.get_running_loop().time() + timeout) / self.tick)
+        if new_expiry > expiry:
+            self.wheel[expiry % len(self.wheel)].discard(key)
+            self.wheel[new_expiry % len(self.wheel)].add(key)
+            self.entries[key] = (future, new_expiry)
+
+    def pop(self, key: str, default: asyncio.Future | None = None) -> asyncio.Future | None:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return default
+        self.wheel[entry[1] % len(self.wheel)].discard(key)
+        return entry[0]
+
+    def pop_prefix(self, prefix: str) -> list[asyncio.Future]:
+        """Remove and return every future whose key starts with `prefix`."""
+        return [self.pop(key) for key in [k for k in self.entries if k.startswith(prefix)]]
+
+    async def _reap(self):
+        loop = asyncio.get_running_loop()
+        slots = len(self.wheel)
+        while self.entries:
+            await asyncio.sleep(self.tick)
+            now = int(loop.time() / self.tick)
+            # After a long stall one pass over the wheel covers every slot
+            for tick in range(max(self._reaped_tick + 1, now - slots + 1), now + 1):
+                slot = self.wheel[tick % slots]
+                for key in [k for k in slot if self.entries[k][1] <= now]:
+                    slot.discard(key)
+                    future, _ = self.entries.pop(key)
+                    if not future.done():
+                        future.set_exception(asyncio.TimeoutError())
+                    self.stats["expired"] += 1
+            self._reaped_tick = now
+
+
+# Traffic recordings: TRAFFIC_MAGIC, then one record per MQTT message of
+# TRAFFIC_RECORD (unix time, direction, user id, topic and payload lengths)
+# followed by the user id, topic and raw payload bytes.
+TRAFFIC_MAGIC = b"RRMQREC1"
+TRAFFIC_RECORD = struct.Struct(">dBHHI")
+TRAFFIC_INBOUND = 0
+TRAFFIC_OUTBOUND = 1
+
+
+@dataclass
+class TrafficRecord:
+    """One recorded MQTT message."""
+
+    ts: float
+    direction: int  # TRAFFIC_INBOUND or TRAFFIC_OUTBOUND
+    user_id: str
+    topic: str
+    payload: bytes
+
+    @property
+    def device_id(self) -> str:
+        return self.topic.rpartition("/")[2]
+
+
+class TrafficRecorder:
+    """Appends raw MQTT payloads with timestamps to a recording file.
+
+    Payloads are stored as sent on the wire, still encrypted with each
+    device's local key; replaying them needs the keys supplied separately.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(TRAFFIC_MAGIC)
+        self.records = 0
+
+    def write(self, direction: int, user_id: str, topic: str, payload: bytes):
+        user = user_id.encode()
+        topic_bytes = topic.encode()
+        self.file.write(
+            TRAFFIC_RECORD.pack(time.time(), direction, len(user), len(topic_bytes), len(payload))
+            + user + topic_bytes + payload
+        )
+        self.records += 1
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+            log.info(f"Recorded {self.records} MQTT messages to {self.path}")
+
+
+def read_traffic(path: str) -> list[TrafficRecord]:
+    """Load every record from a file written by TrafficRecorder."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(TRAFFIC_MAGIC):
+        raise ValueError(f"{path} is not a traffic recording")
+    records = []
+    offset = len(TRAFFIC_MAGIC)
+    while offset + TRAFFIC_RECORD.size <= len(data):
+        ts, direction, user_len, topic_len, payload_len = TRAFFIC_RECORD.unpack_from(data, offset)
+        offset += TRAFFIC_RECORD.size
+        end = offset + user_len + topic_len + payload_len
+        if end > len(data):
+            break  # truncated final record from an unclean stop
+        user_id = data[offset:offset + user_len].decode()
+        offset += user_len
+        topic = data[offset:offset + topic_len].decode()
+        offset += topic_len
+        records.append(TrafficRecord(ts, direction, user_id, topic, data[offset:end]))
+        offset = end
+    return records
+
+
+# Latency buckets in seconds; device round trips range from ~50ms to the timeout
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    """Prometheus histogram keyed by a tuple of label values.
+
+    observe() is a bisect and three additions; cumulative bucket counts are
+    only computed when rendering.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...], buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series: dict[tuple[str, ...], list] = {}  # labels -> [bucket counts, sum, count]
+
+    def observe(self, labels: tuple[str, ...], value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                le = _labels((*self.label_names, "le"), (*labels, str(bound)))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            suffix = _labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Counter:
+    """Prometheus counter keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.series: dict[tuple[str, ...], float] = {}
+
+    def inc(self, labels: tuple[str, ...], amount: float = 1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in self.series.items():
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+def _gauge(name: str, help_text: str, samples: list[tuple[str, float]]) -> list[str]:
+    """Render a gauge from (label string, value) samples computed at scrape time."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+    return lines
+
+
+class DaemonMetrics:
+    """Command latency, outcome and concurrency instrumentation for /metrics.
+
+    Only histograms and counters are updated on the hot path. Gauges such as
+    pending RPCs and per-user connection state are read from daemon state
+    when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self.command_latency = Histogram(
+            "roborock_command_duration_seconds",
+            "End-to-end send_command latency, including cache hits",
+            ("method",),
+        )
+        self.phase_latency = Histogram(
+            "roborock_rpc_phase_duration_seconds",
+            "Device RPC latency by phase (subscribe, publish, await_response)",
+            ("method", "phase"),
+        )
+        self.timeouts = Counter(
+            "roborock_command_timeouts_total", "Commands that timed out waiting for the device", ("method",)
+        )
+        self.errors = Counter(
+            "roborock_command_errors_total", "Commands that failed other than by timing out", ("method",)
+        )
+        self.commands_in_flight = 0
+
+    def render(self, daemon: "RoborockDaemon") -> str:
+        cache = daemon.status_cache.stats
+        lines = [
+            *self.command_latency.render(),
+            *self.phase_latency.render(),
+            *self.timeouts.render(),
+            *self.errors.render(),
+            *_gauge(
+                "roborock_commands_in_flight",
+                "send_command calls currently running",
+                [("", self.commands_in_flight)],
+            ),
+            *_gauge(
+                "roborock_rpcs_in_flight",
+                "Device RPCs awaiting a response (pending response table size)",
+                [("", len(daemon.pending_responses))],
+            ),
+            *_gauge(
+                "roborock_pending_responses_capacity",
+                "Maximum device RPCs awaiting a response before commands are rejected",
+                [("", daemon.pending_responses.capacity)],
+            ),
+            *_gauge(
+                "roborock_session_connected",
+                "Whether the user's MQTT session is connected",
+                [
+                    (_labels(("user_id",), (user_id,)), int(session.connected))
+                    for user_id, session in daemon.sessions.items()
+                ],
+            ),
+            *_gauge(
+                "roborock_command_timeout_seconds",
+                "Timeout learned from each method's observed latency",
+                [
+                    (_labels(("method",), (method,)), value)
+                    for method, value in daemon.timeouts.timeouts.items()
+                ],
+            ),
+            *_gauge(
+                "roborock_command_timeout_default_seconds",
+                "Timeout for methods without enough samples of their own",
+                [("", daemon.timeouts.default)],
+            ),
+            *_gauge(
+                "roborock_session_state",
+                "Per-user session state (connecting, ready, backing_off, unauthorized)",
+                [
+                    (_labels(("user_id", "state"), (user_id, state.value)), 1)
+                    for user_id, state in daemon.session_states.items()
+                ],
+            ),
+            *_gauge(
+                "roborock_devices_offline",
+                "Devices whose circuit is open after consecutive timeouts",
+                [("", len(daemon.breaker.open_keys()))],
+            ),
+            *_gauge(
+                "roborock_status_cache_entries",
+                "Cached get_status results",
+                [("", len(daemon.status_cache.entries))],
+            ),
+            *_gauge(
+                "roborock_event_subscribers",
+                "Connected push event subscribers",
+                [("", len(daemon.events.subscribers))],
+            ),
+        ]
+        for name in ("hits", "stale_hits", "misses", "refreshes"):
+            metric = f"roborock_status_cache_{name}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {cache[name]}"]
+        for name, value in daemon.pending_responses.stats.items():
+            metric = f"roborock_pending_responses_{name}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+@dataclass
+class SharedRead:
+    """A read RPC shared by identical concurrent callers.
+
+    Times are event loop times. Joiners may extend `deadline` up to `limit`,
+    the first caller's deadline plus one reaper tick, and no further, so a
+    lost reply cannot keep one RPC alive for every later caller.
+    """
+
+    started: float
+    deadline: float  # when the latest joined caller gives up, at most limit
+    limit: float
+    task: asyncio.Task | None = None
+    request_id: str | None = None  # pending_responses key once the request is sent
+
+
 class RoborockDaemon:
     """Persistent daemon managing MQTT connections to Roborock devices."""
 
-    def __init__(self):
-        self.sessions: dict[str, RoborockMqttSession] = {}  # user_id -> session
-        self.rriot_data: dict[str, RRiot] = {}  # user_id -> RRiot
-        self.subscriptions: dict[str, dict[str, Any]] = {}  # user_id -> {device_id -> unsubscribe_fn}
-        self.pending_responses: dict[str, asyncio.Future] = {}  # request_id -> Future
-        self.request_counter = 0
-        self._lock = asyncio.Lock()
+    def __init__(
+        self,
+        status_ttl: float = 5.0,
+        status_stale: float = 30.0,
+        timeout_multiplier: float = 3.0,
+        offline_after: int = 3,
+        probe_interval: float = 15.0,
+        reconnect_wait: float = 10.0,
+        session_factory: Callable[..., WildcardMqttSession] | None = None,
+        recorder: TrafficRecorder | None = None,
+        max_pending: int = MAX_PENDING_RESPONSES,
+    ):
+        # Builds each user's MQTT session from its MqttParams; the simulator swaps this out
+        self.session_factory = session_factory or WildcardMqttSession
+        self.sessions: dict[str, WildcardMqttSession] = {}  # user_id -> session
+        self.contexts: dict[str, UserContext] = {}  # user_id -> derived credentials and device codecs
+        self.subscriptions: dict[str, Callable[[], None]] = {}  # user_id -> unsubscribe_fn for rr/m/o/.../+
+        self.pending_responses = PendingResponses(capacity=max_pending)
+        self._user_locks: dict[str, asyncio.Lock] = {}  # user_id -> Lock
+        self._init_inflight: dict[str, tuple[str, asyncio.Task]] = {}  # user_id -> (fingerprint, task)
+        self.status_cache = StatusCache(ttl=status_ttl, stale=status_stale)
+        self._read_inflight: dict[str, SharedRead] = {}  # user:device:method:params -> shared RPC
+        self.events = EventHub()
+        self.metrics = DaemonMetrics()
+        self.timeouts = AdaptiveTimeouts(multiplier=timeout_multiplier)
+        self.breaker = CircuitBreaker(threshold=offline_after, probe_interval=probe_interval)
+        self.session_states: dict[str, SessionState] = {}  # user_id -> state
+        self._ready: dict[str, asyncio.Event] = {}  # user_id -> set while READY
+        self._reconnects: dict[str, asyncio.Task] = {}  # user_id -> reconnect loop
+        self.reconnect_wait = reconnect_wait  # max seconds a command waits for READY
+        self.recorder = recorder  # captures raw MQTT traffic when set
 
     def _create_rriot(self, rriot_data: dict) -> RRiot:
         """Create RRiot object from dictionary."""
@@ -74,46 +982,346 @@ class RoborockDaemon:
             r=ref,
         )
 
-    async def initialize(self, user_id: str, rriot_data: dict) -> dict[str, Any]:
-        """Initialize MQTT session for a user."""
-        async with self._lock:
-            # Close existing session if any
-            if user_id in self.sessions:
-                await self._close_session(user_id)
+    @staticmethod
+    def _fingerprint(rriot_data: dict) -> str:
+        """Stable hash of the rriot credentials used to detect changes."""
+        canonical = json.dumps(rriot_data, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _user_lock(self, user_id: str) -> asyncio.Lock:
+        """Return the lock serialising session changes for one user."""
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = self._user_locks[user_id] = asyncio.Lock()
+        return lock
+
+    def user_for(self, rriot_data: dict) -> str | None:
+        """The user whose connected session was initialized with these credentials."""
+        fingerprint = self._fingerprint(rriot_data)
+        for user_id, context in self.contexts.items():
+            session = self.sessions.get(user_id)
+            if context.fingerprint == fingerprint and session is not None and session.connected:
+                return user_id
+        return None
+
+    async def initialize(
+        self,
+        user_id: str,
+        rriot_data: dict,
+        devices: dict[str, str] | None = None,
+    ) -> dict[str, Any]:
+        """Initialize MQTT session for a user.
+
+        Idempotent: identical credentials on a connected session return
+        immediately. Concurrent calls for the same user and credentials share
+        a single in-flight connect; different users connect in parallel.
+        `devices` maps device ids to local keys so pushes can be decoded
+        before the first command is sent.
+        """
+        fingerprint = self._fingerprint(rriot_data)
+        inflight = self._init_inflight.get(user_id)
+        if inflight is not None and inflight[0] == fingerprint:
+            task = inflight[1]
+        else:
+            task = asyncio.ensure_future(self._initialize(user_id, rriot_data, fingerprint))
+            self._init_inflight[user_id] = (fingerprint, task)
+
+            def clear_inflight(done: asyncio.Task):
+                entry = self._init_inflight.get(user_id)
+                if entry is not None and entry[1] is done:
+                    del self._init_inflight[user_id]
+
+            task.add_done_callback(clear_inflight)
+        # Shield so one cancelled caller does not abort the connect for the others
+        result = await asyncio.shield(task)
+
+        context = self.contexts.get(user_id)
+        if result.get("success") and context is not None:
+            for device_id, local_key in (devices or {}).items():
+                context.device(device_id, local_key)
+        return result
 
+    async def _initialize(self, user_id: str, rriot_data: dict, fingerprint: str) -> dict[str, Any]:
+        async with self._user_lock(user_id):
+            old_session = self.sessions.get(user_id)
+            current = self.contexts.get(user_id)
+            healthy = old_session is not None and current is not None and old_session.connected
+
+            if healthy and current.fingerprint == fingerprint:
+                return {"success": True, "reused": True}
+
+            if old_session is None:
+                self._set_state(user_id, SessionState.CONNECTING)
             try:
-                rriot = self._create_rriot(rriot_data)
-                mqtt_params = create_mqtt_params(rriot)
-                session = RoborockMqttSession(mqtt_params)
-                await session.start()
+                context = UserContext.create(self._create_rriot(rriot_data), fingerprint)
 
-                self.sessions[user_id] = session
-                self.rriot_data[user_id] = rriot
-                self.subscriptions[user_id] = {}
+                if healthy and context.connection_key == current.connection_key:
+                    # Same broker login: keep the session and subscription, swap derived values
+                    context.devices = current.devices
+                    self.contexts[user_id] = context
+                    log.info(f"Updated credentials for user {user_id} without reconnecting")
+                    return {"success": True, "reused": True}
 
-                log.info(f"Initialized MQTT session for user {user_id}")
-                return {"success": True}
+                if current is not None:
+                    # Known devices stay decodable on the new session before
+                    # any command names them again
+                    context.devices = current.devices
+                session, unsubscribe = await self._connect(user_id, context)
             except Exception as e:
+                # Any existing session is left in place
                 log.error(f"Failed to initialize session for {user_id}: {e}")
+                if user_id not in self.sessions:
+                    self._clear_state(user_id)
                 return {"success": False, "error": str(e)}
 
+            # Make-before-break: the new session is subscribed before the old one
+            # goes away, and pending commands stay registered for the new dispatcher
+            old_unsubscribe = self.subscriptions.get(user_id)
+            self.sessions[user_id] = session
+            self.subscriptions[user_id] = unsubscribe
+            self.contexts[user_id] = context
+            self._mark_installed(user_id, session)
+            if old_session is not None:
+                await self._retire_session(user_id, old_session, old_unsubscribe)
+
+            log.info(f"Initialized MQTT session for user {user_id}")
+            return {"success": True}
+
+    async def _connect(
+        self, user_id: str, context: UserContext
+    ) -> tuple[WildcardMqttSession, Callable[[], None]]:
+        """Start an MQTT session and subscribe to all of the user's devices."""
+
+        def unauthorized():
+            self._on_unauthorized(user_id, session)
+
+        session = self.session_factory(replace(context.mqtt_params, unauthorized_hook=unauthorized))
+        session.on_connection_change = lambda up: self._on_connection_change(user_id, session, up)
+        session.on_stopped = lambda: self._on_session_stopped(user_id, session)
+        await session.start()
+
+        # One subscription covers every device of this user
+        try:
+            unsubscribe = await session.subscribe_prefix(
+                context.subscribe_prefix,
+                self._make_dispatcher(user_id, context),
+            )
+        except Exception:
+            await session.close()
+            raise
+        return session, unsubscribe
+
+    def _set_state(self, user_id: str, state: SessionState):
+        self.session_states[user_id] = state
+        ready = self._ready.get(user_id)
+        if ready is None:
+            ready = self._ready[user_id] = asyncio.Event()
+        if state in (SessionState.READY, SessionState.UNAUTHORIZED):
+            ready.set()  # unauthorized wakes waiters so they fail fast
+        else:
+            ready.clear()
+
+    def _clear_state(self, user_id: str):
+        self.session_states.pop(user_id, None)
+        ready = self._ready.pop(user_id, None)
+        if ready is not None:
+            ready.set()  # wake waiters so they see the session is gone
+
+    def _mark_installed(self, user_id: str, session: WildcardMqttSession):
+        """Mark a newly installed session READY, catching a drop that raced the install."""
+        self._set_state(user_id, SessionState.READY)
+        if not session.connected:
+            self._on_connection_change(user_id, session, False)
+
+    def _on_connection_change(self, user_id: str, session: WildcardMqttSession, connected: bool):
+        """Track the live session's broker connection.
+
+        A dropped connection is retried by the session itself, with its own
+        backoff, so the user just waits in BACKING_OFF until it comes back.
+        """
+        if self.sessions.get(user_id) is not session:
+            return  # still connecting, or already replaced
+        if connected:
+            self._set_state(user_id, SessionState.READY)
+        elif self.session_states.get(user_id) != SessionState.UNAUTHORIZED:
+            log.warning(f"MQTT session for user {user_id} dropped, waiting for it to reconnect")
+            self._set_state(user_id, SessionState.BACKING_OFF)
+
+    def _on_unauthorized(self, user_id: str, session: WildcardMqttSession):
+        """Fail the user's commands fast once the broker rejects their login.
+
+        The session backs off for hours before trying the same credentials
+        again; /init with fresh credentials replaces it.
+        """
+        if self.sessions.get(user_id) is not session:
+            return
+        log.error(f"MQTT broker rejected the credentials of user {user_id}")
+        self._set_state(user_id, SessionState.UNAUTHORIZED)
+
+    def _on_session_stopped(self, user_id: str, session: WildcardMqttSession):
+        """Replace a session whose own reconnect loop has given up."""
+        if self.sessions.get(user_id) is not session or user_id in self._reconnects:
+            return
+        log.warning(f"MQTT session for user {user_id} stopped reconnecting, replacing it")
+        self._set_state(user_id, SessionState.BACKING_OFF)
+        self._reconnects[user_id] = asyncio.ensure_future(self._reconnect(user_id))
+
+    async def _reconnect(self, user_id: str):
+        """Replace a stopped session, retrying with jittered exponential backoff.
+
+        The replacement subscribes to the same wildcard with the existing
+        device contexts, so every device is covered again and pending commands
+        stay registered. A rejected login ends the retries until /init.
+        """
+        attempt = 0
+        try:
+            while True:
+                delay = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, delay))
+                attempt += 1
+                async with self._user_lock(user_id):
+                    old_session = self.sessions.get(user_id)
+                    context = self.contexts.get(user_id)
+                    if old_session is None or context is None:
+                        return  # disconnected meanwhile
+                    self._set_state(user_id, SessionState.CONNECTING)
+                    try:
+                        session, unsubscribe = await self._connect(user_id, context)
+                    except MqttSessionUnauthorized as e:
+                        log.error(f"Reconnect for user {user_id} rejected, waiting for /init: {e}")
+                        self._set_state(user_id, SessionState.UNAUTHORIZED)
+                        return
+                    except Exception as e:
+                        log.warning(f"Reconnect attempt {attempt} for user {user_id} failed: {e}")
+                        self._set_state(user_id, SessionState.BACKING_OFF)
+                        continue
+                    old_unsubscribe = self.subscriptions.get(user_id)
+                    self.sessions[user_id] = session
+                    self.subscriptions[user_id] = unsubscribe
+                    self._mark_installed(user_id, session)
+                    await self._retire_session(user_id, old_session, old_unsubscribe)
+                    log.info(f"Reconnected MQTT session for user {user_id} after {attempt} attempt(s)")
+                    return
+        finally:
+            self._reconnects.pop(user_id, None)
+
+    async def _wait_ready(self, user_id: str, timeout: float) -> bool:
+        """Wait up to min(timeout, reconnect_wait) for the user's session to be READY."""
+        if self.session_states.get(user_id, SessionState.READY) == SessionState.READY:
+            return True
+        ready = self._ready.get(user_id)
+        if ready is None:
+            return False
+        try:
+            await asyncio.wait_for(ready.wait(), min(timeout, self.reconnect_wait))
+        except asyncio.TimeoutError:
+            return False
+        return self.session_states.get(user_id) == SessionState.READY
+
+    async def _retire_session(
+        self,
+        user_id: str,
+        session: WildcardMqttSession,
+        unsubscribe: Callable[[], None] | None,
+    ):
+        """Close a replaced session without touching the user's pending commands."""
+        session.on_connection_change = None
+        session.on_stopped = None
+        if callable(unsubscribe):
+            unsubscribe()
+        try:
+            await session.close()
+        except Exception as e:
+            log.warning(f"Error closing session for {user_id}: {e}")
+
+    async def disconnect(self, user_id: str):
+        """Close a user's session once any in-flight initialize has finished."""
+        async with self._user_lock(user_id):
+            await self._close_session(user_id)
+
     async def _close_session(self, user_id: str):
         """Close session for a user."""
-        if user_id in self.subscriptions:
-            for unsubscribe in self.subscriptions[user_id].values():
-                if callable(unsubscribe):
-                    unsubscribe()
-            del self.subscriptions[user_id]
+        reconnect = self._reconnects.pop(user_id, None)
+        if reconnect is not None and reconnect is not asyncio.current_task():
+            reconnect.cancel()
+        self._clear_state(user_id)
+        unsubscribe = self.subscriptions.pop(user_id, None)
+        session = self.sessions.pop(user_id, None)
+        if session is not None:
+            await self._retire_session(user_id, session, unsubscribe)
+        elif callable(unsubscribe):
+            unsubscribe()
+
+        self.contexts.pop(user_id, None)
+        self.status_cache.invalidate_user(user_id)
+        self.breaker.forget_user(user_id)
+
+        # Fail any commands still waiting on this user's devices
+        for fut in self.pending_responses.pop_prefix(f"{user_id}:"):
+            if not fut.done():
+                fut.set_exception(RoborockException("Session closed"))
 
-        if user_id in self.sessions:
+    def _make_dispatcher(self, user_id: str, context: UserContext):
+        """Create the long-lived message handler for a user's device topics.
+
+        Messages are demultiplexed by the topic's device id suffix, and every
+        decoded RPC_RESPONSE is routed to the pending future registered under
+        its RPC request id, so concurrent commands each get their own response.
+        Anything else is treated as an unsolicited state push.
+        """
+        devices = context.devices
+        recorder = self.recorder
+        prefix = context.subscribe_prefix
+
+        def on_message(device_id: str, data: bytes):
+            """Handle incoming MQTT message."""
+            if recorder is not None:
+                recorder.write(TRAFFIC_INBOUND, user_id, f"{prefix}/{device_id}", data)
+            device = devices.get(device_id)
+            if not device:
+                return
             try:
-                await self.sessions[user_id].close()
+                messages = device.decode(data)
             except Exception as e:
-                log.warning(f"Error closing session for {user_id}: {e}")
-            del self.sessions[user_id]
+                log.warning(f"Error parsing message from {device_id}: {e}")
+                return
+            if messages:
+                self.breaker.seen(f"{user_id}:{device_id}")
+            for msg in messages:
+                if msg.protocol != RoborockMessageProtocol.RPC_RESPONSE:
+                    self._handle_push(user_id, device_id, msg)
+                    continue
+                try:
+                    response = decode_rpc_response(msg)
+                except Exception as e:
+                    log.warning(f"Error decoding response from {device_id}: {e}")
+                    continue
+                fut = self.pending_responses.pop(f"{user_id}:{device_id}:{response.request_id}", None)
+                if fut is None:
+                    log.debug(f"Ignoring unsolicited response {response.request_id} from {device_id}")
+                elif not fut.done():
+                    fut.set_result(response)
+
+        return on_message
+
+    def _handle_push(self, user_id: str, device_id: str, msg):
+        """Forward a device's unsolicited data point update to event subscribers."""
+        try:
+            datapoints = decode_data_protocol_message(msg)
+        except Exception as e:
+            log.debug(f"Ignoring undecodable push from {device_id}: {e}")
+            return
+        if not datapoints:
+            return
 
-        if user_id in self.rriot_data:
-            del self.rriot_data[user_id]
+        self.status_cache.invalidate(f"{user_id}:{device_id}")
+        self.events.publish({
+            "type": "dps",
+            "user_id": user_id,
+            "device_id": device_id,
+            "dps": {str(int(code)): value for code, value in datapoints.items()},
+            "ts": time.time(),
+        })
 
     async def send_command(
         self,
@@ -122,77 +1330,230 @@ class RoborockDaemon:
         local_key: str,
         command: str,
         params: list | None = None,
+        timeout: float | None = None,
     ) -> dict[str, Any]:
-        """Send a command to a device."""
-        session = self.sessions.get(user_id)
-        rriot = self.rriot_data.get(user_id)
+        """Send a command to a device.
 
-        if not session or not rriot:
-            return {"success": False, "error": "Session not initialized. Call /init first."}
+        `timeout` is the caller's remaining deadline in seconds, capped at
+        COMMAND_TIMEOUT; without one the method's learned timeout applies.
+        Devices whose circuit is open are rejected without sending anything.
+        Parameterless get_status calls are served through the status cache,
+        and identical concurrent read commands share a single RPC. Any other
+        command invalidates the device's cached status.
+        """
+        method = method_label(command)
+        if timeout is None:
+            timeout = self.timeouts.timeout_for(method)
+        else:
+            timeout = min(timeout, COMMAND_TIMEOUT)
 
+        metrics = self.metrics
+        metrics.commands_in_flight += 1
+        start = time.perf_counter()
+        result: dict[str, Any] = {"success": False}
         try:
-            mqtt_params = create_mqtt_params(rriot)
+            if timeout <= 0:
+                result = {"success": False, "error": "Deadline exceeded"}
+            elif not self.breaker.allow(f"{user_id}:{device_id}"):
+                result = {"success": False, "error": "Device offline"}
+            else:
+                result = await self._send_command(user_id, device_id, local_key, command, params, timeout)
+            return result
+        finally:
+            metrics.commands_in_flight -= 1
+            metrics.command_latency.observe((method,), time.perf_counter() - start)
+            if not result.get("success"):
+                if result.get("error") in TIMEOUT_ERRORS:
+                    metrics.timeouts.inc((method,))
+                else:
+                    metrics.errors.inc((method,))
 
-            # Create response future with unique ID
-            self.request_counter += 1
-            request_id = f"{user_id}:{device_id}:{self.request_counter}"
-            response_future: asyncio.Future = asyncio.get_event_loop().create_future()
-            self.pending_responses[request_id] = response_future
+    async def _send_command(
+        self,
+        user_id: str,
+        device_id: str,
+        local_key: str,
+        command: str,
+        params: list | None,
+        timeout: float,
+    ) -> dict[str, Any]:
+        if user_id not in self.sessions:
+            return {"success": False, "error": "Session not initialized. Call /init first."}
 
-            def on_message(data: bytes):
-                """Handle incoming MQTT message."""
-                try:
-                    messages, _ = MessageParser.parse(data, local_key)
-                    for msg in messages:
-                        if msg.protocol == RoborockMessageProtocol.RPC_RESPONSE:
-                            response = decode_rpc_response(msg)
-                            if request_id in self.pending_responses:
-                                fut = self.pending_responses.pop(request_id)
-                                if not fut.done():
-                                    fut.set_result(response)
-                except Exception as e:
-                    log.warning(f"Error parsing message: {e}")
-                    if request_id in self.pending_responses:
-                        fut = self.pending_responses.pop(request_id)
-                        if not fut.done():
-                            fut.set_exception(e)
-
-            # Subscribe to device topic if not already
-            subscribe_topic = f"rr/m/o/{rriot.u}/{mqtt_params.username}/{device_id}"
-            if device_id not in self.subscriptions.get(user_id, {}):
-                unsubscribe = await session.subscribe(subscribe_topic, on_message)
-                self.subscriptions.setdefault(user_id, {})[device_id] = unsubscribe
+        key = f"{user_id}:{device_id}"
+        if command in READ_COMMANDS:
+            read_key = f"{key}:{command}:{json.dumps(params or [], sort_keys=True)}"
+            loop = asyncio.get_running_loop()
+            give_up = loop.time() + timeout
+
+            def fetch():
+                return self._coalesced_rpc(read_key, user_id, device_id, local_key, command, params, timeout)
+
+            if command == "get_status" and not params:
+                shared = self.status_cache.get(key, fetch)
             else:
-                # Update message handler for this request
-                old_unsub = self.subscriptions[user_id].get(device_id)
-                if callable(old_unsub):
-                    old_unsub()
-                unsubscribe = await session.subscribe(subscribe_topic, on_message)
-                self.subscriptions[user_id][device_id] = unsubscribe
+                shared = fetch()
+            try:
+                result = await asyncio.wait_for(shared, timeout)
+                # A joined RPC ends at its first caller's deadline; spend the
+                # rest of this caller's on a fresh one
+                remaining = give_up - loop.time()
+                if result.get("error") == "Command timeout" and remaining > self.pending_responses.tick:
+                    result = await asyncio.wait_for(
+                        self._coalesced_rpc(read_key, user_id, device_id, local_key, command, params, remaining),
+                        remaining,
+                    )
+                return result
+            except asyncio.TimeoutError:
+                return {"success": False, "error": "Command timeout"}
 
-            # Create and send command
-            security_data = create_security_data(rriot)
-            request = RequestMessage(method=command, params=params or [])
-            message = request.encode_message(
-                protocol=RoborockMessageProtocol.RPC_REQUEST,
-                security_data=security_data,
+        # Reads that overlap the command may see either state, so neither
+        # those in flight now nor those started before it lands are cached
+        self.status_cache.invalidate(key)
+        try:
+            return await self._send_rpc(user_id, device_id, local_key, command, params, timeout)
+        finally:
+            self.status_cache.invalidate(key)
+
+    def _join_read(self, key: str, timeout: float) -> SharedRead | None:
+        """Return the shared read for key if a caller with `timeout` may join it.
+
+        A read past its deadline, or already running for longer than this
+        caller would wait, has probably lost its reply and is not joined.
+        Joining extends the read toward this caller's deadline, up to its
+        limit.
+        """
+        shared = self._read_inflight.get(key)
+        if shared is None or shared.task.done():
+            return None
+        now = asyncio.get_running_loop().time()
+        if now >= shared.deadline or now - shared.started >= timeout:
+            return None
+        deadline = min(now + timeout, shared.limit)
+        if deadline > shared.deadline:
+            shared.deadline = deadline
+            if shared.request_id is not None:
+                self.pending_responses.extend(shared.request_id, deadline - now)
+        return shared
+
+    async def _coalesced_rpc(
+        self,
+        key: str,
+        user_id: str,
+        device_id: str,
+        local_key: str,
+        command: str,
+        params: list | None = None,
+        timeout: float = COMMAND_TIMEOUT,
+    ) -> dict[str, Any]:
+        """Send a read command, joining an identical request already in flight."""
+        shared = self._join_read(key, timeout)
+        if shared is None:
+            now = asyncio.get_running_loop().time()
+            shared = SharedRead(
+                started=now, deadline=now + timeout, limit=now + timeout + self.pending_responses.tick
+            )
+            shared.task = asyncio.ensure_future(
+                self._send_rpc(user_id, device_id, local_key, command, params, timeout, shared)
             )
-            encoded = MessageParser.build(message, local_key, prefixed=False)
+            self._read_inflight[key] = shared
 
-            publish_topic = f"rr/m/i/{rriot.u}/{mqtt_params.username}/{device_id}"
-            await session.publish(publish_topic, encoded)
+            def forget(_: asyncio.Task, shared: SharedRead = shared):
+                if self._read_inflight.get(key) is shared:
+                    del self._read_inflight[key]
 
-            log.info(f"Sent command {command} to device {device_id}")
+            shared.task.add_done_callback(forget)
+        # Shield so one cancelled caller does not cancel the RPC for the others
+        return await asyncio.shield(shared.task)
+
+    async def _send_rpc(
+        self,
+        user_id: str,
+        device_id: str,
+        local_key: str,
+        command: str,
+        params: list | None = None,
+        timeout: float = COMMAND_TIMEOUT,
+        shared: SharedRead | None = None,
+    ) -> dict[str, Any]:
+        """Publish an RPC request and wait for the device's response.
+
+        While the user's session is reconnecting the command waits for it,
+        for at most `reconnect_wait` seconds out of its timeout. A `shared`
+        read waits until the latest deadline of the callers that joined it.
+        """
+        phases = self.metrics.phase_latency
+        method = method_label(command)
+        start = time.perf_counter()
+        if not await self._wait_ready(user_id, timeout):
+            if self.session_states.get(user_id) == SessionState.UNAUTHORIZED:
+                return {"success": False, "error": "Session unauthorized. Call /init with fresh credentials."}
+            return {"success": False, "error": "Session reconnecting"}
+        timeout -= time.perf_counter() - start
+
+        session = self.sessions.get(user_id)
+        context = self.contexts.get(user_id)
+
+        if not session or not context:
+            return {"success": False, "error": "Session not initialized. Call /init first."}
+
+        try:
+            # Responses arrive via the per-user wildcard subscription, so the
+            # subscribe phase only covers registering the pending future
+            device = context.device(device_id, local_key)
+            if self.pending_responses.full():
+                self.pending_responses.stats["rejected"] += 1
+                return {"success": False, "error": "Too many pending requests"}
+
+            # Create and send command
+            request = RequestMessage(method=command, params=params or [])
+            request_id = f"{user_id}:{device_id}:{request.request_id}"
+            while request_id in self.pending_responses:
+                request = RequestMessage(method=command, params=params or [])
+                request_id = f"{user_id}:{device_id}:{request.request_id}"
+            if shared is not None:
+                shared.request_id = request_id
+                timeout = max(timeout, shared.deadline - asyncio.get_running_loop().time())
+            # The reaper fails this future once the timeout passes
+            response_future = self.pending_responses.add(request_id, timeout)
+            subscribed = time.perf_counter()
+            phases.observe((method, "subscribe"), subscribed - start)
 
-            # Wait for response
             try:
-                response = await asyncio.wait_for(response_future, timeout=30.0)
-                if response.api_error:
-                    return {"success": False, "error": str(response.api_error)}
-                return {"success": True, "result": response.data}
-            except asyncio.TimeoutError:
-                self.pending_responses.pop(request_id, None)
-                return {"success": False, "error": "Command timeout"}
+                message = request.encode_message(
+                    protocol=RoborockMessageProtocol.RPC_REQUEST,
+                    security_data=context.security_data,
+                )
+                payload = device.encode(message)
+                if self.recorder is not None:
+                    self.recorder.write(TRAFFIC_OUTBOUND, user_id, device.publish_topic, payload)
+                await session.publish(device.publish_topic, payload)
+                published = time.perf_counter()
+                phases.observe((method, "publish"), published - subscribed)
+
+                log.info(f"Sent command {command} to device {device_id}")
+
+                # Wait for response
+                try:
+                    response = await response_future
+                    self.timeouts.observe(method, time.perf_counter() - start)
+                    if response.api_error:
+                        return {"success": False, "error": str(response.api_error)}
+                    return {"success": True, "result": response.data}
+                except asyncio.TimeoutError:
+                    # A dropped broker connection is not the device's fault
+                    if self.session_states.get(user_id) == SessionState.READY:
+                        self.timeouts.observe_timeout(method, time.perf_counter() - start)
+                        self.breaker.record_timeout(
+                            f"{user_id}:{device_id}", lambda: self._probe_device(user_id, device_id)
+                        )
+                    return {"success": False, "error": "Command timeout"}
+                finally:
+                    phases.observe((method, "await_response"), time.perf_counter() - published)
+            finally:
+                # Publish failures and cancelled callers must not leave an
+                # entry behind for a late response to resolve
+                self.pending_responses.pop(request_id)
 
         except RoborockException as e:
             return {"success": False, "error": str(e)}
@@ -200,73 +1561,285 @@ class RoborockDaemon:
             log.error(f"Error sending command: {e}")
             return {"success": False, "error": f"Unexpected error: {str(e)}"}
 
+    async def _probe_device(self, user_id: str, device_id: str) -> bool:
+        """Check whether an offline-marked device answers get_status again."""
+        context = self.contexts.get(user_id)
+        device = context.devices.get(device_id) if context else None
+        if device is None:
+            return False
+        result = await self._send_rpc(
+            user_id, device_id, device.local_key, "get_status",
+            timeout=self.timeouts.timeout_for("get_status"),
+        )
+        return bool(result.get("success"))
+
+    async def send_batch(self, items: list[dict], timeout: float | None = None) -> list[dict[str, Any]]:
+        """Run many commands concurrently, returning one result per item in order.
+
+        Each item carries the same fields as /command, including an optional
+        `deadline_ms`, bounded by the batch-wide `timeout` in seconds; a
+        failing item never affects the others.
+        """
+
+        async def run(item: Any) -> dict[str, Any]:
+            if not isinstance(item, dict):
+                return {"success": False, "error": "Invalid item"}
+            user_id = item.get("user_id")
+            device_id = item.get("device_id")
+            local_key = item.get("local_key")
+            command = item.get("command")
+            if not all([user_id, device_id, local_key, command]):
+                return {"success": False, "error": "Missing required fields"}
+            try:
+                limit = _parse_deadline(item)
+            except (TypeError, ValueError):
+                return {"success": False, "error": "Invalid deadline_ms"}
+            if timeout is not None:
+                limit = timeout if limit is None else min(limit, timeout)
+            try:
+                return await self.send_command(
+                    user_id, device_id, local_key, command, item.get("params"), limit
+                )
+            except Exception as e:
+                log.error(f"Error in batch command {command}: {e}")
+                return {"success": False, "error": f"Unexpected error: {str(e)}"}
+
+        return list(await asyncio.gather(*(run(item) for item in items)))
+
     async def shutdown(self):
         """Shutdown all sessions."""
         log.info("Shutting down daemon...")
         user_ids = list(self.sessions.keys())
         for user_id in user_ids:
             await self._close_session(user_id)
+        if self.recorder is not None:
+            self.recorder.close()
         log.info("Daemon shutdown complete")
 
 
 # Global daemon instance
 daemon = RoborockDaemon()
 
+# Seconds between keepalive comments on idle /events streams
+EVENTS_KEEPALIVE = 15.0
 
-async def handle_init(request: web.Request) -> web.Response:
-    """Handle /init endpoint."""
+
+# Transport-independent operations shared by the HTTP and stdio front ends.
+# Each takes the decoded request body and returns (status, response body).
+
+def _parse_deadline(data: dict) -> float | None:
+    """Seconds left in the caller's `deadline_ms` budget, if one was given."""
+    value = data.get("deadline_ms")
+    return None if value is None else float(value) / 1000
+
+
+async def op_init(data: Any) -> tuple[int, dict[str, Any]]:
+    """Initialize MQTT connection with rriot credentials.
+
+    Without a user_id, the session already connected with the same
+    credentials is reused and its user_id returned; none is created.
+    """
+    if not isinstance(data, dict):
+        return HTTPStatus.BAD_REQUEST, {"success": False, "error": "Expected an object"}
+    user_id = data.get("user_id")
+    rriot = data.get("rriot")
+    devices = data.get("devices")
+
+    if not isinstance(rriot, dict) or not rriot:
+        return HTTPStatus.BAD_REQUEST, {"success": False, "error": "Missing user_id or rriot"}
+    if devices is not None and not (
+        isinstance(devices, dict)
+        and all(isinstance(local_key, str) and local_key for local_key in devices.values())
+    ):
+        return HTTPStatus.BAD_REQUEST, {"success": False, "error": "Invalid devices"}
+    if not user_id:
+        user_id = daemon.user_for(rriot)
+        if user_id is None:
+            return HTTPStatus.NOT_FOUND, {"success": False, "error": "No session for these credentials"}
+
+    return HTTPStatus.OK, {**await daemon.initialize(user_id, rriot, devices), "user_id": user_id}
+
+
+async def op_command(data: Any) -> tuple[int, dict[str, Any]]:
+    """Send a command to a device."""
+    if not isinstance(data, dict):
+        return HTTPStatus.BAD_REQUEST, {"success": False, "error": "Expected an object"}
+    user_id = data.get("user_id")
+    device_id = data.get("device_id")
+    local_key = data.get("local_key")
+    command = data.get("command")
+    params = data.get("params")
+
+    if not all([user_id, device_id, local_key, command]):
+        return HTTPStatus.BAD_REQUEST, {"success": False, "error": "Missing required fields"}
     try:
-        data = await request.json()
-        user_id = data.get("user_id")
-        rriot = data.get("rriot")
-
-        if not user_id or not rriot:
-            return web.json_response(
-                {"success": False, "error": "Missing user_id or rriot"},
-                status=HTTPStatus.BAD_REQUEST
-            )
+        timeout = _parse_deadline(data)
+    except (TypeError, ValueError):
+        return HTTPStatus.BAD_REQUEST, {"success": False, "error": "Invalid deadline_ms"}
+
+    return HTTPStatus.OK, await daemon.send_command(
+        user_id, device_id, local_key, command, params, timeout
+    )
+
+
+async def op_commands(data: Any) -> tuple[int, dict[str, Any]]:
+    """Run a batch of commands concurrently."""
+    items = data.get("commands") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return HTTPStatus.BAD_REQUEST, {"success": False, "error": "Expected a list of commands"}
+    if len(items) > MAX_BATCH_SIZE:
+        return HTTPStatus.BAD_REQUEST, {
+            "success": False,
+            "error": f"Too many commands (max {MAX_BATCH_SIZE})",
+        }
+
+    try:
+        timeout = _parse_deadline(data) if isinstance(data, dict) else None
+    except (TypeError, ValueError):
+        return HTTPStatus.BAD_REQUEST, {"success": False, "error": "Invalid deadline_ms"}
+
+    results = await daemon.send_batch(items, timeout)
+    return HTTPStatus.OK, {"success": True, "results": results}
+
+
+async def op_health(data: Any = None) -> tuple[int, dict[str, Any]]:
+    """Report daemon health."""
+    return HTTPStatus.OK, {
+        "status": "ok",
+        "active_sessions": len(daemon.sessions),
+        "users": list(daemon.sessions.keys()),
+        "pending_responses": len(daemon.pending_responses),
+        "pending_capacity": daemon.pending_responses.capacity,
+        "status_cache": {
+            **daemon.status_cache.stats,
+            "entries": len(daemon.status_cache.entries),
+        },
+        "event_subscribers": len(daemon.events.subscribers),
+        "offline_devices": daemon.breaker.open_keys(),
+        "session_states": {user_id: state.value for user_id, state in daemon.session_states.items()},
+    }
 
-        result = await daemon.initialize(user_id, rriot)
-        return web.json_response(result)
-    except json.JSONDecodeError:
-        return web.json_response(
+
+async def op_metrics(data: Any = None) -> tuple[int, dict[str, Any]]:
+    """Render Prometheus metrics text."""
+    return HTTPStatus.OK, {"metrics": daemon.metrics.render(daemon)}
+
+
+async def op_disconnect(data: Any) -> tuple[int, dict[str, Any]]:
+    """Disconnect a specific user."""
+    user_id = data.get("user_id") if isinstance(data, dict) else None
+    if not user_id:
+        return HTTPStatus.BAD_REQUEST, {"success": False, "error": "Missing user_id"}
+
+    await daemon.disconnect(user_id)
+    return HTTPStatus.OK, {"success": True}
+
+
+def _stdlib_dumps(value: Any) -> bytes:
+    return json.dumps(value).encode()
+
+
+def _orjson_dumps(value: Any) -> bytes:
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+
+# HTTP body codec; swapped for orjson by use_orjson()
+json_dumps: Callable[[Any], bytes] = _stdlib_dumps
+json_loads: Callable[[bytes], Any] = json.loads
+
+
+def use_orjson(enabled: bool):
+    """Select orjson or the stdlib json module for HTTP bodies."""
+    global json_dumps, json_loads
+    if enabled:
+        json_dumps, json_loads = _orjson_dumps, orjson.loads
+    else:
+        json_dumps, json_loads = _stdlib_dumps, json.loads
+
+
+def _json_response(body: Any, status: int = HTTPStatus.OK) -> web.Response:
+    return web.Response(body=json_dumps(body), status=status, content_type="application/json")
+
+
+async def _json_op(request: web.Request, op: Callable[[Any], Any]) -> web.Response:
+    """Run op on a JSON request body and serialize its result.
+
+    An X-Deadline-Ms header stands in for a missing `deadline_ms` field.
+    """
+    try:
+        data = json_loads(await request.read())
+    except ValueError:  # json.JSONDecodeError and orjson.JSONDecodeError
+        return _json_response(
             {"success": False, "error": "Invalid JSON"},
             status=HTTPStatus.BAD_REQUEST
         )
+    deadline = request.headers.get("X-Deadline-Ms")
+    if deadline is not None and isinstance(data, dict):
+        data.setdefault("deadline_ms", deadline)
+    status, body = await op(data)
+    return _json_response(body, status=status)
+
+
+async def handle_init(request: web.Request) -> web.Response:
+    """Handle /init endpoint."""
+    return await _json_op(request, op_init)
 
 
 async def handle_command(request: web.Request) -> web.Response:
     """Handle /command endpoint."""
+    return await _json_op(request, op_command)
+
+
+async def handle_commands(request: web.Request) -> web.Response:
+    """Handle /commands endpoint - run a batch of commands concurrently."""
+    return await _json_op(request, op_commands)
+
+
+async def handle_events(request: web.Request) -> web.StreamResponse:
+    """Handle /events endpoint - stream device pushes as server-sent events."""
+    user_id = request.query.get("user_id")
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+    })
+    await response.prepare(request)
+
+    queue = daemon.events.subscribe(user_id)
     try:
-        data = await request.json()
-        user_id = data.get("user_id")
-        device_id = data.get("device_id")
-        local_key = data.get("local_key")
-        command = data.get("command")
-        params = data.get("params")
-
-        if not all([user_id, device_id, local_key, command]):
-            return web.json_response(
-                {"success": False, "error": "Missing required fields"},
-                status=HTTPStatus.BAD_REQUEST
-            )
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                await response.write(b": keepalive\n\n")
+                continue
+            if event is None:
+                await response.write_eof()
+                break
+            await response.write(b"data: " + json_dumps(event) + b"\n\n")
+    except ConnectionResetError:
+        pass
+    finally:
+        daemon.events.unsubscribe(queue)
+    return response
 
-        result = await daemon.send_command(user_id, device_id, local_key, command, params)
-        return web.json_response(result)
-    except json.JSONDecodeError:
-        return web.json_response(
-            {"success": False, "error": "Invalid JSON"},
-            status=HTTPStatus.BAD_REQUEST
-        )
+
+async def close_event_streams(app: web.Application):
+    """End open /events streams so shutdown does not wait on their clients."""
+    daemon.events.close()
 
 
 async def handle_health(request: web.Request) -> web.Response:
     """Handle /health endpoint."""
-    return web.json_response({
-        "status": "ok",
-        "active_sessions": len(daemon.sessions),
-        "users": list(daemon.sessions.keys()),
-    })
+    status, body = await op_health()
+    return _json_response(body, status=status)
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """Handle /metrics endpoint - Prometheus text exposition."""
+    return web.Response(
+        body=daemon.metrics.render(daemon).encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
 
 
 async def handle_shutdown(request: web.Request) -> web.Response:
@@ -274,28 +1847,161 @@ async def handle_shutdown(request: web.Request) -> web.Response:
     await daemon.shutdown()
     # Schedule app stop
     asyncio.get_event_loop().call_soon(lambda: sys.exit(0))
-    return web.json_response({"success": True})
+    return _json_response({"success": True})
 
 
 async def handle_disconnect(request: web.Request) -> web.Response:
     """Handle /disconnect endpoint - disconnect a specific user."""
-    try:
-        data = await request.json()
-        user_id = data.get("user_id")
+    return await _json_op(request, op_disconnect)
 
-        if not user_id:
-            return web.json_response(
-                {"success": False, "error": "Missing user_id"},
-                status=HTTPStatus.BAD_REQUEST
-            )
 
-        await daemon._close_session(user_id)
-        return web.json_response({"success": True})
-    except json.JSONDecodeError:
-        return web.json_response(
-            {"success": False, "error": "Invalid JSON"},
-            status=HTTPStatus.BAD_REQUEST
-        )
+# Frame = 4-byte big-endian length + msgpack body. Requests are
+# {"id", "op", "body"}, replies {"id", "status", "body"}; pushes are sent
+# unsolicited as {"id": 0, "op": "event", "body": event}.
+FRAME_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+STDIO_MAX_INFLIGHT = 256
+
+STDIO_OPS: dict[str, Callable[[Any], Any]] = {
+    "init": op_init,
+    "command": op_command,
+    "commands": op_commands,
+    "health": op_health,
+    "metrics": op_metrics,
+    "disconnect": op_disconnect,
+}
+
+
+class FrameError(ValueError):
+    """A stdio frame that could not be decoded; the stream stays usable."""
+
+    def __init__(self, message: str, request_id: Any = None):
+        super().__init__(message)
+        self.request_id = request_id  # set when the request's id could be recovered
+
+
+class StdioChannel:
+    """Multiplexed request/response channel over the process's stdin/stdout.
+
+    Requests are dispatched concurrently and answered out of order by id.
+    At most STDIO_MAX_INFLIGHT requests run at once; past that the reader
+    stops draining stdin, so the pipe pushes back on the parent.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.write_lock = asyncio.Lock()
+        self.slots = asyncio.Semaphore(STDIO_MAX_INFLIGHT)
+        self.tasks: set[asyncio.Task] = set()
+
+    async def send(self, message: dict[str, Any]):
+        payload = msgpack.packb(message, use_bin_type=True)
+        async with self.write_lock:
+            self.writer.write(FRAME_HEADER.pack(len(payload)) + payload)
+            await self.writer.drain()
+
+    async def read_frame(self) -> Any | None:
+        """Read one frame; None on EOF.
+
+        Raises FrameError for a frame that is too large or not valid msgpack,
+        after consuming it so the next frame can still be read.
+        """
+        try:
+            header = await self.reader.readexactly(FRAME_HEADER.size)
+            (length,) = FRAME_HEADER.unpack(header)
+            if length > MAX_FRAME_SIZE:
+                # Skip the body in chunks rather than buffering it
+                remaining = length
+                while remaining > 0:
+                    remaining -= len(await self.reader.readexactly(min(remaining, 65536)))
+                raise FrameError(f"Frame too large ({length} bytes)")
+            payload = await self.reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            return None
+        try:
+            return msgpack.unpackb(payload, raw=False)
+        except msgpack.ExtraData as e:
+            request_id = e.unpacked.get("id") if isinstance(e.unpacked, dict) else None
+            raise FrameError(f"Invalid frame: {e}", request_id) from e
+        except (ValueError, TypeError) as e:
+            raise FrameError(f"Invalid frame: {e}") from e
+
+    async def handle(self, message: Any):
+        try:
+            request_id = message.get("id") if isinstance(message, dict) else None
+            op = STDIO_OPS.get(message.get("op")) if request_id is not None else None
+            if op is None:
+                status, body = HTTPStatus.BAD_REQUEST, {"success": False, "error": "Unknown op"}
+            else:
+                try:
+                    status, body = await op(message.get("body"))
+                except Exception as e:
+                    log.error(f"stdio op {message.get('op')} failed: {e}")
+                    status, body = HTTPStatus.INTERNAL_SERVER_ERROR, {"success": False, "error": str(e)}
+            await self.send({"id": request_id, "status": int(status), "body": body})
+        finally:
+            self.slots.release()
+
+    async def forward_events(self):
+        queue = daemon.events.subscribe(None)
+        try:
+            while True:
+                event = await queue.get()
+                await self.send({"id": 0, "op": "event", "body": event})
+        finally:
+            daemon.events.unsubscribe(queue)
+
+    async def serve(self):
+        events = asyncio.create_task(self.forward_events())
+        try:
+            while True:
+                try:
+                    message = await self.read_frame()
+                except FrameError as e:
+                    log.warning(f"Dropping stdio frame: {e}")
+                    if e.request_id is not None:
+                        await self.send({
+                            "id": e.request_id,
+                            "status": int(HTTPStatus.BAD_REQUEST),
+                            "body": {"success": False, "error": str(e)},
+                        })
+                    continue
+                if message is None:
+                    break
+                if isinstance(message, dict) and message.get("op") == "shutdown":
+                    await self.send({"id": message.get("id"), "status": 200, "body": {"success": True}})
+                    break
+                await self.slots.acquire()
+                task = asyncio.create_task(self.handle(message))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        finally:
+            events.cancel()
+            if self.tasks:
+                await asyncio.gather(*self.tasks, return_exceptions=True)
+            await daemon.shutdown()
+
+
+async def run_stdio():
+    """Serve the framed msgpack protocol on stdin/stdout until EOF."""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=MAX_FRAME_SIZE)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    transport, protocol = await loop.connect_write_pipe(
+        asyncio.streams.FlowControlMixin, sys.stdout
+    )
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    log.info("Roborock daemon serving msgpack frames on stdio")
+
+    channel = StdioChannel(reader, writer)
+    serve = asyncio.create_task(channel.serve())
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, serve.cancel)
+    try:
+        await serve
+    except asyncio.CancelledError:
+        log.info("Interrupted")
 
 
 def create_app() -> web.Application:
@@ -303,20 +2009,55 @@ def create_app() -> web.Application:
     app = web.Application()
     app.router.add_post("/init", handle_init)
     app.router.add_post("/command", handle_command)
+    app.router.add_post("/commands", handle_commands)
+    app.router.add_get("/events", handle_events)
     app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
     app.router.add_post("/shutdown", handle_shutdown)
     app.router.add_post("/disconnect", handle_disconnect)
+    app.on_shutdown.append(close_event_streams)
     return app
 
 
-async def run_server(port: int):
-    """Run the HTTP server."""
+# (st_dev, st_ino) of the Unix socket this process bound, for remove_socket()
+bound_socket: tuple[int, int] | None = None
+
+
+def socket_identity(path: str) -> tuple[int, int] | None:
+    """Identify the file at path, or None if there is none."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+def remove_socket(path: str, identity: tuple[int, int] | None):
+    """Unlink a Unix socket only if path is still the one identified.
+
+    A replacement process may already have bound a new socket at the same
+    path; unlinking that would leave it running but unreachable.
+    """
+    if identity is not None and socket_identity(path) == identity:
+        os.unlink(path)
+
+
+async def run_server(port: int, unix_socket: str | None = None):
+    """Run the HTTP server on loopback TCP, or on a Unix socket if given."""
     app = create_app()
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, "127.0.0.1", port)
-    await site.start()
-    log.info(f"Roborock daemon listening on http://127.0.0.1:{port}")
+    if unix_socket:
+        global bound_socket
+        site = web.UnixSite(runner, unix_socket)
+        await site.start()
+        bound_socket = socket_identity(unix_socket)
+        os.chmod(unix_socket, 0o600)
+        log.info(f"Roborock daemon listening on unix:{unix_socket}")
+    else:
+        site = web.TCPSite(runner, "127.0.0.1", port)
+        await site.start()
+        log.info(f"Roborock daemon listening on http://127.0.0.1:{port}")
 
     # Setup signal handlers
     loop = asyncio.get_event_loop()
@@ -335,15 +2076,103 @@ async def shutdown_handler(runner: web.AppRunner, loop: asyncio.AbstractEventLoo
     loop.stop()
 
 
-def main():
+def main(argv: list[str] | None = None, session_factory: Callable[..., WildcardMqttSession] | None = None):
     parser = argparse.ArgumentParser(description="Roborock daemon")
     parser.add_argument("--port", type=int, default=9876, help="Port to listen on")
-    args = parser.parse_args()
+    parser.add_argument(
+        "--unix-socket", metavar="PATH",
+        help="Listen on this Unix domain socket instead of TCP",
+    )
+    parser.add_argument(
+        "--stdio", action="store_true",
+        help="Serve length-prefixed msgpack frames on stdin/stdout instead of HTTP",
+    )
+    parser.add_argument(
+        "--status-ttl", type=float, default=5.0,
+        help="Seconds a cached get_status result is served as fresh (0 disables the cache)",
+    )
+    parser.add_argument(
+        "--status-stale", type=float, default=30.0,
+        help="Seconds past the TTL a stale status is served while refreshing in the background",
+    )
+    parser.add_argument(
+        "--timeout-multiplier", type=float, default=3.0,
+        help="Default command timeout is this multiple of the method's observed p99 latency",
+    )
+    parser.add_argument(
+        "--offline-after", type=int, default=3,
+        help="Consecutive timeouts before a device is marked offline and commands fail fast",
+    )
+    parser.add_argument(
+        "--probe-interval", type=float, default=15.0,
+        help="Seconds between background probes of a device marked offline",
+    )
+    parser.add_argument(
+        "--reconnect-wait", type=float, default=10.0,
+        help="Seconds a command waits for a reconnecting session before failing",
+    )
+    parser.add_argument(
+        "--max-pending", type=int, default=MAX_PENDING_RESPONSES,
+        help="Device RPCs that may await a response at once; further commands fail fast",
+    )
+    parser.add_argument(
+        "--record", metavar="PATH",
+        help="Record raw MQTT traffic to PATH for roborock_replay.py",
+    )
+    parser.add_argument(
+        "--uvloop", action=argparse.BooleanOptionalAction, default=None,
+        help="Run on uvloop (default: when installed)",
+    )
+    parser.add_argument(
+        "--orjson", action=argparse.BooleanOptionalAction, default=None,
+        help="Encode/decode HTTP bodies with orjson (default: when installed)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.stdio and msgpack is None:
+        log.error("msgpack not installed; --stdio requires `pip install msgpack`")
+        sys.exit(1)
+    if args.uvloop and uvloop is None:
+        log.error("uvloop not installed; --uvloop requires `pip install uvloop`")
+        sys.exit(1)
+    if args.orjson and orjson is None:
+        log.error("orjson not installed; --orjson requires `pip install orjson`")
+        sys.exit(1)
+
+    use_uvloop = uvloop is not None if args.uvloop is None else args.uvloop
+    fast_json = orjson is not None if args.orjson is None else args.orjson
+    use_orjson(fast_json)
+    run = uvloop.run if use_uvloop else asyncio.run
+    log.info(
+        f"Event loop: {'uvloop' if use_uvloop else 'asyncio'}, "
+        f"JSON codec: {'orjson' if fast_json else 'json'}"
+    )
+
+    global daemon
+    daemon = RoborockDaemon(
+        status_ttl=args.status_ttl,
+        status_stale=args.status_stale,
+        timeout_multiplier=args.timeout_multiplier,
+        offline_after=args.offline_after,
+        probe_interval=args.probe_interval,
+        reconnect_wait=args.reconnect_wait,
+        session_factory=session_factory,
+        recorder=TrafficRecorder(args.record) if args.record else None,
+        max_pending=args.max_pending,
+    )
 
     try:
-        asyncio.run(run_server(args.port))
+        if args.stdio:
+            run(run_stdio())
+        else:
+            run(run_server(args.port, args.unix_socket))
     except KeyboardInterrupt:
         log.info("Interrupted")
+    finally:
+        if daemon.recorder is not None:
+            daemon.recorder.close()
+        if args.unix_socket:
+            remove_socket(args.unix_socket, bound_socket)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Open-loop load generator for the Roborock daemon's HTTP API.
+
+Creates N synthetic users with M devices each, then issues a weighted mix of
+commands at a fixed target rate for a set duration, printing a latency and
+error summary every second and a final JSON summary on stdout.
+
+Requests are sent on a precomputed schedule whether or not earlier ones have
+finished. Latency is measured from each request's scheduled start, so a
+stalled daemon shows up as tail latency rather than as a lower send rate
+(no coordinated omission).
+
+Usage (from this directory):
+    python -m roborock_loadgen --spawn-sim --users 100 --devices 2 --rate 500 --duration 30
+    python -m roborock_loadgen --port 9876 --mix get_status=8,app_start=1,set_custom_mode=1
+
+With --spawn-sim a daemon on simulated devices (roborock_sim.py) is started
+for the run. Otherwise the target must already be a daemon on simulated
+devices, since users are initialized with synthetic credentials.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Any
+
+import aiohttp
+
+from roborock_sim import SIM_LOCAL_KEY, SIM_RRIOT
+
+SIM_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "roborock_sim.py")
+DEFAULT_MIX = "get_status=8,app_start=1,set_custom_mode=1"
+FAN_POWERS = [101, 102, 103, 104]
+REQUEST_TIMEOUT = 35.0
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    """Parse `command=weight,...` into a command -> weight mapping."""
+    mix = {}
+    for part in spec.split(","):
+        command, _, weight = part.partition("=")
+        mix[command.strip()] = float(weight) if weight else 1.0
+    if not mix or any(weight < 0 for weight in mix.values()) or sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError(f"Invalid command mix: {spec}")
+    return mix
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    """Nearest-rank percentile of already sorted samples."""
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Stats:
+    """Latency and error counts, for the whole run and since the last report."""
+
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.window: list[float] = []
+        self.errors: Counter[str] = Counter()
+        self.window_errors = 0
+        self.sent = 0
+        self.max_lag = 0.0  # worst gap between scheduled and actual send
+
+    def record(self, latency_ms: float, error: str | None):
+        self.latencies.append(latency_ms)
+        self.window.append(latency_ms)
+        if error:
+            self.errors[error] += 1
+            self.window_errors += 1
+
+    @staticmethod
+    def summarize(samples: list[float]) -> dict[str, float | None]:
+        if not samples:
+            return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+        ordered = sorted(samples)
+        return {
+            "p50_ms": round(percentile(ordered, 50), 2),
+            "p95_ms": round(percentile(ordered, 95), 2),
+            "p99_ms": round(percentile(ordered, 99), 2),
+            "max_ms": round(ordered[-1], 2),
+        }
+
+    def report(self, elapsed: float) -> str:
+        """One status line for the interval since the last report."""
+        summary = {key: "-" if value is None else f"{value}ms" for key, value in self.summarize(self.window).items()}
+        line = (
+            f"[{elapsed:6.1f}s] sent={self.sent} done={len(self.latencies)} "
+            f"inflight={self.sent - len(self.latencies)} "
+            f"interval: n={len(self.window)} err={self.window_errors} "
+            f"p50={summary['p50_ms']} p99={summary['p99_ms']} max={summary['max_ms']}"
+        )
+        self.window = []
+        self.window_errors = 0
+        return line
+
+
+def command_body(rng: random.Random, command: str, user_id: str, device_id: str) -> dict[str, Any]:
+    body = {"user_id": user_id, "device_id": device_id, "local_key": SIM_LOCAL_KEY, "command": command}
+    if command == "set_custom_mode":
+        body["params"] = [rng.choice(FAN_POWERS)]
+    return body
+
+
+def schedule(rate: float, duration: float, poisson: bool, rng: random.Random) -> list[float]:
+    """Offsets in seconds from the start at which each request is due."""
+    offsets = []
+    t = 0.0
+    while t < duration:
+        offsets.append(t)
+        t += rng.expovariate(rate) if poisson else 1 / rate
+    return offsets
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    rng = random.Random(args.seed)
+    if args.unix_socket:
+        connector = aiohttp.UnixConnector(path=args.unix_socket, limit=args.max_connections)
+        base_url = "http://localhost"
+    else:
+        connector = aiohttp.TCPConnector(limit=args.max_connections)
+        base_url = f"http://127.0.0.1:{args.port}"
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    stats = Stats()
+    targets = [(f"load-{u}", f"sim-{d}") for u in range(args.users) for d in range(args.devices)]
+    commands = list(args.mix)
+    weights = list(args.mix.values())
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+
+        async def init(u: int):
+            rriot = {**SIM_RRIOT, "u": f"load-user-{u}"}
+            async with session.post(f"{base_url}/init", json={"user_id": f"load-{u}", "rriot": rriot}) as resp:
+                body = await resp.json()
+            if not body.get("success"):
+                raise RuntimeError(f"Init failed for load-{u}: {body.get('error')}")
+
+        for start in range(0, args.users, 100):
+            await asyncio.gather(*(init(u) for u in range(start, min(args.users, start + 100))))
+        print(f"Initialized {args.users} users x {args.devices} devices", file=sys.stderr)
+
+        async def fire(due: float, body: dict[str, Any]):
+            error = None
+            try:
+                async with session.post(f"{base_url}/command", json=body) as resp:
+                    result = await resp.json()
+                if not result.get("success"):
+                    error = result.get("error") or f"HTTP {resp.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = type(e).__name__
+            stats.record((time.perf_counter() - due) * 1000, error)
+
+        loop_start = time.perf_counter()
+
+        async def reporter():
+            while True:
+                await asyncio.sleep(args.report_interval)
+                print(stats.report(time.perf_counter() - loop_start), file=sys.stderr)
+
+        reporting = asyncio.create_task(reporter())
+        tasks = []
+        for offset in schedule(args.rate, args.duration, args.poisson, rng):
+            due = loop_start + offset
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            stats.max_lag = max(stats.max_lag, time.perf_counter() - due)
+            user_id, device_id = rng.choice(targets)
+            command = rng.choices(commands, weights)[0]
+            tasks.append(asyncio.create_task(fire(due, command_body(rng, command, user_id, device_id))))
+            stats.sent += 1
+        send_elapsed = time.perf_counter() - loop_start
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - loop_start
+        reporting.cancel()
+        print(stats.report(elapsed), file=sys.stderr)
+
+    return {
+        "users": args.users,
+        "devices_per_user": args.devices,
+        "target_rate": args.rate,
+        "duration_s": args.duration,
+        "mix": args.mix,
+        "requests": len(stats.latencies),
+        "achieved_rate": round(stats.sent / send_elapsed, 1),
+        "elapsed_s": round(elapsed, 2),
+        "errors": sum(stats.errors.values()),
+        "top_errors": dict(stats.errors.most_common(5)),
+        "max_send_lag_ms": round(stats.max_lag * 1000, 2),
+        **Stats.summarize(stats.latencies),
+    }
+
+
+async def wait_healthy(args: argparse.Namespace, proc: subprocess.Popen):
+    """Wait for a spawned daemon to answer /health."""
+    if args.unix_socket:
+        connector, url = aiohttp.UnixConnector(path=args.unix_socket), "http://localhost/health"
+    else:
+        connector, url = aiohttp.TCPConnector(), f"http://127.0.0.1:{args.port}/health"
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for _ in range(100):
+            if proc.poll() is not None:
+                raise RuntimeError(f"Daemon exited with code {proc.returncode}")
+            try:
+                async with session.get(url) as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Daemon did not become healthy")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load generator for the Roborock daemon")
+    parser.add_argument("--users", type=int, default=10, help="Synthetic users, each with its own session")
+    parser.add_argument("--devices", type=int, default=1, help="Simulated devices per user")
+    parser.add_argument("--rate", type=float, default=100.0, help="Target commands per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to generate load for")
+    parser.add_argument(
+        "--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+        help=f"Weighted command mix (default: {DEFAULT_MIX})",
+    )
+    parser.add_argument("--poisson", action="store_true", help="Poisson arrivals instead of a fixed interval")
+    parser.add_argument("--port", type=int, default=9876, help="Daemon port")
+    parser.add_argument("--unix-socket", metavar="PATH", help="Daemon Unix socket instead of TCP")
+    parser.add_argument("--spawn-sim", action="store_true", help="Start a daemon on simulated devices for the run")
+    parser.add_argument("--device-latency", type=float, default=0.05, help="Simulated device latency with --spawn-sim")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Simulated drop rate with --spawn-sim")
+    parser.add_argument("--max-connections", type=int, default=1000, help="HTTP connection pool size")
+    parser.add_argument("--report-interval", type=float, default=1.0, help="Seconds between live summaries")
+    parser.add_argument("--seed", type=int, help="Seed device/command choices for repeatable runs")
+    args = parser.parse_args()
+
+    proc = None
+    if args.spawn_sim:
+        listen = ["--unix-socket", args.unix_socket] if args.unix_socket else ["--port", str(args.port)]
+        proc = subprocess.Popen(
+            [
+                sys.executable, SIM_SCRIPT, "daemon",
+                "--devices", str(args.devices),
+                "--latency", str(args.device_latency),
+                "--drop-rate", str(args.drop_rate),
+                "--", *listen,
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    try:
+        if proc is not None:
+            asyncio.run(wait_healthy(args, proc))
+        result = asyncio.run(run(args))
+    except KeyboardInterrupt:
+        sys.exit(130)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Replay a daemon MQTT traffic recording through the parse/dispatch path.
+
+Reads a file written by `roborock_daemon.py --record PATH` and feeds it back
+through RoborockDaemon's per-user message handler with no broker or
+devices. Each recorded outbound request registers a pending response as the
+live daemon would, so inbound responses resolve them and pushes reach the
+event hub. Records play at their original pacing, accelerated by --speed,
+or back to back with --speed 0 for profiling.
+
+Usage:
+    python roborock_replay.py traffic.rec --keys keys.json [--speed 0] [--repeat 10] [--profile]
+
+Recordings hold payloads as encrypted on the wire, so the devices' local
+keys are needed: --keys takes a JSON object of device id -> local key, and
+--local-key applies to any device not in it (e.g. the simulator's key).
+
+Prints a JSON summary: message counts, matched/unmatched responses,
+responses that arrived out of request order, recorded response latency and
+the per-message decode/dispatch cost.
+"""
+
+import argparse
+import asyncio
+import cProfile
+import json
+import pstats
+import statistics
+import sys
+import time
+from typing import Any
+
+from roborock_daemon import (
+    TRAFFIC_INBOUND,
+    RoborockDaemon,
+    TrafficRecord,
+    UserContext,
+    read_traffic,
+)
+
+try:
+    from roborock.roborock_message import RoborockMessageProtocol
+except ImportError as e:
+    print(json.dumps({"error": f"python-roborock not installed: {e}"}))
+    sys.exit(1)
+
+# Credentials only shape the replayed contexts; nothing is sent anywhere
+REPLAY_RRIOT = {
+    "u": "replay",
+    "s": "replay",
+    "h": "replay",
+    "k": "replay",
+    "r": {"a": "https://api.replay.invalid", "m": "ssl://mqtt.replay.invalid:8883"},
+}
+
+
+def _percentile(ordered: list[float], pct: float) -> float | None:
+    if not ordered:
+        return None
+    return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))]
+
+
+class _TrackedPending(dict):
+    """pending_responses that remembers which keys the dispatcher resolved."""
+
+    def __init__(self):
+        super().__init__()
+        self.resolved: list[str] = []
+
+    def pop(self, key, *default):
+        if key in self:
+            self.resolved.append(key)
+        return super().pop(key, *default)
+
+
+def _request_ids(context: UserContext, record: TrafficRecord) -> list[int]:
+    """RPC request ids carried by a recorded outbound payload."""
+    device = context.devices.get(record.device_id)
+    if device is None:
+        return []
+    ids = []
+    for msg in device.decode(record.payload):
+        if msg.protocol == RoborockMessageProtocol.RPC_REQUEST and msg.payload:
+            ids.append(json.loads(json.loads(msg.payload)["dps"]["101"])["id"])
+    return ids
+
+
+async def replay(
+    records: list[TrafficRecord],
+    keys: dict[str, str],
+    default_key: str | None,
+    speed: float,
+    repeat: int,
+    profiler: cProfile.Profile | None,
+) -> dict[str, Any]:
+    daemon = RoborockDaemon(status_ttl=0)
+    pending = daemon.pending_responses = _TrackedPending()
+    contexts: dict[str, UserContext] = {}
+    dispatchers = {}
+    for record in records:
+        if record.user_id not in contexts:
+            context = UserContext.create(daemon._create_rriot(REPLAY_RRIOT))
+            contexts[record.user_id] = context
+            dispatchers[record.user_id] = daemon._make_dispatcher(record.user_id, context)
+        key = keys.get(record.device_id, default_key)
+        if key is not None:
+            contexts[record.user_id].device(record.device_id, key)
+
+    dispatch_us: list[float] = []
+    response_ms: list[float] = []
+    registered = matched = out_of_order = 0
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+
+    for _ in range(repeat):
+        sent: dict[str, tuple[int, float]] = {}  # pending key -> (send order, recorded ts)
+        send_order = 0
+        latest_answered = -1
+        first_ts = records[0].ts if records else 0.0
+        pass_start = time.perf_counter()
+        for record in records:
+            if speed > 0:
+                delay = (record.ts - first_ts) / speed - (time.perf_counter() - pass_start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if record.direction != TRAFFIC_INBOUND:
+                for request_id in _request_ids(contexts[record.user_id], record):
+                    key = f"{record.user_id}:{record.device_id}:{request_id}"
+                    pending[key] = loop.create_future()
+                    sent[key] = (send_order, record.ts)
+                    send_order += 1
+                    registered += 1
+                continue
+
+            if profiler is not None:
+                profiler.enable()
+            start = time.perf_counter()
+            dispatchers[record.user_id](record.device_id, record.payload)
+            dispatch_us.append((time.perf_counter() - start) * 1e6)
+            if profiler is not None:
+                profiler.disable()
+
+            for key in pending.resolved:
+                order, sent_ts = sent.pop(key)
+                matched += 1
+                response_ms.append((record.ts - sent_ts) * 1000)
+                # A later request was already answered: this one was overtaken
+                if order < latest_answered:
+                    out_of_order += 1
+                latest_answered = max(latest_answered, order)
+            pending.resolved.clear()
+        pending.clear()
+
+    dispatch_us.sort()
+    response_ms.sort()
+    inbound = sum(1 for record in records if record.direction == TRAFFIC_INBOUND)
+    return {
+        "records": len(records),
+        "inbound": inbound,
+        "outbound": len(records) - inbound,
+        "users": len(contexts),
+        "devices": len({(r.user_id, r.device_id) for r in records}),
+        "repeat": repeat,
+        "speed": speed,
+        "matched_responses": matched,
+        "unmatched_requests": registered - matched,
+        "out_of_order_responses": out_of_order,
+        "recorded_response_p50_ms": _round(_percentile(response_ms, 50)),
+        "recorded_response_p99_ms": _round(_percentile(response_ms, 99)),
+        "dispatch_p50_us": _round(_percentile(dispatch_us, 50)),
+        "dispatch_p99_us": _round(_percentile(dispatch_us, 99)),
+        "dispatch_mean_us": _round(statistics.fmean(dispatch_us)) if dispatch_us else None,
+        "wall_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def _round(value: float | None) -> float | None:
+    return None if value is None else round(value, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded MQTT traffic file")
+    parser.add_argument("recording", help="File written by roborock_daemon.py --record")
+    parser.add_argument("--keys", help="JSON file mapping device id -> local key")
+    parser.add_argument("--local-key", help="Local key for devices not listed in --keys")
+    parser.add_argument(
+        "--speed", type=float, default=1.0,
+        help="Playback speed relative to the recording; 0 replays back to back",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the recording this many times")
+    parser.add_argument("--profile", action="store_true", help="Print a cProfile of dispatch to stderr")
+    args = parser.parse_args()
+
+    keys = {}
+    if args.keys:
+        with open(args.keys) as f:
+            keys = json.load(f)
+    if not keys and not args.local_key:
+        parser.error("--keys or --local-key is required to decode the recording")
+
+    records = read_traffic(args.recording)
+    profiler = cProfile.Profile() if args.profile else None
+    result = asyncio.run(replay(records, keys, args.local_key, args.speed, args.repeat, profiler))
+    print(json.dumps(result, indent=2))
+    if profiler is not None:
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(20)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""In-process Roborock MQTT broker and V1 device simulator.
+
+Runs the daemon or the bridge end to end without a cloud account, robot or
+network. `SimBroker.session` is a drop-in for the MQTT session classes:
+publishes to a device's inbound topic are decoded by the matching
+`SimDevice` with its local key, answered from a small vacuum state
+machine, and delivered back on the outbound topic as encoded
+RPC_RESPONSE messages after a configurable latency. Requests to unknown
+devices, and a `drop_rate` share of the rest, go unanswered.
+
+The link between clients and devices can be impaired with one of the named
+IMPAIRMENT_PROFILES (delay, jitter, loss, duplication and reordering),
+applied independently to every request and response.
+
+Usage:
+    python roborock_sim.py daemon [--devices 10] [--latency 0.05] [--drop-rate 0] [--impairment wifi] -- [daemon args]
+    echo '{...}' | python roborock_sim.py bridge command
+
+In code:
+    broker = SimBroker()
+    broker.add_device(SimDevice("sim-0", latency=0.02))
+    daemon = RoborockDaemon(session_factory=broker.session)
+
+Simulated devices are named sim-0 .. sim-N-1 and share SIM_LOCAL_KEY. The
+broker accepts any rriot credentials; SIM_RRIOT is a ready-made set.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+try:
+    from roborock.exceptions import RoborockException
+    from roborock.protocol import MessageParser
+    from roborock.roborock_message import RoborockDataProtocol, RoborockMessage, RoborockMessageProtocol
+except ImportError as e:
+    print(json.dumps({"error": f"python-roborock not installed: {e}"}))
+    sys.exit(1)
+
+log = logging.getLogger(__name__)
+
+SIM_LOCAL_KEY = "simlocalkey12345"
+SIM_RRIOT = {
+    "u": "sim-user",
+    "s": "sim-secret",
+    "h": "sim-hmac",
+    "k": "sim-key",
+    "r": {"a": "https://api.sim.invalid", "m": "ssl://mqtt.sim.invalid:8883"},
+}
+
+# V1 state codes the simulated vacuum moves between
+STATE_CLEANING = 5
+STATE_RETURNING = 6
+STATE_CHARGING = 8
+STATE_PAUSED = 10
+
+SIM_STATUS = {
+    "msg_ver": 2,
+    "state": STATE_CHARGING,
+    "battery": 100,
+    "clean_time": 1176,
+    "clean_area": 20965000,
+    "error_code": 0,
+    "map_present": 1,
+    "in_cleaning": 0,
+    "in_returning": 0,
+    "fan_power": 102,
+    "water_box_mode": 200,
+    "mop_mode": 300,
+    "dnd_enabled": 0,
+    "charge_status": 1,
+}
+SIM_CONSUMABLE = {
+    "main_brush_work_time": 74382,
+    "side_brush_work_time": 74383,
+    "filter_work_time": 74384,
+    "sensor_dirty_time": 74385,
+}
+
+
+@dataclass(frozen=True)
+class Impairment:
+    """Network conditions applied to each message crossing the simulated broker.
+
+    Every message is delayed by `delay` plus up to `jitter` seconds, lost
+    with probability `loss`, delivered twice with probability `duplicate`,
+    and held back an extra `reorder_delay` with probability `reorder` so
+    that later messages overtake it.
+    """
+
+    delay: float = 0.0
+    jitter: float = 0.0
+    loss: float = 0.0
+    duplicate: float = 0.0
+    reorder: float = 0.0
+    reorder_delay: float = 0.1
+
+
+IMPAIRMENT_PROFILES = {
+    "none": Impairment(),
+    "lan": Impairment(delay=0.002, jitter=0.001),
+    "wifi": Impairment(delay=0.01, jitter=0.02, loss=0.005),
+    "wan": Impairment(delay=0.08, jitter=0.04, loss=0.01, reorder=0.02),
+    "lossy": Impairment(delay=0.02, jitter=0.01, loss=0.05),
+    "duplicating": Impairment(delay=0.02, jitter=0.01, duplicate=0.1),
+    "reordering": Impairment(delay=0.02, jitter=0.01, reorder=0.2),
+    "degraded": Impairment(delay=0.15, jitter=0.1, loss=0.03, duplicate=0.02, reorder=0.1, reorder_delay=0.3),
+}
+
+
+class SimDevice:
+    """A simulated V1 vacuum reachable through a SimBroker.
+
+    `latency` is the delay in seconds before each response; `drop_rate` is
+    the probability a request is silently ignored.
+    """
+
+    def __init__(
+        self,
+        duid: str,
+        local_key: str = SIM_LOCAL_KEY,
+        latency: float = 0.05,
+        drop_rate: float = 0.0,
+        seed: int | None = None,
+    ):
+        self.duid = duid
+        self.local_key = local_key
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.random = random.Random(seed)
+        self.stats = {"requests": 0, "dropped": 0, "responses": 0}
+        self.status = dict(SIM_STATUS)
+        # Commands that change state; anything else unknown just answers "ok"
+        self.handlers: dict[str, Callable[[list], Any]] = {
+            "get_status": lambda params: [dict(self.status)],
+            "get_consumable": lambda params: [dict(SIM_CONSUMABLE)],
+            "app_start": lambda params: self._set_state(STATE_CLEANING),
+            "app_pause": lambda params: self._set_state(STATE_PAUSED),
+            "app_stop": lambda params: self._set_state(STATE_PAUSED),
+            "app_charge": lambda params: self._set_state(STATE_RETURNING),
+            "set_custom_mode": self._set_fan_power,
+        }
+
+    def _set_state(self, state: int) -> list[str]:
+        self.status["state"] = state
+        self.status["in_cleaning"] = int(state == STATE_CLEANING)
+        self.status["in_returning"] = int(state == STATE_RETURNING)
+        return ["ok"]
+
+    def _set_fan_power(self, params: list) -> list[str]:
+        if not params or not isinstance(params[0], int):
+            raise ValueError("set_custom_mode expects [fan_power]")
+        self.status["fan_power"] = params[0]
+        return ["ok"]
+
+    def _call(self, method: str, params: Any) -> dict[str, Any]:
+        """Run one RPC against the device state."""
+        handler = self.handlers.get(method)
+        if handler is None:
+            return {"result": ["ok"]}
+        try:
+            return {"result": handler(params)}
+        except Exception as e:
+            return {"error": {"code": -1, "message": str(e)}}
+
+    def _encode(self, protocol: RoborockMessageProtocol, dps: dict[str, Any], seq: int | None = None) -> bytes:
+        payload = json.dumps({"dps": dps, "t": int(time.time())}).encode()
+        if seq is None:
+            message = RoborockMessage(protocol=protocol, payload=payload)
+        else:
+            message = RoborockMessage(protocol=protocol, payload=payload, seq=seq)
+        return MessageParser.build(message, self.local_key, prefixed=False)
+
+    def handle(self, payload: bytes) -> list[bytes]:
+        """Decode a published request and return the encoded responses to send."""
+        try:
+            messages, _ = MessageParser.parse(payload, self.local_key)
+        except Exception as e:
+            log.debug(f"Simulated device {self.duid} could not decode request: {e}")
+            return []
+        replies = []
+        for message in messages:
+            if message.protocol != RoborockMessageProtocol.RPC_REQUEST or not message.payload:
+                continue
+            try:
+                request = json.loads(json.loads(message.payload)["dps"]["101"])
+            except (ValueError, KeyError, TypeError):
+                continue
+            self.stats["requests"] += 1
+            if self.random.random() < self.drop_rate:
+                self.stats["dropped"] += 1
+                continue
+            body = {"id": request["id"], **self._call(request["method"], request.get("params", []))}
+            replies.append(self._encode(
+                RoborockMessageProtocol.RPC_RESPONSE, {"102": json.dumps(body)}, seq=request["id"]
+            ))
+            self.stats["responses"] += 1
+        return replies
+
+    def push(self) -> bytes:
+        """Encode an unsolicited state push like the ones real devices send."""
+        return self._encode(RoborockMessageProtocol.GENERAL_RESPONSE, {
+            str(int(RoborockDataProtocol.STATE)): self.status["state"],
+            str(int(RoborockDataProtocol.BATTERY)): self.status["battery"],
+            str(int(RoborockDataProtocol.FAN_POWER)): self.status["fan_power"],
+            str(int(RoborockDataProtocol.WATER_BOX_MODE)): self.status["water_box_mode"],
+        })
+
+
+class SimBroker:
+    """Routes MQTT publishes between simulated sessions and devices in-process.
+
+    Topics follow the Roborock layout: clients publish to
+    rr/m/i/<rriot.u>/<username>/<duid> and devices answer on the matching
+    rr/m/o/... topic. Subscriptions match exactly or by a trailing `+`.
+    """
+
+    def __init__(self, impairment: Impairment | None = None, seed: int | None = None):
+        self.devices: dict[str, SimDevice] = {}
+        self.sessions: list[SimMqttSession] = []
+        self.online = True
+        self.impairment = impairment or IMPAIRMENT_PROFILES["none"]
+        self.random = random.Random(seed)
+        self.stats = {"lost": 0, "duplicated": 0, "reordered": 0}
+        self._subscribers: dict[str, list[Callable[[str, bytes], None]]] = {}  # topic -> callbacks
+
+    def add_device(self, device: SimDevice) -> SimDevice:
+        self.devices[device.duid] = device
+        return device
+
+    def session(self, params, *args, **kwargs) -> "SimMqttSession":
+        """Session factory with the signature of RoborockMqttSession."""
+        return SimMqttSession(self, params)
+
+    def subscribe(self, topic: str, callback: Callable[[str, bytes], None]) -> Callable[[], None]:
+        callbacks = self._subscribers.setdefault(topic, [])
+        callbacks.append(callback)
+
+        def unsubscribe():
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._subscribers.pop(topic, None)
+
+        return unsubscribe
+
+    def _transmit(self, extra_delay: float, callback: Callable[..., None], *args):
+        """Schedule callback(*args) as one message crossing the impaired link."""
+        impairment = self.impairment
+        rng = self.random
+        if impairment.loss and rng.random() < impairment.loss:
+            self.stats["lost"] += 1
+            return
+        copies = 1
+        if impairment.duplicate and rng.random() < impairment.duplicate:
+            self.stats["duplicated"] += 1
+            copies = 2
+        loop = asyncio.get_running_loop()
+        for _ in range(copies):
+            delay = extra_delay + impairment.delay + rng.uniform(0, impairment.jitter)
+            if impairment.reorder and rng.random() < impairment.reorder:
+                self.stats["reordered"] += 1
+                delay += impairment.reorder_delay
+            if delay > 0:
+                loop.call_later(delay, callback, *args)
+            else:
+                loop.call_soon(callback, *args)
+
+    def publish(self, topic: str, payload: bytes):
+        """Hand a client publish to the addressed device, if it exists."""
+        prefix, _, duid = topic.rpartition("/")
+        device = self.devices.get(duid)
+        if device is None or not prefix.startswith("rr/m/i/"):
+            return
+        self._transmit(0.0, self._device_receive, device, "rr/m/o/" + topic[len("rr/m/i/"):], payload)
+
+    def _device_receive(self, device: SimDevice, reply_topic: str, payload: bytes):
+        for reply in device.handle(payload):
+            self._transmit(device.latency, self.deliver, reply_topic, reply)
+
+    def deliver(self, topic: str, payload: bytes):
+        """Deliver a message to every subscriber whose filter matches topic."""
+        if not self.online:
+            return
+        callbacks = list(self._subscribers.get(topic, ()))
+        callbacks += self._subscribers.get(topic.rpartition("/")[0] + "/+", ())
+        for callback in callbacks:
+            try:
+                callback(topic, payload)
+            except Exception as e:
+                log.error(f"Uncaught error in simulated subscriber for {topic}: {e}")
+
+    def push(self, duid: str):
+        """Publish a state push from a device to everyone subscribed to it."""
+        payload = self.devices[duid].push()
+        topics = {
+            f"{prefix}/{duid}"
+            for prefix, _, level in (topic.rpartition("/") for topic in self._subscribers)
+            if prefix.startswith("rr/m/o/") and level in ("+", duid)
+        }
+        for topic in topics:
+            self.deliver(topic, payload)
+
+    def set_online(self, online: bool):
+        """Simulate a broker outage; sessions see their connection drop and return."""
+        self.online = online
+        for session in list(self.sessions):
+            session._set_connected(online)
+
+
+class SimMqttSession:
+    """Drop-in for RoborockMqttSession / WildcardMqttSession on a SimBroker."""
+
+    def __init__(self, broker: SimBroker, params):
+        self.broker = broker
+        self.params = params
+        self.on_connection_change: Callable[[bool], None] | None = None
+        self._connected = False
+        self._started = False
+        self._unsubscribes: list[Callable[[], None]] = []
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    def _set_connected(self, connected: bool):
+        if not self._started or connected == self._connected:
+            return
+        self._connected = connected
+        if self.on_connection_change is not None:
+            self.on_connection_change(connected)
+
+    async def start(self):
+        if not self.broker.online:
+            raise RoborockException("Error starting MQTT session: simulated broker offline")
+        self._started = True
+        self.broker.sessions.append(self)
+        self._set_connected(True)
+
+    async def close(self):
+        for unsubscribe in self._unsubscribes:
+            unsubscribe()
+        self._unsubscribes.clear()
+        if self in self.broker.sessions:
+            self.broker.sessions.remove(self)
+        self._set_connected(False)
+        self._started = False
+
+    def _track(self, unsubscribe: Callable[[], None]) -> Callable[[], None]:
+        self._unsubscribes.append(unsubscribe)
+
+        def untrack():
+            if unsubscribe in self._unsubscribes:
+                self._unsubscribes.remove(unsubscribe)
+                unsubscribe()
+
+        return untrack
+
+    async def subscribe(self, topic: str, callback: Callable[[bytes], None]) -> Callable[[], None]:
+        return self._track(self.broker.subscribe(topic, lambda _topic, payload: callback(payload)))
+
+    async def subscribe_prefix(self, prefix: str, handler: Callable[[str, bytes], None]) -> Callable[[], None]:
+        return self._track(self.broker.subscribe(
+            f"{prefix}/+", lambda topic, payload: handler(topic.rpartition("/")[2], payload)
+        ))
+
+    async def publish(self, topic: str, message: bytes):
+        if not self._connected:
+            raise RoborockException("Error publishing message: simulated session not connected")
+        self.broker.publish(topic, message)
+
+
+def build_broker(
+    devices: int,
+    latency: float,
+    drop_rate: float,
+    seed: int | None = None,
+    impairment: Impairment | None = None,
+) -> SimBroker:
+    """A broker with `devices` simulated vacuums named sim-0 .. sim-N-1."""
+    broker = SimBroker(impairment, seed)
+    for i in range(devices):
+        broker.add_device(SimDevice(
+            f"sim-{i}", latency=latency, drop_rate=drop_rate,
+            seed=None if seed is None else seed + i,
+        ))
+    return broker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the daemon or bridge against simulated devices")
+    parser.add_argument("target", choices=["daemon", "bridge"])
+    parser.add_argument("--devices", type=int, default=10, help="Number of simulated devices")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds before each device response")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Probability a request goes unanswered")
+    parser.add_argument(
+        "--impairment", choices=sorted(IMPAIRMENT_PROFILES), default="none",
+        help="Named network impairment profile for every message",
+    )
+    parser.add_argument("--seed", type=int, help="Seed the drop and impairment decisions for repeatable runs")
+    args, rest = parser.parse_known_args()
+    if rest[:1] == ["--"]:
+        rest = rest[1:]
+
+    broker = build_broker(
+        args.devices, args.latency, args.drop_rate, args.seed, IMPAIRMENT_PROFILES[args.impairment]
+    )
+    if args.target == "daemon":
+        import roborock_daemon
+
+        roborock_daemon.main(rest, session_factory=broker.session)
+    else:
+        import roborock_bridge
+
+        roborock_bridge.RoborockMqttSession = broker.session
+        sys.argv = ["roborock_bridge.py", *rest]
+        roborock_bridge.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+"""Sharded Roborock daemon: a supervisor in front of N worker daemons.
+
+One daemon process runs every user on a single asyncio loop and core. The
+supervisor spawns N `roborock_daemon.py` workers on private Unix sockets
+and serves the same HTTP API, routing each user_id to a worker through a
+consistent hash ring. Crashed workers are restarted and only their users
+are re-initialized from the last /init payload.
+
+Usage:
+    python roborock_supervisor.py --workers 4 --port 9876
+    python roborock_supervisor.py --workers 4 --unix-socket /run/smarthome/roborock.sock
+
+Any other arguments (e.g. --status-ttl 5) are passed through to the workers.
+"""
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+from http import HTTPStatus
+from typing import Any
+
+import aiohttp
+from aiohttp import web
+
+from roborock_daemon import (
+    EVENTS_KEEPALIVE,
+    MAX_BATCH_SIZE,
+    EventHub,
+    log,
+    remove_socket,
+    socket_identity,
+)
+
+DAEMON_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "roborock_daemon.py")
+
+# Ring points per worker; more points spread users more evenly
+VIRTUAL_NODES = 64
+
+# Seconds a request waits for its worker to come back after a crash
+WORKER_RESTART_WAIT = 10.0
+
+# Delay before restarting a worker that exited
+WORKER_RESTART_DELAY = 1.0
+
+# Seconds /health waits on each ready worker; health must answer promptly
+WORKER_HEALTH_TIMEOUT = 1.0
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hash ring mapping user ids to worker indexes."""
+
+    def __init__(self, workers: int, virtual_nodes: int = VIRTUAL_NODES):
+        points = sorted(
+            (_hash(f"worker-{index}#{node}"), index)
+            for index in range(workers)
+            for node in range(virtual_nodes)
+        )
+        self.hashes = [h for h, _ in points]
+        self.owners = [index for _, index in points]
+
+    def lookup(self, key: str) -> int:
+        position = bisect.bisect(self.hashes, _hash(key)) % len(self.hashes)
+        return self.owners[position]
+
+
+class Worker:
+    """One roborock_daemon.py child process listening on a Unix socket."""
+
+    def __init__(self, index: int, socket_path: str, args: list[str]):
+        self.index = index
+        self.socket_path = socket_path
+        self.args = args
+        self.proc: asyncio.subprocess.Process | None = None
+        self.client: aiohttp.ClientSession | None = None
+        self.ready = asyncio.Event()
+        self.restarts = 0
+        self.socket_id: tuple[int, int] | None = None  # socket bound by the current process
+
+    async def start(self):
+        """Spawn the worker and wait until it answers /health.
+
+        The caller sets `ready` once the worker's users are restored, so
+        routed requests never reach a worker that is missing their session.
+        """
+        # Clear the socket a crashed worker left behind, but never a live one
+        remove_socket(self.socket_path, self.socket_id)
+        self.socket_id = None
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable, DAEMON_SCRIPT, "--unix-socket", self.socket_path, *self.args,
+        )
+        if self.client is None:
+            self.client = aiohttp.ClientSession(
+                connector=aiohttp.UnixConnector(path=self.socket_path),
+                timeout=aiohttp.ClientTimeout(total=None),
+            )
+        for _ in range(100):
+            if self.proc.returncode is not None:
+                raise RuntimeError(f"Worker {self.index} exited with code {self.proc.returncode}")
+            try:
+                async with self.client.get("http://worker/health") as resp:
+                    if resp.status == HTTPStatus.OK:
+                        self.socket_id = socket_identity(self.socket_path)
+                        log.info(f"Worker {self.index} ready (pid {self.proc.pid})")
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.1)
+        raise RuntimeError(f"Worker {self.index} did not become healthy")
+
+    async def request(
+        self, method: str, path: str, body: Any = None, headers: dict[str, str] | None = None
+    ) -> tuple[int, Any]:
+        """Forward a request once the worker is ready, returning (status, JSON body)."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), WORKER_RESTART_WAIT)
+        except asyncio.TimeoutError:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"success": False, "error": "Worker restarting"}
+        return await self.send(method, path, body, headers)
+
+    async def send(
+        self, method: str, path: str, body: Any = None, headers: dict[str, str] | None = None
+    ) -> tuple[int, Any]:
+        """Forward a request without waiting for the worker to be ready."""
+        try:
+            async with self.client.request(
+                method, f"http://worker{path}", json=body, headers=headers
+            ) as resp:
+                return resp.status, await resp.json()
+        except (aiohttp.ClientError, json.JSONDecodeError) as e:
+            return HTTPStatus.BAD_GATEWAY, {"success": False, "error": f"Worker {self.index} failed: {e}"}
+
+    async def text(self, path: str) -> str:
+        async with self.client.get(f"http://worker{path}") as resp:
+            return await resp.text()
+
+    async def stop(self):
+        self.ready.clear()
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.terminate()
+            try:
+                await asyncio.wait_for(self.proc.wait(), 10)
+            except asyncio.TimeoutError:
+                self.proc.kill()
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+
+class Supervisor:
+    """Routes the daemon API to workers and keeps them running."""
+
+    def __init__(self, workers: int, worker_args: list[str]):
+        self.socket_dir = tempfile.mkdtemp(prefix="roborock-workers-")
+        self.workers = [
+            Worker(index, os.path.join(self.socket_dir, f"worker-{index}.sock"), worker_args)
+            for index in range(workers)
+        ]
+        self.ring = HashRing(workers)
+        self.inits: dict[str, dict[str, Any]] = {}  # user_id -> last successful /init body
+        self.events = EventHub()
+        self.tasks: list[asyncio.Task] = []
+        self.stopping = False
+
+    def worker_for(self, user_id: str) -> Worker:
+        return self.workers[self.ring.lookup(user_id)]
+
+    async def start(self):
+        await asyncio.gather(*(worker.start() for worker in self.workers))
+        for worker in self.workers:
+            worker.ready.set()
+            self.tasks.append(asyncio.ensure_future(self._watch(worker)))
+            self.tasks.append(asyncio.ensure_future(self._forward_events(worker)))
+
+    async def _watch(self, worker: Worker):
+        """Restart the worker whenever it exits and restore its users."""
+        while not self.stopping:
+            await worker.proc.wait()
+            worker.ready.clear()
+            if self.stopping:
+                return
+            worker.restarts += 1
+            log.warning(f"Worker {worker.index} exited with code {worker.proc.returncode}, restarting")
+            await asyncio.sleep(WORKER_RESTART_DELAY)
+            try:
+                await worker.start()
+            except RuntimeError as e:
+                log.error(str(e))
+                continue
+            await self._restore(worker)
+            worker.ready.set()
+
+    async def _restore(self, worker: Worker):
+        """Re-initialize the users routed to a restarted worker."""
+        users = [user_id for user_id in self.inits if self.worker_for(user_id) is worker]
+        results = await asyncio.gather(
+            *(worker.send("POST", "/init", self.inits[user_id]) for user_id in users)
+        )
+        for user_id, (_, body) in zip(users, results):
+            if not body.get("success"):
+                log.error(f"Failed to restore user {user_id} on worker {worker.index}: {body.get('error')}")
+        log.info(f"Restored {len(users)} user(s) on worker {worker.index}")
+
+    async def _forward_events(self, worker: Worker):
+        """Relay a worker's /events stream into the supervisor's hub."""
+        while not self.stopping:
+            await worker.ready.wait()
+            try:
+                async with worker.client.get("http://worker/events") as resp:
+                    async for line in resp.content:
+                        if line.startswith(b"data: "):
+                            self.events.publish(json.loads(line[6:]))
+            except (aiohttp.ClientError, json.JSONDecodeError, AttributeError):
+                pass
+            await asyncio.sleep(0.5)
+
+    async def init(self, body: dict[str, Any]) -> tuple[int, Any]:
+        user_id = body.get("user_id")
+        if not user_id:
+            # Join the session of the user initialized with these credentials
+            user_id = next((u for u, b in self.inits.items() if b.get("rriot") == body.get("rriot")), None)
+            if user_id is None:
+                return HTTPStatus.NOT_FOUND, {"success": False, "error": "No session for these credentials"}
+            return await self.worker_for(user_id).request("POST", "/init", {**body, "user_id": user_id})
+        status, result = await self.worker_for(user_id).request("POST", "/init", body)
+        if status == HTTPStatus.OK and result.get("success"):
+            self.inits[user_id] = body
+        return status, result
+
+    async def disconnect(self, body: dict[str, Any]) -> tuple[int, Any]:
+        user_id = body.get("user_id")
+        self.inits.pop(user_id, None)
+        return await self.worker_for(user_id).request("POST", "/disconnect", body)
+
+    async def batch(self, data: Any, items: list) -> tuple[int, Any]:
+        """Split a batch by worker and reassemble the results in order."""
+        groups: dict[int, list[int]] = {}
+        for position, item in enumerate(items):
+            user_id = item.get("user_id") if isinstance(item, dict) else None
+            index = self.ring.lookup(user_id) if user_id else 0
+            groups.setdefault(index, []).append(position)
+
+        extra = {k: v for k, v in data.items() if k != "commands"} if isinstance(data, dict) else {}
+
+        async def run(index: int, positions: list[int]):
+            body = {**extra, "commands": [items[p] for p in positions]}
+            status, result = await self.workers[index].request("POST", "/commands", body)
+            if status != HTTPStatus.OK or not result.get("success"):
+                error = result.get("error", "Batch failed")
+                return [{"success": False, "error": error}] * len(positions)
+            return result["results"]
+
+        results: list[Any] = [None] * len(items)
+        outcomes = await asyncio.gather(*(run(i, p) for i, p in groups.items()))
+        for positions, outcome in zip(groups.values(), outcomes):
+            for position, result in zip(positions, outcome):
+                results[position] = result
+        return HTTPStatus.OK, {"success": True, "results": results}
+
+    async def _worker_health(self, worker: Worker) -> dict[str, Any]:
+        """A worker's /health body plus its state, without waiting on restarts."""
+        if not worker.ready.is_set():
+            return {"state": "restarting"}
+        try:
+            _, body = await asyncio.wait_for(worker.send("GET", "/health"), WORKER_HEALTH_TIMEOUT)
+        except asyncio.TimeoutError:
+            return {"state": "unresponsive"}
+        if body.get("status") != "ok":
+            return {"state": "unresponsive", **body}
+        return {"state": "ready", **body}
+
+    async def health(self) -> dict[str, Any]:
+        """Aggregate worker health immediately.
+
+        The supervisor is "ok" while any worker is serving: a restarting
+        worker only affects its own users, and reporting the whole
+        supervisor unhealthy would get it restarted along with every user.
+        """
+        bodies = await asyncio.gather(*(self._worker_health(w) for w in self.workers))
+        serving = sum(b["state"] == "ready" for b in bodies)
+        return {
+            "status": "ok" if serving else "degraded",
+            "workers_ready": serving,
+            "active_sessions": sum(b.get("active_sessions", 0) for b in bodies),
+            "users": [user for b in bodies for user in b.get("users", [])],
+            "pending_responses": sum(b.get("pending_responses", 0) for b in bodies),
+            "event_subscribers": len(self.events.subscribers),
+            "workers": [
+                {"index": w.index, "pid": w.proc.pid if w.proc else None, "restarts": w.restarts, **b}
+                for w, b in zip(self.workers, bodies)
+            ],
+        }
+
+    async def metrics(self) -> str:
+        """Merge worker metrics, adding a worker label to every sample."""
+        texts = await asyncio.gather(
+            *(w.text("/metrics") for w in self.workers), return_exceptions=True
+        )
+        families: dict[str, tuple[list[str], list[str]]] = {}  # name -> (header, samples)
+        for worker, text in zip(self.workers, texts):
+            if isinstance(text, BaseException):
+                continue
+            family = None
+            for line in text.splitlines():
+                if line.startswith("# "):
+                    family = line.split()[2]
+                    header, _ = families.setdefault(family, ([], []))
+                    if line not in header:
+                        header.append(line)
+                elif line and family is not None:
+                    families[family][1].append(_with_label(line, "worker", str(worker.index)))
+
+        lines = []
+        for header, samples in families.values():
+            lines += header + samples
+        lines.append("# TYPE roborock_supervisor_worker_up gauge")
+        lines += [
+            f'roborock_supervisor_worker_up{{worker="{w.index}"}} {int(w.ready.is_set())}'
+            for w in self.workers
+        ]
+        lines.append("# TYPE roborock_supervisor_worker_restarts_total counter")
+        lines += [
+            f'roborock_supervisor_worker_restarts_total{{worker="{w.index}"}} {w.restarts}'
+            for w in self.workers
+        ]
+        return "\n".join(lines) + "\n"
+
+    async def shutdown(self):
+        self.stopping = True
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(
+            *(w.request("POST", "/shutdown") for w in self.workers if w.ready.is_set()),
+            return_exceptions=True,
+        )
+        await asyncio.gather(*(w.stop() for w in self.workers))
+        shutil.rmtree(self.socket_dir, ignore_errors=True)
+
+
+def _with_label(sample: str, name: str, value: str) -> str:
+    """Add a label to one Prometheus sample line."""
+    metric, brace, rest = sample.partition("{")
+    if brace:
+        return f'{metric}{{{name}="{value}",{rest}'
+    metric, _, rest = sample.partition(" ")
+    return f'{metric}{{{name}="{value}"}} {rest}'
+
+
+def create_app(supervisor: Supervisor) -> web.Application:
+    """Create the aiohttp application exposing the daemon API."""
+
+    async def read_json(request: web.Request) -> Any:
+        try:
+            return await request.json()
+        except json.JSONDecodeError:
+            raise web.HTTPBadRequest(
+                text=json.dumps({"success": False, "error": "Invalid JSON"}),
+                content_type="application/json",
+            )
+
+    def forward_headers(request: web.Request) -> dict[str, str]:
+        deadline = request.headers.get("X-Deadline-Ms")
+        return {"X-Deadline-Ms": deadline} if deadline is not None else {}
+
+    async def handle_init(request: web.Request) -> web.Response:
+        data = await read_json(request)
+        if not isinstance(data, dict) or not isinstance(data.get("rriot"), dict) or not data["rriot"]:
+            return web.json_response(
+                {"success": False, "error": "Missing user_id or rriot"}, status=HTTPStatus.BAD_REQUEST
+            )
+        status, body = await supervisor.init(data)
+        return web.json_response(body, status=status)
+
+    async def handle_command(request: web.Request) -> web.Response:
+        data = await read_json(request)
+        if not isinstance(data, dict) or not data.get("user_id"):
+            return web.json_response(
+                {"success": False, "error": "Missing required fields"}, status=HTTPStatus.BAD_REQUEST
+            )
+        worker = supervisor.worker_for(data["user_id"])
+        status, body = await worker.request("POST", "/command", data, forward_headers(request))
+        return web.json_response(body, status=status)
+
+    async def handle_commands(request: web.Request) -> web.Response:
+        data = await read_json(request)
+        items = data.get("commands") if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return web.json_response(
+                {"success": False, "error": "Expected a list of commands"}, status=HTTPStatus.BAD_REQUEST
+            )
+        if len(items) > MAX_BATCH_SIZE:
+            return web.json_response(
+                {"success": False, "error": f"Too many commands (max {MAX_BATCH_SIZE})"},
+                status=HTTPStatus.BAD_REQUEST,
+            )
+        if isinstance(data, dict) and "X-Deadline-Ms" in request.headers:
+            data.setdefault("deadline_ms", request.headers["X-Deadline-Ms"])
+        status, body = await supervisor.batch(data, items)
+        return web.json_response(body, status=status)
+
+    async def handle_disconnect(request: web.Request) -> web.Response:
+        data = await read_json(request)
+        if not isinstance(data, dict) or not data.get("user_id"):
+            return web.json_response(
+                {"success": False, "error": "Missing user_id"}, status=HTTPStatus.BAD_REQUEST
+            )
+        status, body = await supervisor.disconnect(data)
+        return web.json_response(body, status=status)
+
+    async def handle_events(request: web.Request) -> web.StreamResponse:
+        user_id = request.query.get("user_id")
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+        })
+        await response.prepare(request)
+
+        queue = supervisor.events.subscribe(user_id)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    await response.write(b": keepalive\n\n")
+                    continue
+                if event is None:
+                    await response.write_eof()
+                    break
+                await response.write(f"data: {json.dumps(event)}\n\n".encode())
+        except ConnectionResetError:
+            pass
+        finally:
+            supervisor.events.unsubscribe(queue)
+        return response
+
+    async def close_event_streams(app: web.Application):
+        """End open /events streams so shutdown does not wait on their clients."""
+        supervisor.events.close()
+
+    async def handle_health(request: web.Request) -> web.Response:
+        return web.json_response(await supervisor.health())
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(
+            body=(await supervisor.metrics()).encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    async def handle_shutdown(request: web.Request) -> web.Response:
+        await supervisor.shutdown()
+        asyncio.get_event_loop().call_soon(lambda: sys.exit(0))
+        return web.json_response({"success": True})
+
+    app = web.Application()
+    app.router.add_post("/init", handle_init)
+    app.router.add_post("/command", handle_command)
+    app.router.add_post("/commands", handle_commands)
+    app.router.add_get("/events", handle_events)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_post("/shutdown", handle_shutdown)
+    app.router.add_post("/disconnect", handle_disconnect)
+    app.on_shutdown.append(close_event_streams)
+    return app
+
+
+# (st_dev, st_ino) of the Unix socket the supervisor bound
+bound_socket: tuple[int, int] | None = None
+
+
+async def run_supervisor(workers: int, worker_args: list[str], port: int, unix_socket: str | None):
+    """Start the workers, then serve the API until a shutdown signal."""
+    supervisor = Supervisor(workers, worker_args)
+    try:
+        await supervisor.start()
+    except RuntimeError:
+        await supervisor.shutdown()
+        raise
+
+    runner = web.AppRunner(create_app(supervisor))
+    await runner.setup()
+    if unix_socket:
+        global bound_socket
+        site = web.UnixSite(runner, unix_socket)
+        await site.start()
+        bound_socket = socket_identity(unix_socket)
+        os.chmod(unix_socket, 0o600)
+        log.info(f"Roborock supervisor ({workers} workers) listening on unix:{unix_socket}")
+    else:
+        site = web.TCPSite(runner, "127.0.0.1", port)
+        await site.start()
+        log.info(f"Roborock supervisor ({workers} workers) listening on http://127.0.0.1:{port}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_event_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    await supervisor.shutdown()
+    await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Roborock daemon supervisor",
+        epilog="Unrecognized arguments are passed through to every worker.",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes to run")
+    parser.add_argument("--port", type=int, default=9876, help="Port to listen on")
+    parser.add_argument(
+        "--unix-socket", metavar="PATH",
+        help="Listen on this Unix domain socket instead of TCP",
+    )
+    args, worker_args = parser.parse_known_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    try:
+        asyncio.run(run_supervisor(args.workers, worker_args, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        log.info("Interrupted")
+    finally:
+        if args.unix_socket:
+            remove_socket(args.unix_socket, bound_socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""Shared fixtures for the daemon tests, run against roborock_sim devices."""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from roborock_daemon import RoborockDaemon  # noqa: E402
+from roborock_sim import SIM_RRIOT, build_broker  # noqa: E402
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine on a fresh event loop."""
+    return asyncio.run
+
+
+async def start_daemon(devices: int = 2, latency: float = 0.01, **kwargs):
+    """A daemon with user "u" connected to a broker of simulated devices."""
+    broker = build_broker(devices, latency, 0.0, seed=1)
+    daemon = RoborockDaemon(session_factory=broker.session, **{"status_ttl": 0, **kwargs})
+    result = await daemon.initialize("u", SIM_RRIOT)
+    assert result["success"], result
+    return daemon, broker
@@ -0,0 +1,252 @@
+"""RoborockDaemon command path against simulated devices."""
+
+import asyncio
+from http import HTTPStatus
+
+import roborock_daemon
+from conftest import start_daemon
+from roborock_daemon import AdaptiveTimeouts, SessionState
+from roborock_sim import SIM_LOCAL_KEY, SIM_RRIOT, STATE_CHARGING, STATE_CLEANING
+
+
+def test_identical_concurrent_reads_share_one_rpc(run):
+    async def scenario():
+        daemon, broker = await start_daemon()
+        device = broker.devices["sim-0"]
+        device.latency = 0.1
+        results = await asyncio.gather(*(
+            daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "get_consumable", timeout=1.0)
+            for _ in range(5)
+        ))
+        assert all(result["success"] for result in results), results
+        assert device.stats["requests"] == 1
+
+        # Different params are a different read
+        await asyncio.gather(
+            daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "get_consumable", [1], timeout=1.0),
+            daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "get_consumable", [2], timeout=1.0),
+        )
+        assert device.stats["requests"] == 3
+        await daemon.shutdown()
+
+    run(scenario())
+
+
+def test_lost_read_reply_does_not_capture_later_reads(run):
+    async def scenario():
+        daemon, broker = await start_daemon()
+        device = broker.devices["sim-0"]
+        device.drop_rate = 1.0
+        lost = await daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "get_status", timeout=0.3)
+        assert lost["error"] == "Command timeout"
+
+        # Each later read publishes its own RPC instead of joining the lost one
+        device.drop_rate = 0.0
+        for _ in range(3):
+            result = await daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "get_status", timeout=0.3)
+            assert result["success"], result
+        assert device.stats["requests"] == 4
+        await daemon.shutdown()
+
+    run(scenario())
+
+
+def test_joiner_with_longer_deadline_outlives_first_caller(run):
+    async def scenario():
+        daemon, broker = await start_daemon()
+        device = broker.devices["sim-0"]
+        device.latency = 0.4
+        first = asyncio.ensure_future(
+            daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "get_consumable", timeout=0.2)
+        )
+        await asyncio.sleep(0.05)
+        second = await daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "get_consumable", timeout=2.0)
+        assert (await first)["error"] == "Command timeout"
+        assert second["success"], second
+        await daemon.shutdown()
+
+    run(scenario())
+
+
+def test_learned_timeout_recovers_after_timeouts():
+    timeouts = AdaptiveTimeouts()
+    for _ in range(50):
+        timeouts.observe("get_status", 0.05)
+    assert timeouts.timeout_for("get_status") == timeouts.min_timeout
+
+    waited = timeouts.min_timeout
+    for _ in range(4):
+        timeouts.observe_timeout("get_status", waited)
+        waited = timeouts.timeout_for("get_status")
+    assert timeouts.timeout_for("get_status") == timeouts.max_timeout
+
+    for _ in range(50):
+        timeouts.observe("get_status", 0.05)
+    assert timeouts.timeout_for("get_status") == timeouts.min_timeout
+
+
+def test_read_in_flight_during_a_command_is_not_cached(run):
+    async def scenario():
+        daemon, broker = await start_daemon(status_ttl=60)
+        broker.devices["sim-0"].latency = 0.2
+        before = asyncio.ensure_future(daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "get_status"))
+        await asyncio.sleep(0.05)
+        started = await daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "app_start")
+        assert started["success"], started
+        assert (await before)["result"][0]["state"] == STATE_CHARGING
+
+        after = await daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "get_status")
+        assert not after.get("cached"), after
+        assert after["result"][0]["state"] == STATE_CLEANING
+        await daemon.shutdown()
+
+    run(scenario())
+
+
+def test_dropped_session_is_left_to_reconnect_itself(run):
+    async def scenario():
+        daemon, broker = await start_daemon(reconnect_wait=0.1)
+        session = daemon.sessions["u"]
+        broker.set_online(False)
+        assert daemon.session_states["u"] == SessionState.BACKING_OFF
+        dropped = await daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "get_status", timeout=1.0)
+        assert dropped["error"] == "Session reconnecting"
+        assert not daemon._reconnects
+
+        broker.set_online(True)
+        assert daemon.sessions["u"] is session
+        assert daemon.session_states["u"] == SessionState.READY
+        result = await daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "get_status", timeout=1.0)
+        assert result["success"], result
+        await daemon.shutdown()
+
+    run(scenario())
+
+
+def test_rejected_login_fails_commands_until_reinit(run):
+    async def scenario():
+        daemon, broker = await start_daemon()
+        session = daemon.sessions["u"]
+        broker.set_online(False)
+        session.params.unauthorized_hook()
+        assert daemon.session_states["u"] == SessionState.UNAUTHORIZED
+        rejected = await daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "get_status", timeout=5.0)
+        assert rejected["error"].startswith("Session unauthorized"), rejected
+        assert not daemon._reconnects
+
+        # The rejected session stays down; /init replaces it
+        broker.online = True
+        result = await daemon.initialize("u", SIM_RRIOT)
+        assert result["success"], result
+        assert daemon.sessions["u"] is not session
+        assert daemon.session_states["u"] == SessionState.READY
+        await daemon.shutdown()
+
+    run(scenario())
+
+
+def test_breaker_opens_after_timeouts_and_probe_closes_it(run):
+    async def scenario():
+        daemon, broker = await start_daemon(offline_after=2, probe_interval=0.1)
+        device = broker.devices["sim-0"]
+        device.drop_rate = 1.0
+        for _ in range(2):
+            lost = await daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "app_start", timeout=0.1)
+            assert lost["error"] == "Command timeout"
+        assert daemon.breaker.open_keys() == ["u:sim-0"]
+
+        requests = device.stats["requests"]
+        offline = await daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "app_start", timeout=1.0)
+        assert offline["error"] == "Device offline"
+        assert device.stats["requests"] == requests
+
+        # The background probe finds the device answering again
+        device.drop_rate = 0.0
+        await asyncio.sleep(0.3)
+        assert daemon.breaker.open_keys() == []
+        result = await daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "app_start", timeout=1.0)
+        assert result["success"], result
+        await daemon.shutdown()
+
+    run(scenario())
+
+
+def test_pending_table_rejects_past_capacity(run):
+    async def scenario():
+        daemon, broker = await start_daemon(max_pending=2)
+        for device in broker.devices.values():
+            device.latency = 0.2
+        results = await asyncio.gather(
+            daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "app_start", timeout=1.0),
+            daemon.send_command("u", "sim-1", SIM_LOCAL_KEY, "app_start", timeout=1.0),
+            daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "app_pause", timeout=1.0),
+        )
+        assert [result.get("error") for result in results] == [None, None, "Too many pending requests"]
+        assert daemon.pending_responses.stats["rejected"] == 1
+        await daemon.shutdown()
+
+    run(scenario())
+
+
+def test_reaper_expires_lost_replies_and_stops(run):
+    async def scenario():
+        daemon, broker = await start_daemon()
+        broker.devices["sim-0"].drop_rate = 1.0
+        pending = daemon.pending_responses
+        results = await asyncio.gather(*(
+            daemon.send_command("u", "sim-0", SIM_LOCAL_KEY, "app_start", timeout=0.1)
+            for _ in range(3)
+        ))
+        assert all(result["error"] == "Command timeout" for result in results)
+        assert pending.stats["expired"] == 3
+        assert len(pending) == 0
+        await asyncio.sleep(2 * pending.tick)
+        assert pending._reaper.done()
+        await daemon.shutdown()
+
+    run(scenario())
+
+
+def test_full_reconnect_keeps_known_devices(run):
+    async def scenario():
+        daemon, broker = await start_daemon()
+        await daemon.initialize("u", SIM_RRIOT, {"sim-0": SIM_LOCAL_KEY})
+        session = daemon.sessions["u"]
+        broker.set_online(False)
+        broker.online = True
+        result = await daemon.initialize("u", SIM_RRIOT)
+        assert result["success"] and not result.get("reused"), result
+        assert daemon.sessions["u"] is not session
+        assert set(daemon.contexts["u"].devices) == {"sim-0"}
+        await daemon.shutdown()
+
+    run(scenario())
+
+
+def test_init_rejects_malformed_devices(run):
+    async def scenario():
+        for devices in (["sim-0"], {"sim-0": {"local_key": SIM_LOCAL_KEY}}, {"sim-0": ""}):
+            status, body = await roborock_daemon.op_init({"user_id": "u", "rriot": SIM_RRIOT, "devices": devices})
+            assert status == HTTPStatus.BAD_REQUEST
+            assert body["error"] == "Invalid devices"
+
+    run(scenario())
+
+
+def test_batch_items_take_their_own_deadline_ms(run):
+    async def scenario():
+        daemon, broker = await start_daemon()
+        broker.devices["sim-1"].latency = 0.3
+        results = await daemon.send_batch([
+            {"user_id": "u", "device_id": "sim-0", "local_key": SIM_LOCAL_KEY, "command": "app_start"},
+            {"user_id": "u", "device_id": "sim-1", "local_key": SIM_LOCAL_KEY, "command": "app_start",
+             "deadline_ms": 100},
+            {"user_id": "u", "device_id": "sim-0", "local_key": SIM_LOCAL_KEY, "command": "app_pause",
+             "deadline_ms": "soon"},
+        ], timeout=2.0)
+        assert results[0]["success"], results
+        assert results[1]["error"] == "Command timeout"
+        assert results[2]["error"] == "Invalid deadline_ms"
+        await daemon.shutdown()
+
+    run(scenario())
@@ -0,0 +1,143 @@
+import { PassThrough } from "node:stream";
+import { describe, expect, it } from "vitest";
+import { DaemonStdioChannel } from "../lib/daemon-channel.js";
+import { decode, encode } from "../lib/msgpack.js";
+
+interface RequestFrame {
+	id: number;
+	op: string;
+	body: unknown;
+}
+
+function frame(value: unknown): Buffer {
+	return rawFrame(encode(value));
+}
+
+function rawFrame(payload: Uint8Array): Buffer {
+	const header = Buffer.alloc(4);
+	header.writeUInt32BE(payload.length, 0);
+	return Buffer.concat([header, payload]);
+}
+
+// Decode every request frame the channel has written so far
+function readRequests(input: PassThrough): RequestFrame[] {
+	const requests: RequestFrame[] = [];
+	let data: Buffer = input.read() ?? Buffer.alloc(0);
+	while (data.length >= 4) {
+		const length = data.readUInt32BE(0);
+		requests.push(decode(data.subarray(4, 4 + length)) as RequestFrame);
+		data = data.subarray(4 + length);
+	}
+	return requests;
+}
+
+const flush = () => new Promise((resolve) => setImmediate(resolve));
+
+function setup() {
+	const input = new PassThrough();
+	const output = new PassThrough();
+	const channel = new DaemonStdioChannel(input, output);
+	return { input, output, channel };
+}
+
+describe("DaemonStdioChannel", () => {
+	it("matches out-of-order responses to requests by id", async () => {
+		const { input, output, channel } = setup();
+		const first = channel.request("health", undefined, 1000);
+		const second = channel.request("command", { command: "get_status" }, 1000);
+		const [a, b] = readRequests(input);
+		expect(a.op).toBe("health");
+		expect(b).toMatchObject({ op: "command", body: { command: "get_status" } });
+
+		output.write(frame({ id: b.id, status: 200, body: { success: true } }));
+		output.write(frame({ id: a.id, status: 200, body: { status: "ok" } }));
+
+		await expect(first).resolves.toEqual({ status: "ok" });
+		await expect(second).resolves.toEqual({ success: true });
+		channel.close();
+	});
+
+	it("reassembles a frame split across chunks", async () => {
+		const { input, output, channel } = setup();
+		const response = channel.request("health", undefined, 1000);
+		const [request] = readRequests(input);
+
+		const data = frame({ id: request.id, status: 200, body: { status: "ok" } });
+		for (const chunk of [
+			data.subarray(0, 2),
+			data.subarray(2, 7),
+			data.subarray(7),
+		]) {
+			output.write(chunk);
+			await flush();
+		}
+
+		await expect(response).resolves.toEqual({ status: "ok" });
+		channel.close();
+	});
+
+	it("dispatches several frames arriving in one chunk", async () => {
+		const { input, output, channel } = setup();
+		const events: unknown[] = [];
+		channel.on("event", (event) => events.push(event));
+		const response = channel.request("health", undefined, 1000);
+		const [request] = readRequests(input);
+
+		output.write(
+			Buffer.concat([
+				frame({ id: 0, op: "event", body: { device_id: "d1", state: 5 } }),
+				frame({ id: request.id, status: 200, body: { status: "ok" } }),
+				frame({ id: 0, op: "event", body: { device_id: "d2", state: 8 } }),
+			]),
+		);
+
+		await expect(response).resolves.toEqual({ status: "ok" });
+		expect(events).toEqual([
+			{ device_id: "d1", state: 5 },
+			{ device_id: "d2", state: 8 },
+		]);
+		channel.close();
+	});
+
+	it("skips a malformed frame and stays open", async () => {
+		const { input, output, channel } = setup();
+		const errors: unknown[] = [];
+		channel.on("frameError", (err) => errors.push(err));
+		const response = channel.request("health", undefined, 1000);
+		const [request] = readRequests(input);
+
+		output.write(
+			Buffer.concat([
+				rawFrame(new Uint8Array([0x01, 0x02])),
+				frame({ id: request.id, status: 200, body: { status: "ok" } }),
+			]),
+		);
+
+		await expect(response).resolves.toEqual({ status: "ok" });
+		expect(errors).toHaveLength(1);
+		expect(channel.isOpen).toBe(true);
+		channel.close();
+	});
+
+	it("ignores responses for unknown ids", async () => {
+		const { input, output, channel } = setup();
+		const response = channel.request("health", undefined, 1000);
+		const [request] = readRequests(input);
+
+		output.write(frame({ id: request.id + 100, status: 200, body: "stray" }));
+		output.write(frame({ id: request.id, status: 200, body: "mine" }));
+
+		await expect(response).resolves.toBe("mine");
+		channel.close();
+	});
+
+	it("rejects pending requests when the output closes", async () => {
+		const { output, channel } = setup();
+		const response = channel.request("health", undefined, 1000);
+
+		output.destroy();
+
+		await expect(response).rejects.toThrow("Daemon channel closed");
+		expect(channel.isOpen).toBe(false);
+	});
+});
@@ -0,0 +1,70 @@
+import { describe, expect, it } from "vitest";
+import { decode, encode } from "../lib/msgpack.js";
+
+describe("msgpack", () => {
+	describe("encode/decode", () => {
+		it("round-trips scalars", () => {
+			for (const value of [null, true, false, 0, 1.5, -0.25, "", "text"]) {
+				expect(decode(encode(value))).toEqual(value);
+			}
+		});
+
+		it("round-trips integers at every width boundary", () => {
+			const values = [
+				127, 128, 255, 256, 65535, 65536, 2 ** 32 - 1, 2 ** 32,
+				Number.MAX_SAFE_INTEGER, -1, -32, -33, -128, -129, -32768, -32769,
+				-(2 ** 31), -(2 ** 31) - 1,
+			];
+			for (const value of values) {
+				expect(decode(encode(value))).toBe(value);
+			}
+		});
+
+		it("round-trips long and unicode strings", () => {
+			for (const value of ["x".repeat(32), "x".repeat(300), "x".repeat(70000)]) {
+				expect(decode(encode(value))).toBe(value);
+			}
+			expect(decode(encode("Hello 世界 🌍"))).toBe("Hello 世界 🌍");
+		});
+
+		it("round-trips nested arrays and objects", () => {
+			const value = {
+				id: 42,
+				op: "command",
+				body: { params: [{ segments: [1, 2] }], nested: [[], {}] },
+				wide: Array.from({ length: 20 }, (_, i) => i),
+			};
+
+			expect(decode(encode(value))).toEqual(value);
+		});
+
+		it("round-trips binary data", () => {
+			const bytes = new Uint8Array([0, 1, 254, 255]);
+
+			expect(decode(encode(bytes))).toEqual(bytes);
+		});
+
+		it("skips undefined object values", () => {
+			expect(decode(encode({ a: undefined, b: 1 }))).toEqual({ b: 1 });
+		});
+
+		it("uses the compact fixint/fixstr forms", () => {
+			expect(Array.from(encode(5))).toEqual([0x05]);
+			expect(Array.from(encode(-1))).toEqual([0xff]);
+			expect(Array.from(encode("a"))).toEqual([0xa1, 0x61]);
+			expect(Array.from(encode({ a: 1 }))).toEqual([0x81, 0xa1, 0x61, 0x01]);
+		});
+	});
+
+	describe("decode", () => {
+		it("throws on truncated input", () => {
+			const encoded = encode("truncated string");
+
+			expect(() => decode(encoded.subarray(0, 5))).toThrow();
+		});
+
+		it("throws on trailing bytes", () => {
+			expect(() => decode(new Uint8Array([0x01, 0x02]))).toThrow();
+		});
+	});
+});
@@ -23,6 +23,9 @@ const envSchema = z.object({
 
 	// Optional
 	CORS_ORIGIN: z.string().optional(),
+	ROBOROCK_DAEMON_SOCKET: z.string().optional(), // Unix socket for the Python daemon
+	ROBOROCK_DAEMON_TRANSPORT: z.enum(["http", "stdio"]).default("http"),
+	ROBOROCK_DAEMON_WORKERS: z.coerce.number().int().min(1).default(1), // >1 runs the sharded supervisor
 });
 
 export type Config = z.infer<typeof envSchema>;
@@ -0,0 +1,134 @@
+import { EventEmitter, once } from "node:events";
+import type { Readable, Writable } from "node:stream";
+import { decode, encode } from "./msgpack.js";
+
+// Frames are a 4-byte big-endian length followed by a msgpack body
+const HEADER_SIZE = 4;
+const MAX_FRAME_SIZE = 16 * 1024 * 1024;
+const MAX_REQUEST_ID = 0x7fffffff;
+
+interface DaemonFrame {
+	id: number;
+	op?: string;
+	status?: number;
+	body?: unknown;
+}
+
+interface PendingRequest {
+	resolve: (body: unknown) => void;
+	reject: (err: Error) => void;
+	timer: ReturnType<typeof setTimeout>;
+}
+
+/**
+ * Multiplexed request/response channel to the Python daemon over its
+ * stdin/stdout (`roborock_daemon.py --stdio`).
+ *
+ * Requests carry a correlation id and may complete out of order. Frames with
+ * `op: "event"` are unsolicited device pushes and are emitted as "event".
+ * When the daemon's stdin pipe is full, writes wait for "drain".
+ */
+export class DaemonStdioChannel extends EventEmitter {
+	private nextId = 1;
+	private pending = new Map<number, PendingRequest>();
+	private buffer = Buffer.alloc(0);
+	private drained: Promise<void> | null = null;
+	private closed = false;
+	private readonly closing = new AbortController();
+
+	constructor(
+		private readonly input: Writable,
+		output: Readable,
+	) {
+		super();
+		output.on("data", (chunk: Buffer) => this.onData(chunk));
+		output.on("close", () => this.close(new Error("Daemon channel closed")));
+		input.on("error", (err) => this.close(err));
+	}
+
+	get isOpen(): boolean {
+		return !this.closed;
+	}
+
+	/**
+	 * Send a request and resolve with the daemon's response body.
+	 */
+	async request<T>(op: string, body: unknown, timeoutMs: number): Promise<T> {
+		if (this.drained) await this.drained;
+		if (this.closed) throw new Error("Daemon channel closed");
+
+		const id = this.nextId;
+		this.nextId = id >= MAX_REQUEST_ID ? 1 : id + 1;
+		const payload = encode({ id, op, body });
+		const frame = Buffer.allocUnsafe(HEADER_SIZE + payload.length);
+		frame.writeUInt32BE(payload.length, 0);
+		frame.set(payload, HEADER_SIZE);
+
+		const result = new Promise<unknown>((resolve, reject) => {
+			const timer = setTimeout(() => {
+				this.pending.delete(id);
+				reject(new Error(`Daemon ${op} timed out after ${timeoutMs}ms`));
+			}, timeoutMs);
+			this.pending.set(id, { resolve, reject, timer });
+		});
+
+		if (!this.input.write(frame) && !this.drained) {
+			const clear = () => {
+				this.drained = null;
+			};
+			this.drained = once(this.input, "drain", {
+				signal: this.closing.signal,
+			}).then(clear, clear);
+		}
+		return (await result) as T;
+	}
+
+	/**
+	 * Reject all in-flight requests and stop accepting new ones.
+	 */
+	close(err: Error = new Error("Daemon channel closed")): void {
+		if (this.closed) return;
+		this.closed = true;
+		this.closing.abort();
+		for (const request of this.pending.values()) {
+			clearTimeout(request.timer);
+			request.reject(err);
+		}
+		this.pending.clear();
+		this.emit("close", err);
+	}
+
+	private onData(chunk: Buffer): void {
+		this.buffer =
+			this.buffer.length > 0 ? Buffer.concat([this.buffer, chunk]) : chunk;
+
+		while (this.buffer.length >= HEADER_SIZE) {
+			const length = this.buffer.readUInt32BE(0);
+			if (length > MAX_FRAME_SIZE) {
+				this.close(new Error(`Daemon frame too large (${length} bytes)`));
+				return;
+			}
+			if (this.buffer.length < HEADER_SIZE + length) return;
+
+			const payload = this.buffer.subarray(HEADER_SIZE, HEADER_SIZE + length);
+			this.buffer = this.buffer.subarray(HEADER_SIZE + length);
+			try {
+				this.dispatch(decode(payload) as DaemonFrame);
+			} catch (err) {
+				this.emit("frameError", err);
+			}
+		}
+	}
+
+	private dispatch(frame: DaemonFrame): void {
+		if (frame.op === "event") {
+			this.emit("event", frame.body);
+			return;
+		}
+		const request = this.pending.get(frame.id);
+		if (!request) return; // timed out already
+		this.pending.delete(frame.id);
+		clearTimeout(request.timer);
+		request.resolve(frame.body);
+	}
+}
@@ -0,0 +1,333 @@
+/**
+ * Minimal MessagePack codec for the framed stdio channel to the Python daemon.
+ *
+ * Supports the JSON data model plus binary: nil, booleans, integers, floats,
+ * strings, Uint8Array, arrays and plain objects. Undefined object values are
+ * skipped like JSON.stringify does.
+ */
+
+const textEncoder = new TextEncoder();
+const textDecoder = new TextDecoder();
+
+class Writer {
+	private buf = new Uint8Array(256);
+	private view = new DataView(this.buf.buffer);
+	private pos = 0;
+
+	private ensure(size: number): void {
+		if (this.pos + size <= this.buf.length) return;
+		let length = this.buf.length * 2;
+		while (length < this.pos + size) length *= 2;
+		const next = new Uint8Array(length);
+		next.set(this.buf.subarray(0, this.pos));
+		this.buf = next;
+		this.view = new DataView(next.buffer);
+	}
+
+	u8(value: number): void {
+		this.ensure(1);
+		this.view.setUint8(this.pos, value);
+		this.pos += 1;
+	}
+
+	u16(value: number): void {
+		this.ensure(2);
+		this.view.setUint16(this.pos, value);
+		this.pos += 2;
+	}
+
+	u32(value: number): void {
+		this.ensure(4);
+		this.view.setUint32(this.pos, value);
+		this.pos += 4;
+	}
+
+	i8(value: number): void {
+		this.ensure(1);
+		this.view.setInt8(this.pos, value);
+		this.pos += 1;
+	}
+
+	i16(value: number): void {
+		this.ensure(2);
+		this.view.setInt16(this.pos, value);
+		this.pos += 2;
+	}
+
+	i32(value: number): void {
+		this.ensure(4);
+		this.view.setInt32(this.pos, value);
+		this.pos += 4;
+	}
+
+	f64(value: number): void {
+		this.ensure(8);
+		this.view.setFloat64(this.pos, value);
+		this.pos += 8;
+	}
+
+	bytes(value: Uint8Array): void {
+		this.ensure(value.length);
+		this.buf.set(value, this.pos);
+		this.pos += value.length;
+	}
+
+	result(): Uint8Array {
+		return this.buf.slice(0, this.pos);
+	}
+}
+
+function writeLength(
+	w: Writer,
+	length: number,
+	fix: number,
+	fixMax: number,
+	t8: number | null,
+	t16: number,
+	t32: number,
+): void {
+	if (length <= fixMax) {
+		w.u8(fix | length);
+	} else if (t8 !== null && length <= 0xff) {
+		w.u8(t8);
+		w.u8(length);
+	} else if (length <= 0xffff) {
+		w.u8(t16);
+		w.u16(length);
+	} else {
+		w.u8(t32);
+		w.u32(length);
+	}
+}
+
+function writeNumber(w: Writer, value: number): void {
+	if (!Number.isInteger(value) || !Number.isSafeInteger(value)) {
+		w.u8(0xcb);
+		w.f64(value);
+	} else if (value >= 0) {
+		if (value < 0x80) {
+			w.u8(value);
+		} else if (value <= 0xff) {
+			w.u8(0xcc);
+			w.u8(value);
+		} else if (value <= 0xffff) {
+			w.u8(0xcd);
+			w.u16(value);
+		} else if (value <= 0xffffffff) {
+			w.u8(0xce);
+			w.u32(value);
+		} else {
+			// uint64 as two 32-bit halves
+			w.u8(0xcf);
+			w.u32(Math.floor(value / 0x100000000));
+			w.u32(value >>> 0);
+		}
+	} else if (value >= -32) {
+		w.i8(value);
+	} else if (value >= -0x80) {
+		w.u8(0xd0);
+		w.i8(value);
+	} else if (value >= -0x8000) {
+		w.u8(0xd1);
+		w.i16(value);
+	} else if (value >= -0x80000000) {
+		w.u8(0xd2);
+		w.i32(value);
+	} else {
+		w.u8(0xcb);
+		w.f64(value);
+	}
+}
+
+function writeValue(w: Writer, value: unknown): void {
+	if (value === null || value === undefined) {
+		w.u8(0xc0);
+	} else if (value === false) {
+		w.u8(0xc2);
+	} else if (value === true) {
+		w.u8(0xc3);
+	} else if (typeof value === "number") {
+		writeNumber(w, value);
+	} else if (typeof value === "string") {
+		const bytes = textEncoder.encode(value);
+		writeLength(w, bytes.length, 0xa0, 31, 0xd9, 0xda, 0xdb);
+		w.bytes(bytes);
+	} else if (value instanceof Uint8Array) {
+		writeLength(w, value.length, 0xc4, -1, 0xc4, 0xc5, 0xc6);
+		w.bytes(value);
+	} else if (Array.isArray(value)) {
+		writeLength(w, value.length, 0x90, 15, null, 0xdc, 0xdd);
+		for (const item of value) writeValue(w, item);
+	} else if (typeof value === "object") {
+		const entries = Object.entries(value).filter(([, v]) => v !== undefined);
+		writeLength(w, entries.length, 0x80, 15, null, 0xde, 0xdf);
+		for (const [key, item] of entries) {
+			writeValue(w, key);
+			writeValue(w, item);
+		}
+	} else {
+		throw new TypeError(`Cannot encode ${typeof value} as MessagePack`);
+	}
+}
+
+export function encode(value: unknown): Uint8Array {
+	const w = new Writer();
+	writeValue(w, value);
+	return w.result();
+}
+
+class Reader {
+	private readonly view: DataView;
+	pos = 0;
+
+	constructor(private readonly buf: Uint8Array) {
+		this.view = new DataView(buf.buffer, buf.byteOffset, buf.byteLength);
+	}
+
+	private advance(size: number): number {
+		const start = this.pos;
+		if (start + size > this.buf.length) {
+			throw new RangeError("Unexpected end of MessagePack data");
+		}
+		this.pos += size;
+		return start;
+	}
+
+	u8(): number {
+		return this.view.getUint8(this.advance(1));
+	}
+
+	u16(): number {
+		return this.view.getUint16(this.advance(2));
+	}
+
+	u32(): number {
+		return this.view.getUint32(this.advance(4));
+	}
+
+	i8(): number {
+		return this.view.getInt8(this.advance(1));
+	}
+
+	i16(): number {
+		return this.view.getInt16(this.advance(2));
+	}
+
+	i32(): number {
+		return this.view.getInt32(this.advance(4));
+	}
+
+	f32(): number {
+		return this.view.getFloat32(this.advance(4));
+	}
+
+	f64(): number {
+		return this.view.getFloat64(this.advance(8));
+	}
+
+	u64(): number {
+		const high = this.u32();
+		return high * 0x100000000 + this.u32();
+	}
+
+	i64(): number {
+		const high = this.i32();
+		return high * 0x100000000 + this.u32();
+	}
+
+	bytes(length: number): Uint8Array {
+		const start = this.advance(length);
+		return this.buf.slice(start, start + length);
+	}
+
+	str(length: number): string {
+		const start = this.advance(length);
+		return textDecoder.decode(this.buf.subarray(start, start + length));
+	}
+}
+
+function readArray(r: Reader, length: number): unknown[] {
+	const result = new Array(length);
+	for (let i = 0; i < length; i++) result[i] = readValue(r);
+	return result;
+}
+
+function readMap(r: Reader, length: number): Record<string, unknown> {
+	const result: Record<string, unknown> = {};
+	for (let i = 0; i < length; i++) {
+		const key = readValue(r);
+		result[String(key)] = readValue(r);
+	}
+	return result;
+}
+
+function readValue(r: Reader): unknown {
+	const type = r.u8();
+	if (type < 0x80) return type;
+	if (type < 0x90) return readMap(r, type & 0x0f);
+	if (type < 0xa0) return readArray(r, type & 0x0f);
+	if (type < 0xc0) return r.str(type & 0x1f);
+	if (type >= 0xe0) return type - 0x100;
+
+	switch (type) {
+		case 0xc0:
+			return null;
+		case 0xc2:
+			return false;
+		case 0xc3:
+			return true;
+		case 0xc4:
+			return r.bytes(r.u8());
+		case 0xc5:
+			return r.bytes(r.u16());
+		case 0xc6:
+			return r.bytes(r.u32());
+		case 0xca:
+			return r.f32();
+		case 0xcb:
+			return r.f64();
+		case 0xcc:
+			return r.u8();
+		case 0xcd:
+			return r.u16();
+		case 0xce:
+			return r.u32();
+		case 0xcf:
+			return r.u64();
+		case 0xd0:
+			return r.i8();
+		case 0xd1:
+			return r.i16();
+		case 0xd2:
+			return r.i32();
+		case 0xd3:
+			return r.i64();
+		case 0xd9:
+			return r.str(r.u8());
+		case 0xda:
+			return r.str(r.u16());
+		case 0xdb:
+			return r.str(r.u32());
+		case 0xdc:
+			return readArray(r, r.u16());
+		case 0xdd:
+			return readArray(r, r.u32());
+		case 0xde:
+			return readMap(r, r.u16());
+		case 0xdf:
+			return readMap(r, r.u32());
+		default:
+			throw new TypeError(
+				`Unsupported MessagePack type 0x${type.toString(16)}`,
+			);
+	}
+}
+
+export function decode(data: Uint8Array): unknown {
+	const r = new Reader(data);
+	const value = readValue(r);
+	if (r.pos !== data.length) {
+		throw new RangeError("Trailing bytes after MessagePack value");
+	}
+	return value;
+}
@@ -12,6 +12,37 @@ const __dirname = dirname(__filename);
 // Python daemon configuration
 const DAEMON_PORT = 9876;
 const DAEMON_URL = `http://127.0.0.1:${DAEMON_PORT}`;
+const DAEMON_SOCKET = config.ROBOROCK_DAEMON_SOCKET;
+const DAEMON_TRANSPORT = config.ROBOROCK_DAEMON_TRANSPORT;
+// Over HTTP, more than one worker runs the sharded supervisor instead
+const DAEMON_WORKERS =
+	DAEMON_TRANSPORT === "http" ? config.ROBOROCK_DAEMON_WORKERS : 1;
+// The daemon caps every command at 30s; the slack covers transport overhead
+const DAEMON_MAX_COMMAND_MS = 30000;
+const DAEMON_CALL_SLACK_MS = 5000;
+// Deadline for status reads, which polling simply retries on failure
+const STATUS_DEADLINE_MS = 15000;
+// Pushes never report a device going offline, so while the event stream is
+// up a device is still polled once nothing has been heard from it this long
+const PUSH_STALE_MS = 5 * 60 * 1000;
+
+// Daemon operations; over HTTP each maps to the endpoint of the same name
+type DaemonOp =
+	| "init"
+	| "command"
+	| "commands"
+	| "health"
+	| "disconnect"
+	| "shutdown";
+
+/**
+ * Fetch from the Python daemon over its Unix socket when configured
+ * (Bun's fetch `unix` option), otherwise over loopback TCP.
+ */
+function daemonFetch(path: string, init: RequestInit = {}): Promise<Response> {
+	const options = DAEMON_SOCKET ? { ...init, unix: DAEMON_SOCKET } : init;
+	return fetch(`${DAEMON_URL}${path}`, options as RequestInit);
+}
 
 import {
 	createDevice,
@@ -20,6 +51,7 @@ import {
 	saveCredentials,
 } from "../db/queries.js";
 import { decrypt, encrypt } from "../lib/crypto.js";
+import { DaemonStdioChannel } from "../lib/daemon-channel.js";
 import type { RoborockCommandParam } from "../types.js";
 
 const log = pino({ name: "roborock" });
@@ -92,6 +124,29 @@ const DPS_KEYS = {
 	OFFLINE_STATUS: "135",
 } as const;
 
+// Reverse mappings for fan power and water box mode DPS values
+const FAN_SPEED_BY_DPS = new Map<number, RoborockDeviceState["fanSpeed"]>([
+	[101, "quiet"],
+	[102, "balanced"],
+	[103, "turbo"],
+	[104, "max"],
+]);
+const WATER_LEVEL_BY_DPS = new Map<number, RoborockDeviceState["waterLevel"]>([
+	[200, "off"],
+	[201, "low"],
+	[202, "medium"],
+	[203, "high"],
+]);
+
+// Unsolicited device push forwarded by the daemon's /events stream
+interface DaemonPushEvent {
+	type: "dps";
+	user_id: string;
+	device_id: string;
+	dps: DeviceStatus;
+	ts: number;
+}
+
 interface HomeDevice {
 	duid: string;
 	name: string;
@@ -219,6 +274,19 @@ export interface CommandResult {
 	errorCategory?: RoborockErrorCategory;
 }
 
+export interface BatchCommand {
+	deviceId: string;
+	command: string;
+	params?: RoborockCommandParam[];
+}
+
+// Raw per-command result returned by the daemon
+interface DaemonCommandResult {
+	success: boolean;
+	result?: unknown;
+	error?: string;
+}
+
 /**
  * Categorize an error message from the Python bridge or internal errors.
  */
@@ -292,7 +360,16 @@ class RoborockService extends EventEmitter {
 	// Python daemon management for performance optimization
 	private daemonProcess: ChildProcess | null = null;
 	private daemonReady = false;
+	// In-flight health check or start, shared by concurrent callers
+	private daemonStarting: Promise<boolean> | null = null;
 	private daemonInitializedUsers = new Set<string>();
+	// Framed msgpack channel over the daemon's stdio (stdio transport only)
+	private daemonChannel: DaemonStdioChannel | null = null;
+	// Push stream of device state updates from the daemon (replaces polling)
+	private eventStream: AbortController | null = null;
+	private eventStreamConnected = false;
+	// userId:deviceId -> time of the last push or poll that updated it
+	private readonly lastStatusAt = new Map<string, number>();
 
 	// Generate a unique device identifier (persisted per user session)
 	private generateDeviceIdentifier(): string {
@@ -711,8 +788,11 @@ class RoborockService extends EventEmitter {
 			encrypt(JSON.stringify(creds), config.ENCRYPTION_SECRET),
 		);
 		this.credentials.set(userId, creds);
+		// Re-send credentials on next command; the daemon hot-swaps them in place
+		this.daemonInitializedUsers.delete(userId);
 		await this.discoverDevices(userId);
 		this.startPolling(userId);
+		void this.initDaemonSession(userId);
 
 		log.info({ userId }, "Roborock authentication successful");
 		return { success: true };
@@ -738,6 +818,7 @@ class RoborockService extends EventEmitter {
 			this.credentials.set(userId, creds);
 			await this.discoverDevices(userId);
 			this.startPolling(userId);
+			void this.initDaemonSession(userId);
 			return true;
 		} catch (err) {
 			log.error({ userId, err }, "Failed to connect with stored credentials");
@@ -962,6 +1043,7 @@ class RoborockService extends EventEmitter {
 
 			// Update status based on online and DPS state
 			state.status = determineDeviceStatus(device.online, dpsState);
+			this.lastStatusAt.set(`${userId}:${deviceId}`, Date.now());
 
 			if (typeof dpsBattery === "number") {
 				state.battery = dpsBattery;
@@ -981,10 +1063,19 @@ class RoborockService extends EventEmitter {
 	private startPolling(userId: string): void {
 		this.stopPolling(userId);
 		const interval = setInterval(async () => {
+			// Daemon pushes keep state current; poll only devices gone quiet
+			const pushing =
+				this.eventStreamConnected && this.daemonInitializedUsers.has(userId);
+			const now = Date.now();
 			for (const key of this.deviceStates.keys()) {
-				if (key.startsWith(`${userId}:`)) {
-					await this.refreshDeviceStatus(userId, key.split(":")[1]);
+				if (!key.startsWith(`${userId}:`)) continue;
+				if (
+					pushing &&
+					now - (this.lastStatusAt.get(key) ?? 0) < PUSH_STALE_MS
+				) {
+					continue;
 				}
+				await this.refreshDeviceStatus(userId, key.split(":")[1]);
 			}
 		}, 30000);
 		this.pollingIntervals.set(userId, interval);
@@ -1009,15 +1100,23 @@ class RoborockService extends EventEmitter {
 
 	/**
 	 * Start the Python daemon if not already running.
+	 * Concurrent callers share one check and start, so they never kill each
+	 * other's freshly spawned daemon.
 	 */
-	private async ensureDaemonRunning(): Promise<boolean> {
+	private ensureDaemonRunning(): Promise<boolean> {
+		if (!this.daemonStarting) {
+			this.daemonStarting = this.startDaemon().finally(() => {
+				this.daemonStarting = null;
+			});
+		}
+		return this.daemonStarting;
+	}
+
+	private async startDaemon(): Promise<boolean> {
 		if (this.daemonReady) {
 			// Verify daemon is still responding
 			try {
-				const resp = await fetch(`${DAEMON_URL}/health`, {
-					signal: AbortSignal.timeout(2000),
-				});
-				if (resp.ok) return true;
+				if (await this.daemonHealthy(2000)) return true;
 			} catch {
 				// Daemon not responding, restart it
 				log.warn("Daemon not responding, restarting...");
@@ -1026,53 +1125,81 @@ class RoborockService extends EventEmitter {
 			}
 		}
 
+		// The old process's exit handler ignores it once replaced, so reset here
 		if (this.daemonProcess) {
 			this.daemonProcess.kill();
 			this.daemonProcess = null;
 		}
+		this.stopEventStream();
+		this.daemonReady = false;
+		this.daemonInitializedUsers.clear();
+		this.daemonChannel?.close();
+		this.daemonChannel = null;
 
 		const scriptPath = join(
 			__dirname,
 			"..",
 			"..",
 			"scripts",
-			"roborock_daemon.py",
+			DAEMON_WORKERS > 1 ? "roborock_supervisor.py" : "roborock_daemon.py",
 		);
 		const venvPython = join(__dirname, "..", "..", ".venv", "bin", "python");
 
 		log.info({ scriptPath }, "Starting Python daemon");
 
-		this.daemonProcess = spawn(
-			venvPython,
-			[scriptPath, "--port", String(DAEMON_PORT)],
-			{
-				stdio: ["ignore", "pipe", "pipe"],
-				detached: false,
-			},
-		);
+		const stdio = DAEMON_TRANSPORT === "stdio";
+		let args = [scriptPath, "--port", String(DAEMON_PORT)];
+		if (stdio) args = [scriptPath, "--stdio"];
+		else if (DAEMON_SOCKET) args = [scriptPath, "--unix-socket", DAEMON_SOCKET];
+		if (DAEMON_WORKERS > 1) args.push("--workers", String(DAEMON_WORKERS));
+
+		const child = spawn(venvPython, args, {
+			stdio: [stdio ? "pipe" : "ignore", "pipe", "pipe"],
+			detached: false,
+		});
+		this.daemonProcess = child;
+
+		const { stdin, stdout } = child;
+		if (stdio && stdin && stdout) {
+			const channel = new DaemonStdioChannel(stdin, stdout);
+			channel.on("event", (event: DaemonPushEvent) =>
+				this.applyDaemonEvent(event),
+			);
+			channel.on("frameError", (err) =>
+				log.warn({ err }, "Invalid daemon frame"),
+			);
+			channel.on("close", () => {
+				if (this.daemonChannel !== channel) return;
+				this.daemonChannel = null;
+				this.eventStreamConnected = false;
+			});
+			this.daemonChannel = channel;
+		}
 
-		this.daemonProcess.stderr?.on("data", (data) => {
+		child.stderr?.on("data", (data) => {
 			const msg = data.toString().trim();
 			if (msg) log.info({ daemon: msg }, "Python daemon");
 		});
 
-		this.daemonProcess.on("exit", (code) => {
+		child.on("exit", (code) => {
 			log.warn({ code }, "Python daemon exited");
+			// A replaced daemon exiting late must not tear down its successor
+			if (this.daemonProcess !== child) return;
+			this.stopEventStream();
 			this.daemonReady = false;
 			this.daemonInitializedUsers.clear();
 			this.daemonProcess = null;
 		});
 
-		// Wait for daemon to be ready
-		for (let i = 0; i < 30; i++) {
+		// Wait for daemon to be ready; the supervisor first starts its workers
+		const attempts = DAEMON_WORKERS > 1 ? 100 : 30;
+		for (let i = 0; i < attempts; i++) {
 			await new Promise((r) => setTimeout(r, 100));
 			try {
-				const resp = await fetch(`${DAEMON_URL}/health`, {
-					signal: AbortSignal.timeout(1000),
-				});
-				if (resp.ok) {
+				if (await this.daemonHealthy(1000)) {
 					this.daemonReady = true;
 					log.info("Python daemon is ready");
+					this.startEventStream();
 					return true;
 				}
 			} catch {
@@ -1084,6 +1211,167 @@ class RoborockService extends EventEmitter {
 		return false;
 	}
 
+	private async daemonHealthy(timeoutMs: number): Promise<boolean> {
+		const health = await this.daemonRequest<{ status?: string }>(
+			"health",
+			undefined,
+			timeoutMs,
+		);
+		return health.status === "ok";
+	}
+
+	/**
+	 * Run a daemon operation over the stdio channel when that transport is
+	 * configured, otherwise as a request to the matching HTTP endpoint.
+	 */
+	private async daemonRequest<T>(
+		op: DaemonOp,
+		body: unknown,
+		timeoutMs: number,
+	): Promise<T> {
+		if (DAEMON_TRANSPORT === "stdio") {
+			if (!this.daemonChannel) throw new Error("Daemon channel closed");
+			return this.daemonChannel.request<T>(op, body, timeoutMs);
+		}
+
+		const init: RequestInit =
+			op === "health"
+				? { signal: AbortSignal.timeout(timeoutMs) }
+				: {
+						method: "POST",
+						headers: { "Content-Type": "application/json" },
+						body: JSON.stringify(body ?? {}),
+						signal: AbortSignal.timeout(timeoutMs),
+					};
+		const resp = await daemonFetch(`/${op}`, init);
+		return (await resp.json()) as T;
+	}
+
+	/**
+	 * Subscribe to the daemon's /events stream and apply device pushes.
+	 * Reconnects while the daemon is up; stops when the daemon goes away.
+	 */
+	private startEventStream(): void {
+		// Over stdio, pushes arrive as "event" frames on the channel itself
+		if (this.daemonChannel) {
+			this.eventStreamConnected = this.daemonChannel.isOpen;
+			return;
+		}
+		if (this.eventStream) return;
+		const controller = new AbortController();
+		this.eventStream = controller;
+
+		void (async () => {
+			while (!controller.signal.aborted && this.daemonReady) {
+				try {
+					const resp = await daemonFetch("/events", {
+						signal: controller.signal,
+					});
+					if (!resp.ok || !resp.body) {
+						throw new Error(`Event stream returned ${resp.status}`);
+					}
+					this.eventStreamConnected = true;
+					log.info("Daemon event stream connected");
+					await this.consumeEventStream(resp.body);
+				} catch (err) {
+					if (!controller.signal.aborted) {
+						log.warn({ err }, "Daemon event stream error");
+					}
+				}
+				this.eventStreamConnected = false;
+				if (!controller.signal.aborted) {
+					await new Promise((r) => setTimeout(r, 1000));
+				}
+			}
+			if (this.eventStream === controller) this.eventStream = null;
+		})();
+	}
+
+	private stopEventStream(): void {
+		this.eventStream?.abort();
+		this.eventStream = null;
+		this.eventStreamConnected = false;
+	}
+
+	private async consumeEventStream(
+		body: ReadableStream<Uint8Array>,
+	): Promise<void> {
+		const reader = body.getReader();
+		const decoder = new TextDecoder();
+		let buffer = "";
+
+		for (;;) {
+			const { done, value } = await reader.read();
+			if (done) return;
+			buffer += decoder.decode(value, { stream: true });
+
+			let boundary = buffer.indexOf("\n\n");
+			while (boundary !== -1) {
+				const block = buffer.slice(0, boundary);
+				buffer = buffer.slice(boundary + 2);
+				for (const line of block.split("\n")) {
+					if (!line.startsWith("data: ")) continue;
+					try {
+						const event = JSON.parse(line.slice(6)) as DaemonPushEvent;
+						this.applyDaemonEvent(event);
+					} catch (err) {
+						log.warn({ err }, "Invalid daemon event");
+					}
+				}
+				boundary = buffer.indexOf("\n\n");
+			}
+		}
+	}
+
+	/**
+	 * Apply a pushed DPS update to the cached device state.
+	 */
+	private applyDaemonEvent(event: DaemonPushEvent): void {
+		if (event.type !== "dps") return;
+		const { user_id: userId, device_id: deviceId, dps } = event;
+		const state = this.deviceStates.get(`${userId}:${deviceId}`);
+		if (!state) return;
+		this.lastStatusAt.set(`${userId}:${deviceId}`, Date.now());
+
+		const dpsState = dps[DPS_KEYS.STATE];
+		if (typeof dpsState === "number") {
+			state.status = determineDeviceStatus(true, dpsState);
+		}
+		const dpsBattery = dps[DPS_KEYS.BATTERY];
+		if (typeof dpsBattery === "number") state.battery = dpsBattery;
+		const fanSpeed = FAN_SPEED_BY_DPS.get(dps[DPS_KEYS.FAN_POWER]);
+		if (fanSpeed) state.fanSpeed = fanSpeed;
+		const waterLevel = WATER_LEVEL_BY_DPS.get(dps[DPS_KEYS.WATER_BOX_MODE]);
+		if (waterLevel) state.waterLevel = waterLevel;
+		const errorCode = dps[DPS_KEYS.ERROR_CODE];
+		if (typeof errorCode === "number") state.errorCode = errorCode;
+
+		this.emit("statusUpdate", { userId, deviceId, state });
+
+		if (typeof dpsState === "number") {
+			const dbDevice = deviceQueries.findByType
+				.all(userId, "roborock")
+				.find((d) => d.device_id === deviceId);
+			if (dbDevice) deviceQueries.updateStatus.run(state.status, dbDevice.id);
+		}
+	}
+
+	/**
+	 * Local keys for a user's devices, so the daemon can decode pushes
+	 * before the first command is sent.
+	 */
+	private getUserDeviceKeys(userId: string): Record<string, string> {
+		const keys: Record<string, string> = {};
+		const prefix = `${userId}:`;
+		for (const key of this.deviceStates.keys()) {
+			if (!key.startsWith(prefix)) continue;
+			const deviceId = key.slice(prefix.length);
+			const localKey = this.deviceLocalKeys.get(deviceId);
+			if (localKey) keys[deviceId] = localKey;
+		}
+		return keys;
+	}
+
 	/**
 	 * Initialize daemon session for a user.
 	 */
@@ -1103,20 +1391,25 @@ class RoborockService extends EventEmitter {
 		}
 
 		try {
-			const resp = await fetch(`${DAEMON_URL}/init`, {
-				method: "POST",
-				headers: { "Content-Type": "application/json" },
-				body: JSON.stringify({ user_id: userId, rriot: creds.rriot }),
-				signal: AbortSignal.timeout(10000),
-			});
-
-			const result = (await resp.json()) as {
+			const result = await this.daemonRequest<{
 				success: boolean;
+				reused?: boolean;
 				error?: string;
-			};
+			}>(
+				"init",
+				{
+					user_id: userId,
+					rriot: creds.rriot,
+					devices: this.getUserDeviceKeys(userId),
+				},
+				10000,
+			);
 			if (result.success) {
 				this.daemonInitializedUsers.add(userId);
-				log.info({ userId }, "Daemon session initialized");
+				log.info(
+					{ userId, reused: !!result.reused },
+					"Daemon session initialized",
+				);
 				return true;
 			}
 			log.error(
@@ -1130,8 +1423,18 @@ class RoborockService extends EventEmitter {
 		}
 	}
 
+	/**
+	 * Remaining budget of a deadline in ms, or undefined when there is none.
+	 */
+	private remainingMs(deadline: number | undefined): number | undefined {
+		return deadline === undefined
+			? undefined
+			: Math.max(0, deadline - Date.now());
+	}
+
 	/**
 	 * Send command via the persistent Python daemon.
+	 * Without a deadline the daemon applies the method's learned timeout.
 	 */
 	private async callDaemon(
 		userId: string,
@@ -1139,36 +1442,38 @@ class RoborockService extends EventEmitter {
 		localKey: string,
 		command: string,
 		params?: RoborockCommandParam[],
+		deadlineMs?: number,
 	): Promise<{
 		success: boolean;
 		result?: unknown;
 		error?: string;
 		status?: RoborockMqttStatus;
 	}> {
+		const deadline =
+			deadlineMs === undefined ? undefined : Date.now() + deadlineMs;
 		if (!(await this.initDaemonSession(userId))) {
 			return { success: false, error: "Failed to initialize daemon session" };
 		}
+		const remaining = this.remainingMs(deadline);
 
 		try {
-			const resp = await fetch(`${DAEMON_URL}/command`, {
-				method: "POST",
-				headers: { "Content-Type": "application/json" },
-				body: JSON.stringify({
+			return await this.daemonRequest<{
+				success: boolean;
+				result?: unknown;
+				error?: string;
+				status?: RoborockMqttStatus;
+			}>(
+				"command",
+				{
 					user_id: userId,
 					device_id: deviceId,
 					local_key: localKey,
 					command,
 					params: params && params.length > 0 ? params : undefined,
-				}),
-				signal: AbortSignal.timeout(35000), // 35s timeout (daemon has 30s internal)
-			});
-
-			return (await resp.json()) as {
-				success: boolean;
-				result?: unknown;
-				error?: string;
-				status?: RoborockMqttStatus;
-			};
+					deadline_ms: remaining,
+				},
+				(remaining ?? DAEMON_MAX_COMMAND_MS) + DAEMON_CALL_SLACK_MS,
+			);
 		} catch (err) {
 			log.error({ err, deviceId, command }, "Error calling daemon");
 			return {
@@ -1178,6 +1483,60 @@ class RoborockService extends EventEmitter {
 		}
 	}
 
+	/**
+	 * Send many commands via the daemon's /commands endpoint in one request.
+	 * Results are returned in the same order as the input items.
+	 */
+	private async callDaemonBatch(
+		userId: string,
+		items: {
+			deviceId: string;
+			localKey: string;
+			command: string;
+			params?: RoborockCommandParam[];
+		}[],
+		deadlineMs?: number,
+	): Promise<DaemonCommandResult[]> {
+		const failAll = (error: string) =>
+			items.map(() => ({ success: false, error }));
+
+		const deadline =
+			deadlineMs === undefined ? undefined : Date.now() + deadlineMs;
+		if (!(await this.initDaemonSession(userId))) {
+			return failAll("Failed to initialize daemon session");
+		}
+		const remaining = this.remainingMs(deadline);
+
+		try {
+			const data = await this.daemonRequest<{
+				success: boolean;
+				results?: DaemonCommandResult[];
+				error?: string;
+			}>(
+				"commands",
+				{
+					commands: items.map((item) => ({
+						user_id: userId,
+						device_id: item.deviceId,
+						local_key: item.localKey,
+						command: item.command,
+						params:
+							item.params && item.params.length > 0 ? item.params : undefined,
+					})),
+					deadline_ms: remaining,
+				},
+				(remaining ?? DAEMON_MAX_COMMAND_MS) + DAEMON_CALL_SLACK_MS,
+			);
+			if (!data.success || !data.results) {
+				return failAll(data.error || "Batch command failed");
+			}
+			return data.results;
+		} catch (err) {
+			log.error({ err, userId }, "Error calling daemon batch");
+			return failAll(err instanceof Error ? err.message : "Daemon call failed");
+		}
+	}
+
 	/**
 	 * Disconnect user from daemon.
 	 */
@@ -1185,12 +1544,7 @@ class RoborockService extends EventEmitter {
 		if (!this.daemonInitializedUsers.has(userId)) return;
 
 		try {
-			await fetch(`${DAEMON_URL}/disconnect`, {
-				method: "POST",
-				headers: { "Content-Type": "application/json" },
-				body: JSON.stringify({ user_id: userId }),
-				signal: AbortSignal.timeout(5000),
-			});
+			await this.daemonRequest("disconnect", { user_id: userId }, 5000);
 			this.daemonInitializedUsers.delete(userId);
 		} catch (err) {
 			log.warn({ err, userId }, "Error disconnecting daemon session");
@@ -1284,6 +1638,75 @@ class RoborockService extends EventEmitter {
 		}
 	}
 
+	/**
+	 * Send several commands in a single daemon round trip.
+	 */
+	async sendCommandBatch(
+		userId: string,
+		commands: BatchCommand[],
+	): Promise<CommandResult[]> {
+		const creds = this.credentials.get(userId);
+		if (!creds?.rriot) {
+			const error = creds
+				? "No IoT credentials available - please re-authenticate"
+				: "No credentials found for user";
+			const errorCategory: RoborockErrorCategory = creds
+				? "auth_expired"
+				: "missing_credentials";
+			return commands.map(() => ({ success: false, error, errorCategory }));
+		}
+
+		const results: CommandResult[] = new Array(commands.length);
+		const items: {
+			index: number;
+			deviceId: string;
+			localKey: string;
+			command: string;
+			params?: RoborockCommandParam[];
+		}[] = [];
+		commands.forEach((cmd, index) => {
+			const localKey = this.deviceLocalKeys.get(cmd.deviceId);
+			if (!localKey) {
+				results[index] = {
+					success: false,
+					error: "Device not found or missing encryption key",
+					errorCategory: "unknown",
+				};
+				return;
+			}
+			items.push({ index, localKey, ...cmd });
+		});
+
+		const daemonResults =
+			items.length > 0 ? await this.callDaemonBatch(userId, items) : [];
+		daemonResults.forEach((result, i) => {
+			const { index, deviceId, command } = items[i];
+			if (result.success) {
+				results[index] = { success: true };
+				return;
+			}
+			const error = result.error || "Command failed";
+			log.error({ deviceId, command, error }, "Batch command failed");
+			results[index] = {
+				success: false,
+				error,
+				errorCategory: categorizeError(error),
+			};
+		});
+		return results;
+	}
+
+	/**
+	 * Stop every vacuum of a user with one daemon request.
+	 */
+	async stopAllCleaning(userId: string): Promise<CommandResult[]> {
+		const devices = await this.getDevices(userId);
+		return this.sendCommandBatch(
+			userId,
+			devices.map((d) => ({ deviceId: d.id, command: "app_stop" })),
+		);
+	}
+
 	startCleaning(userId: string, deviceId: string): Promise<CommandResult> {
 		return this.sendCommand(userId, deviceId, "app_start");
 	}
@@ -1332,12 +1755,19 @@ class RoborockService extends EventEmitter {
 				deviceId,
 				localKey,
 				"get_status",
+				undefined,
+				STATUS_DEADLINE_MS,
 			);
 
-			if (result.success && result.status) {
+			// The daemon serves get_status from its per-device cache and returns
+			// the raw RPC result, which wraps the status object in a list
+			const raw = Array.isArray(result.result)
+				? result.result[0]
+				: result.result;
+			if (result.success && raw && typeof raw === "object") {
 				return {
 					success: true,
-					status: result.status,
+					status: raw as RoborockMqttStatus,
 				};
 			}
 
@@ -1411,6 +1841,7 @@ class RoborockService extends EventEmitter {
 				const deviceId = key.split(":")[1];
 				this.deviceLocalKeys.delete(deviceId);
 				this.deviceStates.delete(key);
+				this.lastStatusAt.delete(key);
 			}
 		}
 	}
@@ -1424,19 +1855,19 @@ class RoborockService extends EventEmitter {
 
 	async shutdown(): Promise<void> {
 		for (const userId of this.pollingIntervals.keys()) this.stopPolling(userId);
+		this.stopEventStream();
 		// Shutdown daemon
 		if (this.daemonProcess) {
 			try {
-				await fetch(`${DAEMON_URL}/shutdown`, {
-					method: "POST",
-					signal: AbortSignal.timeout(5000),
-				});
+				await this.daemonRequest("shutdown", undefined, 5000);
 			} catch {
 				// Ignore errors during shutdown
 			}
 			this.daemonProcess.kill();
 			this.daemonProcess = null;
 		}
+		this.daemonChannel?.close();
+		this.daemonChannel = null;
 		this.daemonReady = false;
 		this.daemonInitializedUsers.clear();
 		this.deviceLocalKeys.clear();
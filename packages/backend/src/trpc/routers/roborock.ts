@@ -113,6 +113,14 @@ export const roborockRouter = router({
 			};
 		}),
 
+	stopAll: adminProcedure.mutation(async ({ ctx }) => {
+		const results = await roborockService.stopAllCleaning(ctx.user.id);
+		return {
+			success: results.every((r) => r.success),
+			results,
+		};
+	}),
+
 	setFanSpeed: adminProcedure
 		.input(
 			z.object({